@@ -1,3 +1,7 @@
 from .file_io import unzip, find_conllu_files, walk_directories
 from .annatto_reader import annatto_main
-from .annotations import Token
\ No newline at end of file
+from .annotations import Token
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
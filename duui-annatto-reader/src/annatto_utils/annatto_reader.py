@@ -1,9 +1,8 @@
 import shutil
 import subprocess
 import tempfile
-from io import BytesIO
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Union
 import os
 
 from conllu import parse_incr
@@ -26,7 +25,7 @@ def conllu_to_doc(conllu_path: str):
     return tokens, " ".join(sofa)
 
 
-def annatto_main(zip_bytes: Union[bytes, BytesIO]):
+def annatto_main(zip_bytes: Union[bytes, BinaryIO]):
     temp_dir, toml_sources = unzip(zip_bytes)
     temp_dir_in = temp_dir + "/inp"
     temp_dir_out = temp_dir + "/out"
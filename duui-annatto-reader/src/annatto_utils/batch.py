@@ -0,0 +1,54 @@
+from typing import Callable, List, Optional, Union
+
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+def document_json(document: Union[BaseModel, bytes]) -> bytes:
+    """
+    JSON of a single /v1/process response (a response model or its already serialized body)
+    :param document:
+    :return:
+    """
+    if isinstance(document, bytes):
+        return document
+    return document.model_dump_json().encode("utf-8")
+
+
+def collect_batch(next_document: Callable[[], Optional[Union[BaseModel, bytes]]],
+                  max_docs: Optional[int] = None, max_bytes: Optional[int] = None) -> List[bytes]:
+    """
+    Take documents from the queue (next_document returns None when it is empty) until max_docs documents
+    are collected or their JSON reaches max_bytes. The document that crosses max_bytes is still part of the batch,
+    so a batch has at least one document if the queue is not empty (unless max_docs is 0).
+    :param next_document:
+    :param max_docs: maximum number of documents (no limit if None)
+    :param max_bytes: byte budget of the documents (no limit if None)
+    :return: JSON of the documents
+    """
+    documents = []
+    n_bytes = 0
+    while max_docs is None or len(documents) < max_docs:
+        if max_bytes is not None and documents and n_bytes >= max_bytes:
+            break
+        document = next_document()
+        if document is None:
+            break
+        documents.append(document_json(document))
+        n_bytes += len(documents[-1])
+    return documents
+
+
+def batch_response(next_document: Callable[[], Optional[Union[BaseModel, bytes]]],
+                   max_docs: Optional[int] = None, max_bytes: Optional[int] = None) -> Response:
+    """
+    Batch /v1/process response: {"documents": [...], "accepted": ...}, each document has the format of the single
+    document response. The documents are joined as they are, without decoding them again.
+    :param next_document:
+    :param max_docs:
+    :param max_bytes:
+    :return:
+    """
+    documents = collect_batch(next_document, max_docs, max_bytes)
+    content = b'{"documents":[' + b",".join(documents) + b'],"accepted":' + (b"true" if documents else b"false") + b"}"
+    return Response(content=content, media_type="application/json")
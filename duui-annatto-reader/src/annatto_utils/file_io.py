@@ -4,7 +4,7 @@ import zipfile
 import tempfile
 import shutil
 from io import BytesIO
-from typing import Dict, Optional, Union, List, Any
+from typing import BinaryIO, Dict, Optional, Union, List, Any
 import zipfile
 import io
 import os
@@ -14,7 +14,7 @@ import tempfile
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
 
-def unzip(zip_content: Union[BytesIO, bytes]) -> tuple[str, list[str]]:
+def unzip(zip_content: Union[BinaryIO, bytes]) -> tuple[str, list[str]]:
     """
     -
     :param zip_content:
@@ -24,7 +24,7 @@ def unzip(zip_content: Union[BytesIO, bytes]) -> tuple[str, list[str]]:
     temp_dir = tempfile.mkdtemp(dir=f"{BP}/temp")
     toml_sources = []
 
-    def extract_zip(content: Union[BytesIO, bytes], extract_to: str, toml: List[str]):
+    def extract_zip(content: Union[BinaryIO, bytes, str], extract_to: str, toml: List[str]):
         """
         -
         :param content:
@@ -32,10 +32,8 @@ def unzip(zip_content: Union[BytesIO, bytes]) -> tuple[str, list[str]]:
         :param toml:
         :return:
         """
-        # Create a BytesIO object to read the zip content
-        if isinstance(content, BytesIO):
-            pass
-        else:
+        # Create a BytesIO object to read the zip content (files and paths are read directly)
+        if isinstance(content, bytes):
             content = BytesIO(content)
         try:
             with zipfile.ZipFile(content, 'r') as zf:
@@ -47,11 +45,9 @@ def unzip(zip_content: Union[BytesIO, bytes]) -> tuple[str, list[str]]:
                     file_path = os.path.join(extract_to, file_name)
                     # If the file is a zip, recursively extract it
                     if os.path.isfile(file_path) and file_name.lower().endswith('.zip'):
-                        with open(file_path, 'rb') as f:
-                            nested_content = f.read()
-                        # Recursively extract the nested zip
+                        # Recursively extract the nested zip, read from its extracted file
                         os.mkdir(file_path.rstrip(".zip"))
-                        extract_zip(nested_content, file_path.rstrip(".zip"), toml)
+                        extract_zip(file_path, file_path.rstrip(".zip"), toml)
                         # Optionally, remove the nested zip file after extraction
                         os.remove(file_path)
                     elif os.path.isfile(file_path) and file_name.lower().endswith('.toml'):
@@ -10,14 +10,32 @@ Negation = luajava.bindClass("org.texttechnologylab.annotation.negation.Complete
 Pos = luajava.bindClass("de.tudarmstadt.ukp.dkpro.core.api.lexmorph.type.pos.POS")
 FSArray = luajava.bindClass("org.apache.uima.jcas.cas.FSArray")
 
+-- Batch mode: documents of a batch response that are not deserialized yet. The first document of a batch
+-- goes into the current CAS, the others into the next CASes (in order). They belong to this Lua state,
+-- so the batch mode needs a single instance of the reader component.
+pending_documents = {}
+
 -- This "serialize" function is called to transform the CAS object into an stream that is sent to the annotator
 -- Inputs:
 --  - inputCas: The actual CAS object to serialize
 --  - outputStream: Stream that is sent to the annotator, can be e.g. a string, JSON payload, ...
+--  - params: Parameters of the component, max_docs and/or max_bytes switch on the batch mode
 function serialize(inputCas, outputStream, params)
-    outputStream:write(json.encode({
+    local request = {
         msg = "test"
-    }))
+    }
+    if #pending_documents > 0 then
+        -- The next document is already buffered, ask for an empty batch
+        request["max_docs"] = 0
+    elseif params ~= null then
+        if params["max_docs"] ~= null then
+            request["max_docs"] = tonumber(params["max_docs"])
+        end
+        if params["max_bytes"] ~= null then
+            request["max_bytes"] = tonumber(params["max_bytes"])
+        end
+    end
+    outputStream:write(json.encode(request))
 end
 
 -- This "deserialize" function is called on receiving the results from the annotator that have to be transformed into a CAS object
@@ -31,6 +49,21 @@ function deserialize(inputCas, inputStream)
     --
     local results = json.decode(inputString)
 
+    if results["documents"] ~= null then
+        for i, document in ipairs(results["documents"]) do
+            table.insert(pending_documents, document)
+        end
+        results = table.remove(pending_documents, 1)
+        if results == nil then
+            results = {accepted = false}
+        end
+    end
+
+    deserialize_document(inputCas, results)
+end
+
+-- Fill the CAS with one document (a single /v1/process response or one document of a batch response)
+function deserialize_document(inputCas, results)
     if results["sofa_str"] ~= null then
         content = results["sofa_str"]
     else
@@ -7,7 +7,7 @@ import pandas as pd
 from tqdm import tqdm
 import json
 
-from annis_utils import files_from_zip_in_bytes, ANNISExtractor
+from annis_utils import iter_annis_corpora, ANNISExtractor
 from api_utils import DocumentQueue
 from duui_annis_reader import DUUIRequest
 
@@ -44,18 +44,14 @@ def test_multiple_corpora():
     test_file = f"{BP}/data/2sent_ctx/ahd.zip"
 
     file = open(test_file, 'rb')
-    documents = dict()
-    files_from_zip_in_bytes(file, documents)
-    # print(documents)
-
-    for document_id in documents:
+    for document_id, corpus_files in iter_annis_corpora(file):
         # print(document_id)
         try:
-            node_annis = documents[document_id]['node.annis']
-            node_annotation_annis = documents[document_id]['node_annotation.annis']
-            corpus_annis = documents[document_id]['corpus.annis']
-            corpus_annotation_annis = documents[document_id]['corpus_annotation.annis']
-            text_annis = documents[document_id]['text.annis']
+            node_annis = corpus_files['node.annis']
+            node_annotation_annis = corpus_files['node_annotation.annis']
+            corpus_annis = corpus_files['corpus.annis']
+            corpus_annotation_annis = corpus_files['corpus_annotation.annis']
+            text_annis = corpus_files['text.annis']
             annis_corpus = ANNISExtractor.from_file_like(node_file=node_annis,
                                                          node_annotation_file=node_annotation_annis,
                                                          corpus_file=corpus_annis,
@@ -74,7 +70,7 @@ def test_multiple_corpora():
                        text_per_document=tpd,
                        meta_data_per_document=mpd)
         except Exception as e:
-            print(documents[document_id]['node.annis'])
+            print(corpus_files['node.annis'])
             print(e)
             print("he")
             pass
@@ -88,7 +84,7 @@ def test_multiple_corpora():
             for word in target_pos_base["pos_base"]:
                 if "â" in word or "ô" in word or "î" in word:
                     if word in current_doc.text:
-                        print(current_doc.annotations)
+                        print(list(current_doc.annotations))
                         print(word)
 
             # print(current_doc.annotations)
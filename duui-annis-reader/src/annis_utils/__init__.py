@@ -1,3 +1,6 @@
+from .annis_columns import AnnotationColumns
 from .annis_import import ANNISImporter
 from .annis_extract import ANNISExtractor
-from .annis_file_io import file_io_from_request, files_from_zip_in_bytes
\ No newline at end of file
+from .annis_file_io import file_io_from_request, iter_annis_corpora
+from .annis_cache import ANNISCorpusCache, corpus_hash
+from .annis_parallel import stage_corpus, extract_corpus, extract_corpora
@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import os
+import pickle
+import tempfile
+from io import BytesIO
+from typing import Any, Dict, IO, Optional, Tuple, Union
+
+
+# Bump, whenever the extraction output changes, so old cache entries are not used anymore
+CACHE_FORMAT_VERSION = 2
+CACHE_SUFFIX = ".annis-cache"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def corpus_hash(corpus_files: Dict[str, Union[str, BytesIO, IO[bytes]]]) -> str:
+    """
+    Content hash of a relannis corpus (all of its .annis files). Streams are read in chunks and
+    put back to their original position afterwards.
+    :param corpus_files: filename -> path or seekable byte stream
+    :return:
+    """
+    sha = hashlib.sha256(f"annis-cache-v{CACHE_FORMAT_VERSION}".encode("utf-8"))
+    for name in sorted(corpus_files):
+        sha.update(name.encode("utf-8") + b"\0")
+        file = corpus_files[name]
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    sha.update(chunk)
+        elif isinstance(file, BytesIO):
+            sha.update(file.getbuffer())
+        else:
+            position = file.tell()
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                sha.update(chunk)
+            file.seek(position)
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+
+class ANNISCorpusCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Persistent cache for extracted relannis corpora (annotations, text and meta data per document),
+        keyed by the content hash of the .annis files. Entries are gzipped pickles, the least recently
+        used ones are evicted once the cache grows beyond max_bytes.
+        :param cache_dir:
+        :param max_bytes:
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key: str) -> Optional[Tuple[Dict[int, Any], Dict[int, str], Optional[Dict[int, Dict[str, Any]]]]]:
+        """
+        Return (annotations_per_doc, text_per_doc, meta_data_per_doc) of a cached corpus or None.
+        :param key:
+        :return:
+        """
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Broken entry (e.g. disk full while writing), drop it and extract again
+            print(f"Dropping broken cache entry {path}: {e}")
+            self._remove(path)
+            return None
+        # Mark as recently used
+        os.utime(path)
+        return entry["annotations"], entry["text"], entry["meta_data"]
+
+    def put(self,
+            key: str,
+            annotations_per_doc: Dict[int, Any],
+            text_per_doc: Dict[int, str],
+            meta_data_per_doc: Optional[Dict[int, Dict[str, Any]]]):
+        """
+        Store an extracted corpus and evict old entries if the cache is too large.
+        :param key:
+        :param annotations_per_doc:
+        :param text_per_doc:
+        :param meta_data_per_doc:
+        :return:
+        """
+        entry = {"annotations": annotations_per_doc, "text": text_per_doc, "meta_data": meta_data_per_doc}
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1) as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Atomic, so concurrent readers never see half written entries
+            os.replace(temp_path, self._path(key))
+        except Exception:
+            self._remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits into max_bytes.
+        :return:
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
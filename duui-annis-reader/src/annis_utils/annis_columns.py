@@ -0,0 +1,123 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+
+class AnnotationColumns:
+    """
+    Columnar annotations of one document: instead of one (name, value, begin, end) tuple per annotation,
+    the annotation names are interned into a small type table (type_codes), the values into a string table
+    (value_ids) and the offsets are kept in int32 arrays.
+    """
+    __slots__ = ("types", "type_codes", "begins", "ends", "values", "value_ids", "_type_index", "_value_index")
+
+    def __init__(self):
+        self.types: List[str] = []
+        self.type_codes = array("H")
+        self.begins = array("i")
+        self.ends = array("i")
+        self.values: List[str] = []
+        self.value_ids = array("i")
+        # Only needed while appending, see compact
+        self._type_index: Optional[Dict[str, int]] = None
+        self._value_index: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.type_codes)
+
+    def __iter__(self) -> Iterator[Tuple[str, str, int, int]]:
+        """
+        Annotations as (name, value, begin, end) tuples (the format of ANNISExtractor.extract_annotations_old)
+        :return:
+        """
+        for type_code, value_id, begin, end in zip(self.type_codes, self.value_ids, self.begins, self.ends):
+            yield self.types[type_code], self.values[value_id], begin, end
+
+    def __getstate__(self):
+        return self.types, self.type_codes, self.begins, self.ends, self.values, self.value_ids
+
+    def __setstate__(self, state):
+        self.types, self.type_codes, self.begins, self.ends, self.values, self.value_ids = state
+        self._type_index = None
+        self._value_index = None
+
+    def _intern_type(self, name: str) -> int:
+        if self._type_index is None:
+            self._type_index = {name: idx for idx, name in enumerate(self.types)}
+        code = self._type_index.get(name)
+        if code is None:
+            code = self._type_index[name] = len(self.types)
+            self.types.append(name)
+        return code
+
+    def _intern_value(self, value: str) -> int:
+        if self._value_index is None:
+            self._value_index = {value: idx for idx, value in enumerate(self.values)}
+        value_id = self._value_index.get(value)
+        if value_id is None:
+            value_id = self._value_index[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+    def append(self, name: str, value: str, begin: int, end: int):
+        """
+        Add one annotation
+        :param name:
+        :param value:
+        :param begin:
+        :param end:
+        :return:
+        """
+        self.type_codes.append(self._intern_type(name))
+        self.value_ids.append(self._intern_value(value))
+        self.begins.append(begin)
+        self.ends.append(end)
+
+    def extend_type(self, name: str, values: Iterable[str], begins: Sequence[int], ends: Sequence[int]):
+        """
+        Add a whole layer of annotations of the same name (e.g. all tokens of a document)
+        :param name:
+        :param values:
+        :param begins:
+        :param ends:
+        :return:
+        """
+        type_code = self._intern_type(name)
+        value_ids = array("i", [self._intern_value(value) for value in values])
+        self.type_codes.extend(array("H", [type_code]) * len(value_ids))
+        self.value_ids.extend(value_ids)
+        self.begins.extend(begins)
+        self.ends.extend(ends)
+
+    def compact(self) -> "AnnotationColumns":
+        """
+        Drop the lookup tables for interning, once the document is complete (they are rebuilt on the next append)
+        :return:
+        """
+        self._type_index = None
+        self._value_index = None
+        return self
+
+    def group_by_type(self) -> Dict[str, List[Dict[str, Union[str, int]]]]:
+        """
+        Annotations per name as {"begin", "end", "value"} dicts (annotation order is kept),
+        only used to serialize a single document.
+        :return:
+        """
+        grouped = [[] for _ in self.types]
+        for type_code, value_id, begin, end in zip(self.type_codes, self.value_ids, self.begins, self.ends):
+            grouped[type_code].append({"begin": begin, "end": end, "value": self.values[value_id]})
+        return dict(zip(self.types, grouped))
+
+    def columns_by_type(self) -> Dict[str, Tuple[List[int], List[int], List[int]]]:
+        """
+        Annotations per name as parallel begin, end and value id lists (annotation order is kept),
+        the value ids refer to values (the string table of the document).
+        :return:
+        """
+        grouped = [([], [], []) for _ in self.types]
+        for type_code, value_id, begin, end in zip(self.type_codes, self.value_ids, self.begins, self.ends):
+            begins, ends, value_ids = grouped[type_code]
+            begins.append(begin)
+            ends.append(end)
+            value_ids.append(value_id)
+        return dict(zip(self.types, grouped))
@@ -1,20 +1,36 @@
 import copy
+import heapq
+import multiprocessing
+from array import array
 import sqlite3
 import os
-from functools import partial
 from io import StringIO, BytesIO
 from itertools import groupby
-from typing import List, Tuple, Any, Union, Optional, Dict
-from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Any, Union, Optional, Dict, Iterator, Sequence, Callable
+from concurrent.futures import ProcessPoolExecutor
 from deprecated import deprecated
 
 from tqdm import tqdm
 
-from annis_utils import ANNISImporter
+from annis_utils import ANNISImporter, AnnotationColumns
 
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
+# Characters, which are split off as own tokens in add_whitespace_split
+WHITESPACE_SPLITTER = [
+    ",", ".", ":", ";", "?", ")", "(", "-", "!",  # Your original list
+    "[", "]", "{", "}", "<", ">", "/", "'",  # Brackets, slashes, quotes
+    "@", "#", "$", "%", "&", "*", "=", "+", "_",  # Symbols used in various contexts
+    "§", "µ", "€", "£", "¥", "°", "±", "©", "®", "™",
+    "«", "»", "„", "“", "”", "‚", "‘", "’", "〝", "〞",  # Currency and typographic symbols
+]
+# One pass over the text instead of one str.replace per character
+WHITESPACE_SPLIT_TABLE = str.maketrans({char: f" {char} " for char in WHITESPACE_SPLITTER})
+
+# (left_token, right_token, span) columns of the segments of one segmentation (text or edition) of a document
+Segments = Tuple[Union[array, List[Any]], Union[array, List[Any]], List[str]]
+
 
 class ANNISExtractor:
     def __init__(self,
@@ -22,7 +38,9 @@ class ANNISExtractor:
                  node_annotation_file: Union[str, StringIO, BytesIO],
                  corpus_file: Optional[Union[str, StringIO, BytesIO]],
                  corpus_annotation_file: Optional[Union[str, StringIO, BytesIO]],
-                 text_file: Optional[Union[str, StringIO, BytesIO]]):
+                 text_file: Optional[Union[str, StringIO, BytesIO]],
+                 bulk_load: bool = True,
+                 database: str = ":memory:"):
         """
         Constructor for the ANNISExtractor Class
         :param node_file:
@@ -30,33 +48,40 @@ class ANNISExtractor:
         :param corpus_file:
         :param corpus_annotation_file:
         :param text_file:
+        :param bulk_load: tune sqlite for the import and index the staging database afterwards
+        :param database: staging database, in memory or a (temporary) file, which is deleted by close
         """
         self.node_file = node_file
         self.node_annotation_file = node_annotation_file
         self.corpus_file = corpus_file
         self.corpus_annotation_file = corpus_annotation_file
         self.text_file = text_file
+        self.database = database
 
         self.db = self.init_db(node_file=self.node_file,
                                node_annotation_file=self.node_annotation_file,
                                corpus_file=self.corpus_file,
                                corpus_annotation_file=self.corpus_annotation_file,
-                               text_file=self.text_file)
+                               text_file=self.text_file,
+                               bulk_load=bulk_load,
+                               database=self.database)
 
         self.relannis_version, self.text_keyword, self.edition_keyword = self.check_relannis_version(self.db)
 
     @classmethod
-    def from_str_path(cls, corpus_path: str):
+    def from_str_path(cls, corpus_path: str, bulk_load: bool = True):
         """
         Initiate Class Object from string paths (just for testing)
         :param corpus_path:
+        :param bulk_load:
         :return:
         """
         return cls(node_file=f"{corpus_path}/node.annis",
                    node_annotation_file=f"{corpus_path}/node_annotation.annis",
                    corpus_file=f"{corpus_path}/corpus.annis",
                    corpus_annotation_file=f"{corpus_path}/corpus_annotation.annis",
-                   text_file=f"{corpus_path}/text.annis"
+                   text_file=f"{corpus_path}/text.annis",
+                   bulk_load=bulk_load
                    )
 
     @classmethod
@@ -65,7 +90,9 @@ class ANNISExtractor:
                        node_annotation_file: Union[StringIO, BytesIO],
                        corpus_file: Optional[Union[StringIO, BytesIO]],
                        corpus_annotation_file: Optional[Union[StringIO, BytesIO]],
-                       text_file: Optional[Union[StringIO, BytesIO]]):
+                       text_file: Optional[Union[StringIO, BytesIO]],
+                       bulk_load: bool = True,
+                       database: str = ":memory:"):
         """
         Initiate class objects from IOByte file like objects (StringIO depricated)
         :param node_file:
@@ -73,13 +100,17 @@ class ANNISExtractor:
         :param corpus_file:
         :param corpus_annotation_file:
         :param text_file:
+        :param bulk_load:
+        :param database:
         :return:
         """
         return cls(node_file=node_file,
                    node_annotation_file=node_annotation_file,
                    corpus_file=corpus_file,
                    corpus_annotation_file=corpus_annotation_file,
-                   text_file=text_file
+                   text_file=text_file,
+                   bulk_load=bulk_load,
+                   database=database
                    )
 
 
@@ -89,7 +120,9 @@ class ANNISExtractor:
                 corpus_file: Union[str, StringIO, BytesIO],
                 corpus_annotation_file: Union[str, StringIO, BytesIO],
                 text_file: Union[str, StringIO, BytesIO],
-                debug: bool = False) -> sqlite3.Connection:
+                debug: bool = False,
+                bulk_load: bool = True,
+                database: str = ":memory:") -> sqlite3.Connection:
         """
         Read .annis files in database. (TODO add metadata...)
         :param node_file:
@@ -98,9 +131,14 @@ class ANNISExtractor:
         :param corpus_annotation_file:
         :param text_file:
         :param debug:
+        :param bulk_load:
+        :param database:
         :return:
         """
-        annis_db = sqlite3.connect(':memory:')
+        # Documents can be extracted later on from the threads of the api (see ANNISExtractor.extract_document)
+        annis_db = sqlite3.connect(database, check_same_thread=False)
+        if bulk_load:
+            annis_db = ANNISImporter.begin_bulk_load(annis_db)
         annis_db = ANNISImporter.import_nodes_annis_file_sql(node_file,
                                                              conn=annis_db)
         annis_db = ANNISImporter.import_node_annotations_annis_file_sql(node_annotation_file,
@@ -111,6 +149,8 @@ class ANNISExtractor:
                                                                          conn=annis_db)
         annis_db = ANNISImporter.import_text_annis_file_sql(text_file,
                                                             conn=annis_db)
+        if bulk_load:
+            annis_db = ANNISImporter.finish_bulk_load(annis_db)
         # TODO Add corpus_annotation for meta data
         if debug:
             ANNISImporter.test_db(annis_db, "nodes")
@@ -120,6 +160,18 @@ class ANNISExtractor:
             ANNISImporter.test_db(annis_db, "text")
         return annis_db
 
+    def close(self):
+        """
+        Close the staging database and delete it, if it is a file
+        :return:
+        """
+        self.db.close()
+        if self.database != ":memory:":
+            try:
+                os.remove(self.database)
+            except FileNotFoundError:
+                pass
+
     @staticmethod
     def check_relannis_version(conn: sqlite3.Connection) -> Tuple[str, str, str]:
         """
@@ -130,7 +182,7 @@ class ANNISExtractor:
         """
         cursor = conn.cursor()
         cursor.execute(
-            """ SELECT seg_name FROM nodes """
+            """ SELECT DISTINCT seg_name FROM nodes """
             )
         rows = list(set([row[0] for row in cursor.fetchall()]))
         if "edition" in rows and "text" in rows:
@@ -158,19 +210,30 @@ class ANNISExtractor:
         return offsets
 
     @staticmethod
-    def add_whitespace_split(text: str) -> List[str]:
-        splitter = [
-            ",", ".", ":", ";", "?", ")", "(", "-", "!",  # Your original list
-            "[", "]", "{", "}", "<", ">", "/", "'",  # Brackets, slashes, quotes
-            "@", "#", "$", "%", "&", "*", "=", "+", "_",  # Symbols used in various contexts
-            "§", "µ", "€", "£", "¥", "°", "±", "©", "®", "™",
-            "«", "»", "„", "“", "”", "‚", "‘", "’", "〝", "〞",  # Currency and typographic symbols
-        ]
-
-        for char in splitter:
-            text = text.replace(char, f" {char} ")
+    def calc_offset_columns(tokens: List[str]) -> Tuple[array, array]:
+        """
+        Same offsets as calc_offsets, but as two int32 arrays (begins, ends) instead of one tuple per token
+        :param tokens:
+        :return:
+        """
+        begins = array("i")
+        ends = array("i")
+        current_offset = 0
+        for tok in tokens:
+            begins.append(current_offset)
+            ends.append(len(tok) + current_offset)
+            if len(tok) > 0:
+                current_offset += len(tok) + 1
+        return begins, ends
 
-        return [t for t in text.split(" ") if t != ""]
+    @staticmethod
+    def add_whitespace_split(text: str) -> List[str]:
+        """
+        Split a segment at whitespace and around punctuation/symbols (see WHITESPACE_SPLIT_TABLE).
+        :param text:
+        :return:
+        """
+        return [t for t in text.translate(WHITESPACE_SPLIT_TABLE).split(" ") if t != ""]
 
     @staticmethod
     def pad_list_with_empty(existing_list: List[str], target_length: int) -> List[str]:
@@ -184,7 +247,7 @@ class ANNISExtractor:
         """
         Finds the longest overlapping substring between two strings.
         It first checks if one string is entirely contained within the other.
-        If not, it finds the longest substring where s1's suffix matches s2's prefix.
+        If not, it finds the longest substring where s1's suffix matches s2's prefix (linear time).
         :param s1:
         :param s2:
         :return:
@@ -194,12 +257,221 @@ class ANNISExtractor:
             return s2
         if s1 in s2:
             return s1
-        # Otherwise, look for the longest suffix of s1 that is a prefix of s2.
-        overlap = ""
-        for i in range(1, min(len(s1), len(s2)) + 1):
-            if s1[-i:] == s2[:i]:
-                overlap = s1[-i:]
-        return overlap
+        # Otherwise, look for the longest suffix of s1 that is a prefix of s2:
+        # run the KMP automaton of s2 over s1, the state at the end of s1 is the length of that suffix.
+        # (s2 can not be matched completely here, it is not contained in s1)
+        prefix = ANNISExtractor.prefix_function(s2)
+        matched = 0
+        for char in s1:
+            while matched > 0 and s2[matched] != char:
+                matched = prefix[matched - 1]
+            if s2[matched] == char:
+                matched += 1
+        return s2[:matched]
+
+    @staticmethod
+    def prefix_function(s: str) -> List[int]:
+        """
+        KMP prefix function: for every position the length of the longest proper prefix of s[:i + 1],
+        which is also a suffix of it. O(len(s)).
+        :param s:
+        :return:
+        """
+        prefix = [0] * len(s)
+        for i in range(1, len(s)):
+            k = prefix[i - 1]
+            while k > 0 and s[k] != s[i]:
+                k = prefix[k - 1]
+            if s[k] == s[i]:
+                k += 1
+            prefix[i] = k
+        return prefix
+
+    @staticmethod
+    def find_covering_interval(lefts: Sequence, rights: Sequence, token_index: Any) -> int:
+        """
+        Linear lookup of the first segment (in database order) whose left_token/right_token
+        interval covers the given virtual token. Returns the position of the segment or -1 if there is none.
+        :param lefts:
+        :param rights:
+        :param token_index:
+        :return:
+        """
+        try:
+            for idx in range(len(lefts)):
+                if lefts[idx] <= token_index and rights[idx] >= token_index:
+                    return idx
+        except:
+            pass
+        return -1
+
+    @staticmethod
+    def match_tokens_to_intervals(lefts: Sequence, rights: Sequence, token_indices: Sequence) -> List[int]:
+        """
+        Interval index for the token-to-segment lookup. Returns for every token index the same position as
+        find_covering_interval, but sweeps over the tokens in sorted order: segments are opened once their
+        left_token is reached and kept in a heap ordered by their database position, segments that end
+        before the current token are dropped. Every lookup is amortized O(log n).
+        :param lefts:
+        :param rights:
+        :param token_indices:
+        :return:
+        """
+        matches = [-1] * len(token_indices)
+        if not lefts:
+            return matches
+        if not all(isinstance(left, int) for left in lefts) or not all(isinstance(right, int) for right in rights):
+            # Broken bounds (e.g. "NULL"), keep the exact semantics of the linear scan
+            return [ANNISExtractor.find_covering_interval(lefts, rights, token_index) for token_index in token_indices]
+
+        by_left = sorted(range(len(lefts)), key=lefts.__getitem__)
+        by_token = sorted((idx for idx, token_index in enumerate(token_indices) if isinstance(token_index, int)),
+                          key=token_indices.__getitem__)
+        open_segments = []
+        next_segment = 0
+        for idx in by_token:
+            token_index = token_indices[idx]
+            while next_segment < len(by_left) and lefts[by_left[next_segment]] <= token_index:
+                heapq.heappush(open_segments, by_left[next_segment])
+                next_segment += 1
+            while open_segments and rights[open_segments[0]] < token_index:
+                heapq.heappop(open_segments)
+            if open_segments:
+                matches[idx] = open_segments[0]
+        return matches
+
+    @staticmethod
+    def find_covering_segment(segment_rows: List[Tuple], token_index: Any) -> Union[Tuple, List]:
+        """
+        find_covering_interval on node rows. Returns the covering row or [].
+        :param segment_rows:
+        :param token_index:
+        :return:
+        """
+        idx = ANNISExtractor.find_covering_interval([row[-6] for row in segment_rows],
+                                                    [row[-5] for row in segment_rows],
+                                                    token_index)
+        return segment_rows[idx] if idx >= 0 else []
+
+    @staticmethod
+    def match_tokens_to_segments(segment_rows: List[Tuple], token_indices: List[Any]) -> List[Union[Tuple, List]]:
+        """
+        match_tokens_to_intervals on node rows. Returns for every token index the covering row or [].
+        :param segment_rows:
+        :param token_indices:
+        :return:
+        """
+        matches = ANNISExtractor.match_tokens_to_intervals([row[-6] for row in segment_rows],
+                                                           [row[-5] for row in segment_rows],
+                                                           token_indices)
+        return [segment_rows[idx] if idx >= 0 else [] for idx in matches]
+
+    @staticmethod
+    def compact_column(values: List[Any]) -> Union[array, List[Any]]:
+        """
+        Pack a column of token indices into an int64 array, which is much cheaper to hold and to send to
+        worker processes than python objects. Columns with broken values (e.g. "NULL") stay lists.
+        :param values:
+        :return:
+        """
+        if all(type(value) is int for value in values):
+            return array("q", values)
+        return values
+
+    @staticmethod
+    def compact_segments(segment_rows: List[Tuple]) -> Segments:
+        """
+        Reduce the node rows of a segmentation to what the tokenization needs: left_token, right_token and span.
+        :param segment_rows:
+        :return:
+        """
+        return (ANNISExtractor.compact_column([row[-6] for row in segment_rows]),
+                ANNISExtractor.compact_column([row[-5] for row in segment_rows]),
+                [row[-2] for row in segment_rows])
+
+    @staticmethod
+    def resolve_token(token_index: int,
+                      text_segment: Optional[Tuple[int, int, str]],
+                      edit_segment: Optional[Tuple[int, int, str]],
+                      split: Optional[Callable[[str], List[str]]] = None) -> str:
+        """
+        Choose the surface of a virtual token from the text and edition segments (left_token, right_token, span)
+        covering it.
+        :param token_index:
+        :param text_segment:
+        :param edit_segment:
+        :param split: splitter for the spans, add_whitespace_split by default
+        :return:
+        """
+        if split is None:
+            split = ANNISExtractor.add_whitespace_split
+        if text_segment is None and edit_segment is None:
+            return ""
+        elif text_segment is None:
+            return edit_segment[2]
+        elif edit_segment is None:
+            return text_segment[2]
+
+        text_left, text_right, text_span = text_segment
+        edit_left, edit_right, edit_span = edit_segment
+        if edit_right == edit_left and text_right == text_left:
+            return text_span
+        elif edit_right == edit_left and text_right != text_left:
+            return edit_span
+        elif edit_right != edit_left and text_right == text_left:
+            return text_span
+
+        splitted_text = split(text_span)
+        splitted_edition = split(edit_span)
+
+        if edit_right == text_right and edit_left == text_left:
+            gap_length = text_right - text_left + 1
+            if len(splitted_text) == gap_length:
+                return splitted_text[token_index - text_left]
+            elif len(splitted_edition) == gap_length:
+                return splitted_edition[token_index - edit_left]
+            else:
+                if len(splitted_text) < gap_length:
+                    splitted_text = ANNISExtractor.pad_list_with_empty(splitted_text, gap_length)
+                else:
+                    splitted_text = splitted_text[:gap_length]
+                return splitted_text[token_index - edit_left]
+        else:
+            if len(splitted_text) == text_right - text_left + 1:
+                return splitted_text[token_index - text_left]
+            elif len(splitted_edition) == edit_right - edit_left + 1:
+                return splitted_edition[token_index - edit_left]
+            else:
+                return ANNISExtractor.find_overlap(text_span, edit_span)
+
+    @staticmethod
+    def tokenize_document(token_indices: Sequence, text_segments: Segments, edit_segments: Segments) -> List[str]:
+        """
+        Tokens of one document. Only works on the compact columns (see compact_segments), so it can run
+        in a worker process without access to the database.
+        :param token_indices: virtual token indices in token order
+        :param text_segments: (lefts, rights, spans) of the text segmentation
+        :param edit_segments: (lefts, rights, spans) of the edition segmentation
+        :return:
+        """
+        text_lefts, text_rights, text_spans = text_segments
+        edit_lefts, edit_rights, edit_spans = edit_segments
+        text_matches = ANNISExtractor.match_tokens_to_intervals(text_lefts, text_rights, token_indices)
+        edit_matches = ANNISExtractor.match_tokens_to_intervals(edit_lefts, edit_rights, token_indices)
+        # A segment spanning several tokens is split once per document, not once per token
+        splits = dict()
+
+        def split(span: str) -> List[str]:
+            if span not in splits:
+                splits[span] = ANNISExtractor.add_whitespace_split(span)
+            return splits[span]
+
+        tokens = []
+        for token_index, text_idx, edit_idx in zip(token_indices, text_matches, edit_matches):
+            text_segment = (text_lefts[text_idx], text_rights[text_idx], text_spans[text_idx]) if text_idx >= 0 else None
+            edit_segment = (edit_lefts[edit_idx], edit_rights[edit_idx], edit_spans[edit_idx]) if edit_idx >= 0 else None
+            tokens.append(ANNISExtractor.resolve_token(token_index, text_segment, edit_segment, split))
+        return tokens
 
     def extract_corpus_doc_mapping(self) -> Dict[str, Dict[int, Tuple[str, int]]]:
         """
@@ -268,232 +540,160 @@ class ANNISExtractor:
             # print(1, row)
         return meta_data_per_doc
 
-    def extract_text(self):
+    def document_ids(self) -> List[Any]:
         """
-        Extract tokens (text) and token-offsets.
+        Ids of all documents with tokens, in the order of extract_text
         :return:
         """
         cursor = self.db.cursor()
+        cursor.execute(""" SELECT DISTINCT corpus_ref FROM nodes WHERE layer = "default_layer" AND seg_name = "NULL" AND root = "FALSE" """)
+        return sorted(row[0] for row in cursor.fetchall())
 
-        cursor.execute(""" SELECT * FROM nodes WHERE layer = "default_layer" AND seg_name = "NULL" AND root = "FALSE" """)
+    def iter_documents(self, doc_id: Any = None) -> Iterator[Tuple[Any, Sequence, Segments, Segments]]:
+        """
+        Read the tokenization input document by document from the database:
+        doc id, virtual token indices (in token order) and the compact text and edition segments.
+        :param doc_id: only read this document
+        :return:
+        """
+        cursor = self.db.cursor()
+
+        if doc_id is None:
+            cursor.execute(""" SELECT * FROM nodes WHERE layer = "default_layer" AND seg_name = "NULL" AND root = "FALSE" ORDER BY corpus_ref, id """)
+        else:
+            cursor.execute(""" SELECT * FROM nodes WHERE layer = "default_layer" AND seg_name = "NULL" AND root = "FALSE" AND corpus_ref = ? ORDER BY id """,
+                           (doc_id,))
         rows = cursor.fetchall()
         # Group the rows by age (use groupby after sorting)
         rows.sort(key=lambda row: row[2])  # Sort by docid (index 2)
         grouped = groupby(rows, key=lambda row: row[2])  # Group by docid (index 2)
-        tokens_per_doc = dict()
-        offsets_per_doc = dict()
-        # Print the groups
-        pbar = tqdm(desc="Tokenizing Corpus", total=len(rows))
         for doc_id, group in grouped:
             group = list(group)
             group.sort(key=lambda gr: gr[-4])
-            tokens = []
+            # ORDER BY id: the first covering segment in file order wins, independent of the index used
             cursor.execute(
-                """ SELECT * FROM nodes WHERE corpus_ref = ? AND seg_name = ? """,
+                """ SELECT * FROM nodes WHERE corpus_ref = ? AND seg_name = ? ORDER BY id """,
                 (doc_id, self.text_keyword)
             )
-            doc_id_rows_texts = cursor.fetchall()
+            text_segments = ANNISExtractor.compact_segments(cursor.fetchall())
             cursor.execute(
-                """ SELECT * FROM nodes WHERE corpus_ref = ? AND seg_name = ? """,
+                """ SELECT * FROM nodes WHERE corpus_ref = ? AND seg_name = ? ORDER BY id """,
                 (doc_id, self.edition_keyword)
             )
-            doc_id_rows_edits = cursor.fetchall()
-            for row in group:
-                text_row = []
-                edit_row = []
-                token = ""
-
-                try:
-                    for doc_id_row in doc_id_rows_texts:
-                        if doc_id_row[-6] <= row[-7] and doc_id_row[-5] >= row[-7]:
-                            text_row = doc_id_row
-                            break
-                except:
-                    text_row = []
-
-                try:
-                    for doc_id_row in doc_id_rows_edits:
-                        if doc_id_row[-6] <= row[-7] and doc_id_row[-5] >= row[-7]:
-                            edit_row = doc_id_row
-                            break
-                except:
-                    edit_row = []
-                #print(text_row)
-                # print(edit_row)
-
-                if text_row == [] and edit_row == []:
-                    pass
-                elif text_row == [] and edit_row != []:
-                    token = edit_row[-2]
-                elif text_row != [] and edit_row == []:
-                    token = text_row[-2]
-                else:
-                    if edit_row[-5] == edit_row[-6] and text_row[-5] == text_row[-6]:
-                        token = text_row[-2]
-                    elif edit_row[-5] == edit_row[-6] and text_row[-5] != text_row[-6]:
-                        token = edit_row[-2]
-                    elif edit_row[-5] != edit_row[-6] and text_row[-5] == text_row[-6]:
-                        token = text_row[-2]
-                    else:
-                        splitted_text = ANNISExtractor.add_whitespace_split(text_row[-2])
-                        splitted_edition = ANNISExtractor.add_whitespace_split(edit_row[-2])
-
-                        if edit_row[-5] == text_row[-5] and edit_row[-6] == text_row[-6]:
-                            gap_length = text_row[-5] - text_row[-6] + 1
-                            if len(splitted_text) == gap_length:
-                                token = splitted_text[row[-7] - text_row[-6]]
-                            elif len(splitted_edition) == gap_length:
-                                token = splitted_edition[row[-7] - edit_row[-6]]
-                            else:
-                                if len(splitted_text) < gap_length:
-                                    splitted_text = ANNISExtractor.pad_list_with_empty(splitted_text, gap_length)
-                                else:
-                                    splitted_text = splitted_text[:gap_length]
-                                token = splitted_text[row[-7] - edit_row[-6]]
-                        else:
-                            if len(splitted_text) == text_row[-5] - text_row[-6] + 1:
-                                token = splitted_text[row[-7] - text_row[-6]]
-                            elif len(splitted_edition) == edit_row[-5] - edit_row[-6] + 1:
-                                token = splitted_edition[row[-7] - edit_row[-6]]
-                            else:
-                                token = ANNISExtractor.find_overlap(text_row[-2], edit_row[-2])
-
-                tokens.append(token)
-                pbar.update(1)
+            edit_segments = ANNISExtractor.compact_segments(cursor.fetchall())
+            token_indices = ANNISExtractor.compact_column([row[-7] for row in group])
+            yield doc_id, token_indices, text_segments, edit_segments
+
+    def extract_text(self, doc_id: Any = None):
+        """
+        Extract tokens (text) and token-offsets (begins, ends per document, see calc_offset_columns).
+        :param doc_id: only extract this document
+        :return:
+        """
+        tokens_per_doc = dict()
+        offsets_per_doc = dict()
+        pbar = tqdm(desc="Tokenizing Corpus", disable=doc_id is not None)
+        for doc_id, token_indices, text_segments, edit_segments in self.iter_documents(doc_id):
+            tokens = ANNISExtractor.tokenize_document(token_indices, text_segments, edit_segments)
+            pbar.update(len(tokens))
             tokens_per_doc[doc_id] = tokens
-            offsets_per_doc[doc_id] = ANNISExtractor.calc_offsets(tokens)
+            offsets_per_doc[doc_id] = ANNISExtractor.calc_offset_columns(tokens)
 
         return tokens_per_doc, offsets_per_doc
 
-
-    @staticmethod
-    @deprecated
-    def extract_text_multithreaded_task(row, doc_id_rows_texts, doc_id_rows_edits):
-        token = " "
-        text_row = []
-        edit_row = []
-        try:
-            for doc_id_row in doc_id_rows_texts:
-                if doc_id_row[-6] <= row[-7] and doc_id_row[-5] >= row[-7]:
-                    text_row = doc_id_row
-                    break
-        except:
-            text_row = []
-
-        try:
-            for doc_id_row in doc_id_rows_edits:
-                if doc_id_row[-6] <= row[-7] and doc_id_row[-5] >= row[-7]:
-                    edit_row = doc_id_row
-                    break
-        except:
-            edit_row = []
-        # print(text_row)
-        # print(edit_row)
-
-        if text_row == [] and edit_row == []:
-            pass
-        elif text_row == [] and edit_row != []:
-            token = edit_row[-2]
-        elif text_row != [] and edit_row == []:
-            token = text_row[-2]
-        else:
-            if edit_row[-5] == edit_row[-6] and text_row[-5] == text_row[-6]:
-                token = text_row[-2]
-            elif edit_row[-5] == edit_row[-6] and text_row[-5] != text_row[-6]:
-                token = edit_row[-2]
-            elif edit_row[-5] != edit_row[-6] and text_row[-5] == text_row[-6]:
-                token = text_row[-2]
-            else:
-                token = ANNISExtractor.find_overlap(text_row[-2], edit_row[-2])
-
-        return token, row[-7]
-
-    @deprecated
-    def extract_text_multithreaded(self):
+    def extract_text_parallel(self, workers: int):
         """
-        Extract tokens (text) and token-offsets.
+        Same output as extract_text, but the documents are tokenized in worker processes.
+        The database is only read in this process, the workers get the compact columns of whole documents
+        (chunks of documents per task) and the results are collected in document order.
+        :param workers: number of processes, extract_text is used for workers <= 1
         :return:
         """
-        cursor = self.db.cursor()
+        if workers <= 1:
+            return self.extract_text()
+
+        doc_ids, token_columns, text_columns, edit_columns = [], [], [], []
+        for doc_id, token_indices, text_segments, edit_segments in self.iter_documents():
+            doc_ids.append(doc_id)
+            token_columns.append(token_indices)
+            text_columns.append(text_segments)
+            edit_columns.append(edit_segments)
 
-        cursor.execute(""" SELECT * FROM nodes WHERE layer = "default_layer" AND seg_name = "NULL" AND root = "FALSE" """)
-        rows = cursor.fetchall()
-        # Group the rows by age (use groupby after sorting)
-        rows.sort(key=lambda row: row[2])  # Sort by docid (index 2)
-        grouped = groupby(rows, key=lambda row: row[2])  # Group by docid (index 2)
         tokens_per_doc = dict()
         offsets_per_doc = dict()
-        # Print the groups
-        pbar = tqdm(desc="Tokenizing Corpus", total=len(rows))
-        for doc_id, group in grouped:
-            group = list(group)
-            group.sort(key=lambda gr: gr[-4])
-            cursor.execute(
-                """ SELECT * FROM nodes WHERE corpus_ref = ? AND seg_name = ? """,
-                (doc_id, self.text_keyword)
-            )
-            doc_id_rows_texts = cursor.fetchall()
-            cursor.execute(
-                """ SELECT * FROM nodes WHERE corpus_ref = ? AND seg_name = ? """,
-                (doc_id, self.edition_keyword)
-            )
-            doc_id_rows_edits = cursor.fetchall()
-
-            with ThreadPoolExecutor(max_workers=20) as executor:
-                # Use map to run tasks and collect results
-                results = executor.map(
-                    partial(ANNISExtractor.extract_text_multithreaded_task, doc_id_rows_texts=doc_id_rows_texts, doc_id_rows_edits=doc_id_rows_edits),
-                    group)
-            results = [tup[0] for tup in sorted(list(results), key=lambda x: x[1])]
-            pbar.update(len(results))
-            tokens_per_doc[doc_id] = results
-            offsets_per_doc[doc_id] = ANNISExtractor.calc_offsets(results)
+        if not doc_ids:
+            return tokens_per_doc, offsets_per_doc
+
+        pbar = tqdm(desc="Tokenizing Corpus", total=sum(len(token_indices) for token_indices in token_columns))
+        # Spawned, not forked, the extraction runs in a server with other threads (and their locks)
+        with ProcessPoolExecutor(max_workers=min(workers, len(doc_ids)),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            # A few chunks per worker, so large documents do not leave the other workers idle for long
+            chunksize = max(1, len(doc_ids) // (workers * 4))
+            results = executor.map(ANNISExtractor.tokenize_document,
+                                   token_columns, text_columns, edit_columns,
+                                   chunksize=chunksize)
+            for doc_id, tokens in zip(doc_ids, results):
+                pbar.update(len(tokens))
+                tokens_per_doc[doc_id] = tokens
+                offsets_per_doc[doc_id] = ANNISExtractor.calc_offset_columns(tokens)
 
         return tokens_per_doc, offsets_per_doc
 
-    def extract_annotations(self, tokens_per_doc, offsets_per_doc):
+    def extract_annotations(self, tokens_per_doc, offsets_per_doc, doc_id: Any = None):
         """
         Given the tokens and their offsets: Go through all annotations and find their offset.
+        The annotations of a document (followed by its tokens) are returned as AnnotationColumns.
         :param tokens_per_doc:
         :param offsets_per_doc:
+        :param doc_id: only extract the annotations of this document
         :return:
         """
         cursor = self.db.cursor()
-        cursor.execute(""" SELECT * FROM annotations """)  # exclude text:  WHERE name != "text"
-        rows = cursor.fetchall()
+        # One set-based query instead of one node lookup per annotation, streamed document by document
+        # (the annotation order within a document stays the order of node_annotation.annis)
+        if doc_id is None:
+            cursor.execute(
+                """ SELECT nodes.corpus_ref, annotations.name, annotations.value, nodes.left_token, nodes.right_token
+                    FROM annotations LEFT JOIN nodes ON nodes.id = annotations.node_ref
+                    ORDER BY nodes.corpus_ref, annotations.rowid """)  # exclude text:  WHERE name != "text"
+        else:
+            cursor.execute(
+                """ SELECT nodes.corpus_ref, annotations.name, annotations.value, nodes.left_token, nodes.right_token
+                    FROM annotations JOIN nodes ON nodes.id = annotations.node_ref
+                    WHERE nodes.corpus_ref = ?
+                    ORDER BY annotations.rowid """, (doc_id,))
 
         annotations_per_doc = dict()
 
-        for row in rows:
-            node_ref, namespace, name, value = row
-            cursor.execute("SELECT text_ref, corpus_ref, layer, name, left_token, right_token, seg_name, span FROM nodes WHERE id = ?", (node_ref,))
-            res = cursor.fetchall()
-            assert len(res) == 1
-            corpus_id, document_id, layer, node_name, token_left, token_right, seg_name, span = res[0]
-            """
-            print(corpus_id, document_id, layer, node_name, token_left, token_right, seg_name, span)
-            print(len(offsets_per_doc[document_id]))
-            print(len(tokens_per_doc[document_id]))
-            print(tokens_per_doc[document_id])
-            """
-
-            offset_left = offsets_per_doc[document_id][token_left][0]
-            offset_right = offsets_per_doc[document_id][token_right][-1]
-            if annotations_per_doc.get(document_id):
-                annotations_per_doc[document_id].append((name, value, offset_left, offset_right))
-            else:
-                annotations_per_doc[document_id] = [(name, value, offset_left, offset_right)]
+        for document_id, rows in groupby(cursor, key=lambda row: row[0]):
+            # Annotations without node (LEFT JOIN gives NULL) are broken corpora
+            assert document_id is not None
+            begins, ends = offsets_per_doc[document_id]
+            columns = AnnotationColumns()
+            for _doc_id, name, value, token_left, token_right in rows:
+                columns.append(name, value, begins[token_left], ends[token_right])
+            annotations_per_doc[document_id] = columns
 
         text_per_doc = dict()
         for key in tokens_per_doc:
-            tokens = []
             text_per_doc[key] = " ".join([ttok for ttok in tokens_per_doc[key] if ttok != ""])
-            for idx, token in enumerate(tokens_per_doc[key]):
-                tokens.append(("token", token, offsets_per_doc[key][idx][0], offsets_per_doc[key][idx][-1]))
-            annotations_per_doc[key].extend(tokens)
+            begins, ends = offsets_per_doc[key]
+            columns = annotations_per_doc.setdefault(key, AnnotationColumns())
+            columns.extend_type("token", tokens_per_doc[key], begins, ends)
+            columns.compact()
 
         return annotations_per_doc, text_per_doc,
 
+    def extract_document(self, doc_id: Any) -> Tuple[AnnotationColumns, str]:
+        """
+        Annotations and text of a single document, the same as extract_annotations(*extract_text()) gives for it
+        :param doc_id:
+        :return:
+        """
+        annotations_per_doc, text_per_doc = self.extract_annotations(*self.extract_text(doc_id), doc_id)
+        return annotations_per_doc[doc_id], text_per_doc[doc_id]
+
     @deprecated
     def extract_text_old(self) -> Dict[int, List[int]]:
         """
@@ -564,17 +764,17 @@ if __name__ == "__main__":
     fpt3 = f'{BP}/data/relannis-v1.0/relannis/ReF_v1.0_relannis_1-0/ReF_v1.0_relannis/ref-mlu/14_2-ofr'
     annis_corpus =ANNISExtractor.from_str_path(fpt1)
     annis_corpus.extract_doc_metadata(annis_corpus.extract_corpus_metadata(), annis_corpus.extract_corpus_doc_mapping())
-    """s1 = time.time()
+    s1 = time.time()
     tpd1, opd1 = annis_corpus.extract_text()
     e1 = time.time()
 
     s2 = time.time()
-    tpd2, opd2 = annis_corpus.extract_text_multithreaded()
+    tpd2, opd2 = annis_corpus.extract_text_parallel(4)
     e2 = time.time()
 
-    print("Threaded: ", e2-s2, "Single: ", e1-s1)
+    print("Parallel: ", e2-s2, "Single: ", e1-s1)
     for did in tpd1:
         print(tpd1[did])
         print(tpd2[did])
         assert tpd1[did] == tpd2[did]
-        assert opd1[did] == opd2[did]"""
+        assert opd1[did] == opd2[did]
@@ -1,7 +1,10 @@
 import io
 import zipfile
+from contextlib import ExitStack
 from io import StringIO, BytesIO
-from typing import Any, List, Union
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from api_utils.upload import DEFAULT_UPLOAD_MEMORY_THRESHOLD, spool_file
 
 
 def file_io_from_request(content: Any) -> Union[StringIO, BytesIO]:
@@ -18,18 +21,6 @@ def file_io_from_request(content: Any) -> Union[StringIO, BytesIO]:
         raise Exception("wrong input datatype")
 
 
-def read_file_as_byte(file_ref: str, zip_ref: zipfile.ZipFile) -> BytesIO:
-    """
-    read zyp file as bytes and return them in file like byte buffer.
-    :param file_ref:
-    :param zip_ref:
-    :return:
-    """
-    with zip_ref.open(file_ref) as file:
-        file_contents = file.read()  # Read file contents as bytes
-        return BytesIO(file_contents)
-
-
 def find_all_annis_corpora(zip_ref_lst: List[str]):
     """
     Find all relevant annis files in a given .zip file. Can also find multiple annis corpora
@@ -50,16 +41,19 @@ def find_all_annis_corpora(zip_ref_lst: List[str]):
     return corpora
 
 
-def files_from_zip_in_bytes(zip_bytes: Union[bytes, BytesIO], corpora_dict: dict):
+def iter_annis_corpora(zip_bytes: Union[bytes, BinaryIO],
+                       memory_threshold: int = DEFAULT_UPLOAD_MEMORY_THRESHOLD,
+                       spool_dir: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, BinaryIO]]]:
     """
-    Find all relevant annis files in a given .zip file. Can also find multiple annis corpora
-    in the gven .zip files.
+    Stream the annis corpora of a given .zip file (and of the zips nested in it) one after another. The files
+    of a corpus are the open zip members, they are decompressed while the importer reads them (and rewound
+    for another pass, e.g. corpus_hash) and closed once the iteration moves on.
     :param zip_bytes:
-    :param corpora_dict:
-    :return:
+    :param memory_threshold: nested zips beyond this many bytes are spooled to a temporary file
+    :param spool_dir: directory of the temporary files (system temp dir if not set or empty)
+    :return: (corpus path, dict of .annis filename -> file like object)
     """
     # Use BytesIO to treat the byte data as a file-like object
-    # with BytesIO(zip_bytes) as byte_io:
     if isinstance(zip_bytes, bytes):
         byte_io = BytesIO(zip_bytes)
         del zip_bytes
@@ -68,16 +62,15 @@ def files_from_zip_in_bytes(zip_bytes: Union[bytes, BytesIO], corpora_dict: dict
 
     with zipfile.ZipFile(byte_io, 'r') as zip_ref:
         # List all file names in the zip file
-        # print("Files in the ZIP archive:", zip_ref.namelist())
         corpora = find_all_annis_corpora(zip_ref.namelist())
         for key in corpora:
-            corpora_dict[key] = {file.split("/")[-1]: read_file_as_byte(file, zip_ref) for file in corpora[key]}
+            with ExitStack() as stack:
+                yield key, {file.split("/")[-1]: stack.enter_context(zip_ref.open(file)) for file in corpora[key]}
         for file in zip_ref.namelist():
             if ".zip" in file:
-                with zip_ref.open(file) as zf:
-                    file_contents = zf.read()
-                files_from_zip_in_bytes(file_contents, corpora_dict)
-
+                # Nested zips are spooled like the upload
+                with zip_ref.open(file) as zf, spool_file(zf, memory_threshold, spool_dir) as nested:
+                    yield from iter_annis_corpora(nested, memory_threshold, spool_dir)
 
 
 if __name__ == "__main__":
@@ -87,8 +80,6 @@ if __name__ == "__main__":
     with open(test_file, 'rb') as f:
         zb = f.read()
 
-    corpora_lst = dict()
-    files_from_zip_in_bytes(zb, corpora_lst)
-    for key in corpora_lst:
-        print(key, corpora_lst[key])
+    for key, corpus_files in iter_annis_corpora(zb):
+        print(key, corpus_files)
 
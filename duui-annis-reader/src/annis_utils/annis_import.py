@@ -1,6 +1,8 @@
+import io
 from io import BytesIO, StringIO
 import os
-from typing import List, Any, Union
+from itertools import islice
+from typing import List, Any, Union, IO, Iterator, Tuple
 import pandas as pd
 import sqlite3
 import csv
@@ -9,6 +11,11 @@ from abc import ABC
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
+# Page cache of the staging database during bulk load (negative cache_size = KiB)
+BULK_LOAD_CACHE_SIZE_KIB = 256 * 1024
+# Rows per executemany call when streaming an annis file into the staging database
+INSERT_BATCH_SIZE = 10000
+
 
 class ANNISImporter(ABC):
     @staticmethod
@@ -27,37 +34,107 @@ class ANNISImporter(ABC):
         return input_string  # Return the original string if no whitespace is found
 
     @staticmethod
-    def read_csv(file: Union[str, BytesIO, StringIO], seps: int) -> Any:
+    def iter_lines(file: Union[str, BytesIO, StringIO, IO[bytes]]) -> Iterator[str]:
         """
-        Read in annis file which is a tab seperated file.
+        Lazily read the lines of an annis file. Paths are read line by line, binary streams (BytesIO, zip members)
+        are decoded incrementally, so the file never has to be held in memory as a whole.
+        Lines of streams are returned without their trailing newline (like str.split("\n")).
         :param file:
-        :param seps:
         :return:
         """
         if isinstance(file, str):
             # Open and read the TSV file
             with open(file, newline='', encoding='utf-8') as cf:
-                lines = cf.readlines()
-        elif isinstance(file, BytesIO):
-            raw_text = file.read().decode("utf-8")
-            lines = raw_text.split("\n")
+                for line in cf:
+                    yield line
         elif isinstance(file, StringIO):
-            raw_text = file.read()
-            lines = raw_text.split("\n")
+            for line in file:
+                yield line[:-1] if line.endswith("\n") else line
+        elif isinstance(file, io.IOBase) and not isinstance(file, io.TextIOBase):
+            text_stream = io.TextIOWrapper(file, encoding="utf-8", newline="\n")
+            try:
+                for line in text_stream:
+                    yield line[:-1] if line.endswith("\n") else line
+            finally:
+                # Do not close the underlying stream together with the wrapper
+                text_stream.detach()
         else:
             raise Exception("read_csv needs str, BytesIO, or StringIO as Input")
-        content = []
-        for line in lines:
-            if line.count("\t") == seps:
-                content.append(line)
-            else:
+
+    @staticmethod
+    def iter_csv(file: Union[str, BytesIO, StringIO, IO[bytes]], seps: int) -> Iterator[Tuple[str, ...]]:
+        """
+        Parse an annis file (tab seperated) row by row.
+        :param file:
+        :param seps:
+        :return:
+        """
+        for line in ANNISImporter.iter_lines(file):
+            if line.count("\t") != seps:
                 if line.replace(" ", "") == "":
-                    pass
-                else:
-                    content.append(ANNISImporter.replace_last_whitespace_with_tab(line))
-        reader = [line.replace("\n", "").split("\t") for line in content]
-        reader = [tuple(row) for row in reader]
-        return reader
+                    continue
+                line = ANNISImporter.replace_last_whitespace_with_tab(line)
+            yield tuple(line.replace("\n", "").split("\t"))
+
+    @staticmethod
+    def read_csv(file: Union[str, BytesIO, StringIO], seps: int) -> Any:
+        """
+        Read in annis file which is a tab seperated file.
+        :param file:
+        :param seps:
+        :return:
+        """
+        return list(ANNISImporter.iter_csv(file, seps))
+
+    @staticmethod
+    def insert_csv(cursor: sqlite3.Cursor, table_name: str, file: Union[str, BytesIO, StringIO, IO[bytes]], seps: int,
+                   batch_size: int = INSERT_BATCH_SIZE):
+        """
+        Stream an annis file into a table, feeding executemany with batches of batch_size rows.
+        :param cursor:
+        :param table_name:
+        :param file:
+        :param seps:
+        :param batch_size:
+        :return:
+        """
+        statement = f"INSERT INTO {table_name} VALUES ({', '.join(['?'] * (seps + 1))})"
+        rows = ANNISImporter.iter_csv(file, seps)
+        while batch := list(islice(rows, batch_size)):
+            cursor.executemany(statement, batch)
+
+    @staticmethod
+    def begin_bulk_load(conn: sqlite3.Connection, cache_size_kib: int = BULK_LOAD_CACHE_SIZE_KIB) -> sqlite3.Connection:
+        """
+        Tune the staging database for one big import: no rollback journal, no fsyncs and a large page cache.
+        The staging database is rebuilt from the .annis files anyway, so there is nothing to recover.
+        :param conn:
+        :param cache_size_kib:
+        :return:
+        """
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode = OFF")
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute(f"PRAGMA cache_size = -{int(cache_size_kib)}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @staticmethod
+    def finish_bulk_load(conn: sqlite3.Connection) -> sqlite3.Connection:
+        """
+        Create the secondary indexes used by the ANNISExtractor after all rows are inserted
+        (cheaper than maintaining them during executemany) and collect statistics for the query planner.
+        :param conn:
+        :return:
+        """
+        cursor = conn.cursor()
+        # extract_text: segment rows of a document (WHERE corpus_ref = ? AND seg_name = ?)
+        cursor.execute("CREATE INDEX IF NOT EXISTS nodes_corpus_seg_left ON nodes (corpus_ref, seg_name, left_token)")
+        # extract_text: virtual tokens (WHERE layer = ? AND seg_name = ? AND root = ?), grouped by document
+        cursor.execute("CREATE INDEX IF NOT EXISTS nodes_layer_seg_root_corpus ON nodes (layer, seg_name, root, corpus_ref)")
+        cursor.execute("ANALYZE")
+        conn.commit()
+        return conn
 
     @staticmethod
     def import_nodes_annis_file_sql(file: Union[str, BytesIO, StringIO], conn: sqlite3.Connection) -> sqlite3.Connection:
@@ -92,8 +169,7 @@ class ANNISImporter(ABC):
             )
         """)
 
-        reader = ANNISImporter.read_csv(file, 13)
-        cursor.executemany(f"INSERT INTO {table_name} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", reader)
+        ANNISImporter.insert_csv(cursor, table_name, file, 13)
         conn.commit()
 
         return conn
@@ -122,8 +198,7 @@ class ANNISImporter(ABC):
             )
         """)
 
-        reader = ANNISImporter.read_csv(file, 3)
-        cursor.executemany(f"INSERT INTO {table_name} VALUES (?, ?, ?, ?)", reader)
+        ANNISImporter.insert_csv(cursor, table_name, file, 3)
         conn.commit()
 
         return conn
@@ -155,8 +230,7 @@ class ANNISImporter(ABC):
         """)
 
 
-        reader = ANNISImporter.read_csv(file, 6)
-        cursor.executemany(f"INSERT INTO {table_name} VALUES (?, ?, ?, ?, ?, ?, ?)", reader)
+        ANNISImporter.insert_csv(cursor, table_name, file, 6)
         conn.commit()
 
         return conn
@@ -185,8 +259,7 @@ class ANNISImporter(ABC):
                 """
                        )
 
-        reader = ANNISImporter.read_csv(file, 3)
-        cursor.executemany(f"INSERT INTO {table_name} VALUES (?, ?, ?, ?)", reader)
+        ANNISImporter.insert_csv(cursor, table_name, file, 3)
         conn.commit()
 
         return conn
@@ -216,8 +289,7 @@ class ANNISImporter(ABC):
                     """
                        )
 
-        reader = ANNISImporter.read_csv(file, 3)
-        cursor.executemany(f"INSERT INTO {table_name} VALUES (?, ?, ?, ?)", reader)
+        ANNISImporter.insert_csv(cursor, table_name, file, 3)
         conn.commit()
 
         return conn
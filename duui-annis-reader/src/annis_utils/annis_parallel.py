@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from io import StringIO, BytesIO
+from typing import Any, Dict, IO, Iterable, Iterator, Optional, Tuple, Union
+
+from annis_utils import ANNISExtractor, AnnotationColumns
+
+
+CorpusResult = Tuple[Dict[int, AnnotationColumns], Dict[int, str], Optional[Dict[int, Dict[str, Any]]]]
+CorpusFiles = Dict[str, Union[str, StringIO, BytesIO, IO[bytes]]]
+COPY_CHUNK_SIZE = 1024 * 1024 * 10  # 10 MB chunks
+
+
+def stage_corpus(corpus_files: CorpusFiles, database: str = ":memory:") -> ANNISExtractor:
+    """
+    Import one relannis corpus (dict of .annis filename -> file like object) into a staging database
+    :param corpus_files:
+    :param database: ":memory:" or the path of a (temporary) database file
+    :return:
+    """
+    return ANNISExtractor.from_file_like(node_file=corpus_files['node.annis'],
+                                         node_annotation_file=corpus_files['node_annotation.annis'],
+                                         corpus_file=corpus_files['corpus.annis'],
+                                         corpus_annotation_file=corpus_files['corpus_annotation.annis'],
+                                         text_file=corpus_files['text.annis'],
+                                         database=database)
+
+
+def extract_corpus(corpus_files: CorpusFiles, tokenization_workers: int = 1) -> CorpusResult:
+    """
+    Import and extract one relannis corpus (dict of .annis filename -> file like object)
+    :param corpus_files:
+    :param tokenization_workers: tokenize the documents in worker processes if > 1
+    :return: annotations, text and meta data per document
+    """
+    annis_corpus = stage_corpus(corpus_files)
+    apd, tpd = annis_corpus.extract_annotations(*annis_corpus.extract_text_parallel(tokenization_workers))
+
+    try:
+        mpd = annis_corpus.extract_doc_metadata(annis_corpus.extract_corpus_metadata(), annis_corpus.extract_corpus_doc_mapping())
+    except Exception as e:
+        print(e)
+        mpd = None
+    annis_corpus.db.close()
+    return apd, tpd, mpd
+
+
+def copy_corpus_files(corpus_files: CorpusFiles, directory: str) -> Dict[str, str]:
+    """
+    Copy the .annis files of a corpus into a directory, for a worker process (see extract_corpus_files)
+    :param corpus_files:
+    :param directory:
+    :return: dict of .annis filename -> path
+    """
+    paths = dict()
+    for name, file in corpus_files.items():
+        paths[name] = os.path.join(directory, name)
+        if isinstance(file, str):
+            shutil.copyfile(file, paths[name])
+        elif isinstance(file, StringIO):
+            with open(paths[name], "w", encoding="utf-8", newline="") as target:
+                target.write(file.getvalue())
+        else:
+            with open(paths[name], "wb") as target:
+                shutil.copyfileobj(file, target, COPY_CHUNK_SIZE)
+    return paths
+
+
+def extract_corpus_files(paths: Dict[str, str]) -> CorpusResult:
+    """
+    extract_corpus of the copies of copy_corpus_files, read as byte streams like the files of the upload
+    :param paths:
+    :return:
+    """
+    with ExitStack() as stack:
+        return extract_corpus({name: stack.enter_context(open(path, "rb")) for name, path in paths.items()})
+
+
+def next_result(pending: deque) -> CorpusResult:
+    result, directory = pending.popleft()
+    if directory is None:
+        return result
+    try:
+        return result.result()
+    finally:
+        directory.cleanup()
+
+
+def extract_corpora(corpora: Iterable[Union[CorpusFiles, CorpusResult]],
+                    workers: int = 1,
+                    tokenization_workers: int = 1,
+                    spool_dir: Optional[str] = None) -> Iterator[CorpusResult]:
+    """
+    Extract several relannis corpora, one corpus per worker process if workers > 1.
+    The corpora can be streamed (see iter_annis_corpora), a corpus is read before the next one is taken. Worker
+    processes get a copy of their corpus in a temporary directory, at most workers + 1 corpora are submitted at
+    a time. Results that are known already (a tuple, e.g. from the cache) are passed through.
+    Results are yielded in the order of the given corpora, so the document order does not depend on
+    which worker finishes first.
+    The documents of a corpus are only tokenized in parallel (tokenization_workers), if the corpora
+    are extracted one after another, worker processes do not start pools of their own.
+    :param corpora:
+    :param workers:
+    :param tokenization_workers:
+    :param spool_dir: directory of the copies for the worker processes (system temp dir if not set or empty)
+    :return:
+    """
+    if workers <= 1:
+        for corpus in corpora:
+            yield corpus if isinstance(corpus, tuple) else extract_corpus(corpus, tokenization_workers)
+        return
+
+    # (future, temporary directory) of submitted corpora, (result, None) of known results, in the order of corpora
+    pending = deque()
+    try:
+        # Workers are spawned, forking the server would copy its threads' locks in whatever state they are
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            try:
+                for corpus in corpora:
+                    if isinstance(corpus, tuple):
+                        pending.append((corpus, None))
+                    else:
+                        directory = tempfile.TemporaryDirectory(prefix="annis-", dir=spool_dir or None)
+                        pending.append((None, directory))
+                        paths = copy_corpus_files(corpus, directory.name)
+                        pending[-1] = (executor.submit(extract_corpus_files, paths), directory)
+                    while len(pending) > workers or (pending and pending[0][1] is None):
+                        yield next_result(pending)
+                while pending:
+                    yield next_result(pending)
+            finally:
+                # Corpora that were not extracted yet (the caller stopped early or an error occurred)
+                for future, directory in pending:
+                    if future is not None and directory is not None:
+                        future.cancel()
+    finally:
+        # Once the workers are shut down
+        for _, directory in pending:
+            if directory is not None:
+                directory.cleanup()
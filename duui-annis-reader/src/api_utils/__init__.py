@@ -1,2 +1,8 @@
 from .annotations import *
-from .document_queue import DocumentQueue, AnnisDocument
\ No newline at end of file
+from .document_queue import DocumentQueue, AnnisDocument, AnnisDocumentHandle
+from .spill_queue import SpillQueue
+from .response import RESPONSE_FIELDS, serialize_document, serialize_document_columnar, serialize_not_accepted
+from .batch import batch_response
+from .compression import compress_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
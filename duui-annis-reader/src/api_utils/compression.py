@@ -0,0 +1,36 @@
+import gzip
+from typing import Optional, Union
+
+from pydantic import BaseModel
+from starlette.responses import Response
+
+from .batch import document_json
+
+
+DEFAULT_COMPRESSION_THRESHOLD = 64 * 1024
+DEFAULT_COMPRESSION_LEVEL = 1
+
+
+def compress_response(response: Union[Response, BaseModel, bytes], compression: Optional[str],
+                      threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                      level: int = DEFAULT_COMPRESSION_LEVEL) -> Union[Response, BaseModel]:
+    """
+    Compress a /v1/process response with gzip if the client accepts it (compression is a comma separated list like
+    Accept-Encoding, e.g. "gzip") and the body has at least threshold bytes. The compressed body has no
+    Content-Encoding header, communication.lua recognizes it by the gzip magic number.
+    Without an accepted compression the response is returned unchanged.
+    :param response: response (model) or JSON body
+    :param compression: compressions the client can decompress
+    :param threshold: minimal size of the body in bytes
+    :param level: gzip compression level
+    :return:
+    """
+    if compression is None or "gzip" not in [name.strip() for name in compression.split(",")]:
+        return response
+    if isinstance(response, Response):
+        body = response.body
+    else:
+        body = document_json(response)
+    if len(body) < threshold:
+        return Response(content=body, media_type="application/json")
+    return Response(content=gzip.compress(body, compresslevel=level, mtime=0), media_type="application/gzip")
@@ -1,6 +1,10 @@
+import threading
 from dataclasses import dataclass
 from typing import List, Tuple, Any, Dict, Optional, Union
 
+from annis_utils import AnnotationColumns, ANNISExtractor
+from .spill_queue import SpillQueue, DEFAULT_MEMORY_BUDGET
+
 
 class AnnisDocument:
     """
@@ -8,13 +12,12 @@ class AnnisDocument:
     """
     def __init__(self,
                  text: str,
-                 annotations: List[Tuple[str, str, int, int]],
+                 annotations: AnnotationColumns,
                  meta_data: Dict[str, Any]
                  ):
         self.text = text
-        for i in range(len(annotations)):
-            annotations[i] = (annotations[i][0], {"begin": annotations[i][2], "end": annotations[i][3], "value": annotations[i][1]})
-        self.annotations: List[Tuple[str, Dict[str, Union[str, int]]]] = annotations
+        # Kept columnar until the document is serialized, see AnnotationColumns.group_by_type
+        self.annotations: AnnotationColumns = annotations
         if meta_data is None:
             self.meta_data = meta_data
         else:
@@ -28,51 +31,121 @@ class AnnisDocument:
             print(anno)"""
 
 
+class AnnisCorpusHandle:
+    """
+    Staging database of a corpus, whose documents are only extracted when they are taken from the queue
+    """
+    def __init__(self, corpus: ANNISExtractor, n_docs: int):
+        self.corpus = corpus
+        self.remaining = n_docs
+        self.meta_data_per_doc: Optional[Dict[Any, Dict[str, Any]]] = None
+        self.meta_data_loaded = False
+        # /v1/process runs in the threadpool of the api, sqlite connections must not be shared concurrently
+        self.lock = threading.Lock()
+
+    def load(self, doc_id: Any) -> AnnisDocument:
+        """
+        Extract one document, the staging database is closed after the last one
+        :param doc_id:
+        :return:
+        """
+        with self.lock:
+            annotations, text = self.corpus.extract_document(doc_id)
+            if not self.meta_data_loaded:
+                try:
+                    self.meta_data_per_doc = self.corpus.extract_doc_metadata(self.corpus.extract_corpus_metadata(),
+                                                                              self.corpus.extract_corpus_doc_mapping())
+                except Exception as e:
+                    print(e)
+                self.meta_data_loaded = True
+            meta_data = self.meta_data_per_doc.get(doc_id) if self.meta_data_per_doc is not None else None
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.corpus.close()
+        return AnnisDocument(text=text, annotations=annotations, meta_data=meta_data)
+
+
+class AnnisDocumentHandle:
+    """
+    Lightweight queue entry for a document, that is not extracted yet
+    """
+    __slots__ = ("corpus", "doc_id")
+
+    def __init__(self, corpus: AnnisCorpusHandle, doc_id: Any):
+        self.corpus = corpus
+        self.doc_id = doc_id
+
+    def load(self) -> AnnisDocument:
+        return self.corpus.load(self.doc_id)
+
+
 class DocumentQueue:
-    def __init__(self):
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, spill_dir: Optional[str] = None):
         """
-        Queue for annis documents, that are waiting for further processing
+        Queue for annis documents, that are waiting for further processing.
+        Documents beyond memory_budget bytes are spilled to disk (see SpillQueue).
+        :param memory_budget:
+        :param spill_dir:
         """
-        self.docs: List[AnnisDocument] = []
+        self.docs = SpillQueue(memory_budget, spill_dir)
 
     def has_next(self):
         """
         Queue is not empty
         :return:
         """
-        if self.docs:
+        if not self.docs.empty():
             return True
         else:
             return False
 
     def next(self) -> AnnisDocument:
         """
-        Return next element in the Queue
+        Return next element in the Queue (documents added by fill_lazy are extracted now)
         :return:
         """
-        return self.docs.pop()
+        doc = self.docs.get()
+        if isinstance(doc, AnnisDocumentHandle):
+            return doc.load()
+        return doc
 
     def get_count(self) -> int:
         """
         Get element count
         :return:
         """
-        return len(self.docs)
+        return self.docs.qsize()
 
     def fill(self,
-             annotations_per_doc: Dict[int, List[Tuple[str, str, int, int]]],
+             annotations_per_doc: Dict[int, AnnotationColumns],
              text_per_document: Dict[int, str],
-             meta_data_per_document: Optional[Dict[int, Dict[str, Any]]]):
+             meta_data_per_document: Optional[Dict[int, Dict[str, Any]]]) -> int:
         """
         Fill Queue with documents
         :param annotations_per_doc:
         :param text_per_document:
         :param meta_data_per_document:
-        :return:
+        :return: number of documents
         """
         for key in text_per_document:
             # print(annotations_per_doc[key])
-            self.docs.append(AnnisDocument(text=text_per_document[key],
-                                           annotations=annotations_per_doc[key],
-                                           meta_data=meta_data_per_document.get(key) if meta_data_per_document is not None else None))
+            self.docs.put(AnnisDocument(text=text_per_document[key],
+                                        annotations=annotations_per_doc[key],
+                                        meta_data=meta_data_per_document.get(key) if meta_data_per_document is not None else None))
+        return len(text_per_document)
 
+    def fill_lazy(self, corpus: ANNISExtractor) -> int:
+        """
+        Fill Queue with handles to the documents of a staged corpus, the documents are extracted in next
+        :param corpus:
+        :return: number of documents
+        """
+        doc_ids = corpus.document_ids()
+        if not doc_ids:
+            corpus.close()
+            return 0
+        corpus_handle = AnnisCorpusHandle(corpus, len(doc_ids))
+        for doc_id in doc_ids:
+            # Handles share the staging database and can not be spilled, they hardly take any memory
+            self.docs.put(AnnisDocumentHandle(corpus_handle, doc_id), size=0)
+        return len(doc_ids)
@@ -0,0 +1,94 @@
+from typing import Any, Dict, List, Tuple
+
+import orjson
+
+from .annotations import *
+from .document_queue import AnnisDocument
+
+
+# Annotation lists of the DUUIResponse, in the order of its fields
+RESPONSE_FIELDS: List[Tuple[str, Any]] = [
+    ("token", Token),
+    ("plain_text", PlainText),
+    ("lang", Lang),
+    ("lemma", Lemma),
+    ("document", Document),
+    ("verse", Verse),
+    ("line", Line),
+    ("writer", Writer),
+    ("pos", Pos),
+    ("clause", Clause),
+    ("inflection_class_lemma", InflectionClassLemma),
+    ("subchapter", Subchapter),
+    ("posLemma", PosLemma),
+    ("inflection", Inflection),
+    ("line_m", Line_m),
+    ("page", Page),
+    ("rhyme", Rhyme),
+    ("translation", Translation),
+    ("chapter", Chapter),
+    ("inflectionClass", InflectionClass),
+    ("edition", Edition),
+]
+FIELD_PER_MODEL = {model: field for field, model in RESPONSE_FIELDS}
+FIELD_PER_MODEL[DocumentMetaData] = "meta_data"
+
+
+def serialize_document(doc: AnnisDocument) -> bytes:
+    """
+    JSON body of an accepted /v1/process response, written directly from the columnar annotations.
+    Same bytes as the validated DUUIResponse, without creating a pydantic model per annotation.
+    :param doc:
+    :return:
+    """
+    content: Dict[str, Any] = {field: [] for field, _ in RESPONSE_FIELDS}
+    content["sofa_str"] = doc.text
+    content["meta_data"] = []
+    for name, annotations in doc.annotations.group_by_type().items():
+        content[FIELD_PER_MODEL[mapping[name]]].extend(annotations)
+    if doc.meta_data is not None:
+        for _name, meta_data in doc.meta_data:
+            content["meta_data"].append({"key": meta_data["key"], "value": meta_data["value"]})
+    content["accepted"] = True
+    return orjson.dumps(content)
+
+
+def serialize_document_columnar(doc: AnnisDocument) -> bytes:
+    """
+    JSON body of an accepted /v1/process response in the columnar format: instead of a list of
+    {"begin", "end", "value"} objects per field, "columns" holds per field the parallel lists "begin", "end" and
+    "value_idx" (0-based index into the shared string table "strings"). sofa_str, meta_data and accepted are the
+    same as in the row format, fields without annotations are left out.
+    :param doc:
+    :return:
+    """
+    columns: Dict[str, Dict[str, List[int]]] = {}
+    for name, (begins, ends, value_ids) in doc.annotations.columns_by_type().items():
+        field = FIELD_PER_MODEL[mapping[name]]
+        if field in columns:
+            columns[field]["begin"].extend(begins)
+            columns[field]["end"].extend(ends)
+            columns[field]["value_idx"].extend(value_ids)
+        else:
+            columns[field] = {"begin": begins, "end": ends, "value_idx": value_ids}
+    meta_data = []
+    if doc.meta_data is not None:
+        for _name, meta_data_anno in doc.meta_data:
+            meta_data.append({"key": meta_data_anno["key"], "value": meta_data_anno["value"]})
+    return orjson.dumps({"sofa_str": doc.text,
+                         "strings": doc.annotations.values,
+                         "columns": columns,
+                         "meta_data": meta_data,
+                         "accepted": True})
+
+
+def serialize_not_accepted() -> bytes:
+    """
+    JSON body of the /v1/process response for an empty queue
+    :return:
+    """
+    content: Dict[str, Any] = {field: None for field, _ in RESPONSE_FIELDS}
+    content["sofa_str"] = None
+    content["meta_data"] = None
+    content["accepted"] = False
+    return orjson.dumps(content)
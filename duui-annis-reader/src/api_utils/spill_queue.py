@@ -0,0 +1,132 @@
+import pickle
+import struct
+import tempfile
+import threading
+from array import array
+from collections import deque
+from queue import Empty
+from typing import Any, Optional
+
+
+# Length prefix of a record in the spill file
+RECORD_HEADER = struct.Struct(">Q")
+DEFAULT_MEMORY_BUDGET = 1024 ** 3
+# Bytes counted per container and per scalar, and elements looked at in long sequences, by estimate_size
+CONTAINER_OVERHEAD = 8
+SCALAR_SIZE = 8
+SAMPLE_SIZE = 16
+
+
+def estimate_size(item: Any) -> int:
+    """
+    Rough size of an item in bytes (close to the length of its pickle) without serializing it.
+    Text and arrays count with their length in bytes, long sequences are extrapolated from SAMPLE_SIZE evenly
+    spaced elements and other objects are estimated from their attributes (__dict__ and __slots__)
+    :param item:
+    :return:
+    """
+    if item is None or isinstance(item, (int, float)):
+        return SCALAR_SIZE
+    if isinstance(item, (str, bytes, bytearray)):
+        return len(item)
+    if isinstance(item, array):
+        return len(item) * item.itemsize
+    if isinstance(item, (tuple, list, deque)):
+        if len(item) <= SAMPLE_SIZE:
+            return CONTAINER_OVERHEAD + sum(estimate_size(element) for element in item)
+        step = len(item) / SAMPLE_SIZE
+        sample = sum(estimate_size(item[int(i * step)]) for i in range(SAMPLE_SIZE))
+        return CONTAINER_OVERHEAD + sample * len(item) // SAMPLE_SIZE
+    if isinstance(item, (set, frozenset)):
+        return CONTAINER_OVERHEAD + sum(estimate_size(element) for element in item)
+    if isinstance(item, dict):
+        return CONTAINER_OVERHEAD + sum(estimate_size(key) + estimate_size(value) for key, value in item.items())
+    size = CONTAINER_OVERHEAD
+    if hasattr(item, "__dict__"):
+        size += estimate_size(vars(item))
+    # Slotted objects (e.g. columnar annotations) keep their attributes outside of __dict__, dunder slots are
+    # bookkeeping (__weakref__, pydantic's __pydantic_fields_set__, ...)
+    for cls in type(item).__mro__:
+        slots = getattr(cls, "__slots__", ())
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            if not slot.startswith("__"):
+                size += estimate_size(getattr(item, slot, None))
+    return size
+
+
+class SpillQueue:
+    """
+    FIFO queue for the documents of an upload, with the interface of queue.Queue used by the readers
+    (put, get, empty, qsize). Documents are kept in memory until their (estimated) size exceeds memory_budget,
+    the rest is appended to a spill file (length prefixed pickle records) and read back in order.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, spill_dir: Optional[str] = None):
+        """
+        :param memory_budget: bytes of documents kept in memory
+        :param spill_dir: directory of the spill file (system temp dir if not set or empty)
+        """
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.memory = deque()
+        self.memory_bytes = 0
+        self.spill_file = None
+        self.spill_count = 0
+        self.read_offset = 0
+        self.write_offset = 0
+        self.lock = threading.Lock()
+
+    def qsize(self) -> int:
+        return len(self.memory) + self.spill_count
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def put(self, item: Any, size: Optional[int] = None):
+        """
+        Add an item at the end of the queue
+        :param item:
+        :param size: size of the item in bytes, if known (otherwise estimated, see estimate_size)
+        :return:
+        """
+        if size is None:
+            size = estimate_size(item)
+        with self.lock:
+            # Once something is spilled, everything after it has to be spilled as well to keep the order
+            if self.spill_count == 0 and self.memory_bytes + size <= self.memory_budget:
+                self.memory.append((item, size))
+                self.memory_bytes += size
+                return
+            # Only spilled items are pickled
+            data = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+            if self.spill_file is None:
+                self.spill_file = tempfile.TemporaryFile(dir=self.spill_dir or None, suffix=".spill")
+            self.spill_file.seek(self.write_offset)
+            self.spill_file.write(RECORD_HEADER.pack(len(data)))
+            self.spill_file.write(data)
+            self.write_offset += RECORD_HEADER.size + len(data)
+            self.spill_count += 1
+
+    def get(self) -> Any:
+        """
+        Remove and return the first item of the queue, raises queue.Empty if there is none
+        :return:
+        """
+        with self.lock:
+            if self.memory:
+                item, size = self.memory.popleft()
+                self.memory_bytes -= size
+                return item
+            if self.spill_count == 0:
+                raise Empty
+            self.spill_file.seek(self.read_offset)
+            (length,) = RECORD_HEADER.unpack(self.spill_file.read(RECORD_HEADER.size))
+            data = self.spill_file.read(length)
+            self.read_offset += RECORD_HEADER.size + length
+            self.spill_count -= 1
+            if self.spill_count == 0:
+                # Everything is read back, free the disk space
+                self.spill_file.seek(0)
+                self.spill_file.truncate()
+                self.read_offset = self.write_offset = 0
+        return pickle.loads(data)
@@ -27,14 +27,86 @@ util = luajava.bindClass("org.apache.uima.fit.util.JCasUtil")
 DocumentMetaData = luajava.bindClass("de.tudarmstadt.ukp.dkpro.core.api.metadata.type.DocumentMetaData")
 
 
+-- Batch mode: documents of a batch response that are not deserialized yet. The first document of a batch
+-- goes into the current CAS, the others into the next CASes (in order). They belong to this Lua state,
+-- so the batch mode needs a single instance of the reader component.
+pending_documents = {}
+
 -- This "serialize" function is called to transform the CAS object into an stream that is sent to the annotator
 -- Inputs:
 --  - inputCas: The actual CAS object to serialize
 --  - outputStream: Stream that is sent to the annotator, can be e.g. a string, JSON payload, ...
+--  - params: Parameters of the component, max_docs and/or max_bytes switch on the batch mode,
+--            columnar = "false" asks for the row format of the annotations,
+--            compression = "none" turns off the gzip compression of large responses
 function serialize(inputCas, outputStream, params)
-    outputStream:write(json.encode({
-        msg = "test"
-    }))
+    local request = {
+        msg = "test",
+        compression = "gzip",
+        columnar = params == null or params["columnar"] ~= "false"
+    }
+    if #pending_documents > 0 then
+        -- The next document is already buffered, ask for an empty batch
+        request["max_docs"] = 0
+    elseif params ~= null then
+        if params["compression"] ~= null then
+            request["compression"] = params["compression"]
+        end
+        if params["max_docs"] ~= null then
+            request["max_docs"] = tonumber(params["max_docs"])
+        end
+        if params["max_bytes"] ~= null then
+            request["max_bytes"] = tonumber(params["max_bytes"])
+        end
+    end
+    outputStream:write(json.encode(request))
+end
+
+-- Annotations of a field in both wire formats: the list of {begin, end, value} objects (results[field]) or,
+-- in the columnar format, the parallel lists begin, end and value_idx (results["columns"][field]) that refer
+-- to the string table results["strings"]
+function annotation_layer(results, field)
+    if results["columns"] ~= null then
+        return results["columns"][field]
+    end
+    return results[field]
+end
+
+-- Iterate over the annotations of a field as (i, annotation) in both wire formats. For the columnar format
+-- the annotation table is reused in every step, so it must not be kept.
+function annotations(results, field)
+    local layer = annotation_layer(results, field)
+    if results["columns"] == null then
+        return ipairs(layer)
+    end
+    local begins = layer["begin"]
+    local ends = layer["end"]
+    local value_idx = layer["value_idx"]
+    local strings = results["strings"]
+    local annotation = {}
+    local i = 0
+    return function()
+        i = i + 1
+        if begins[i] == nil then
+            return nil
+        end
+        annotation["begin"] = begins[i]
+        annotation["end"] = ends[i]
+        annotation["value"] = strings[value_idx[i] + 1]
+        return i, annotation
+    end
+end
+
+-- Body of a /v1/process response, gzip compressed bodies (see compression in serialize) are decompressed
+function read_response(inputStream)
+    local inputBytes = inputStream:readAllBytes()
+    -- gzip magic number 1f 8b (Java bytes are signed), a JSON body never starts with it
+    if inputBytes.length >= 2 and inputBytes[1] == 31 and inputBytes[2] == -117 then
+        local gzipStream = luajava.newInstance("java.util.zip.GZIPInputStream", luajava.newInstance("java.io.ByteArrayInputStream", inputBytes))
+        inputBytes = gzipStream:readAllBytes()
+        gzipStream:close()
+    end
+    return inputBytes
 end
 
 -- This "deserialize" function is called on receiving the results from the annotator that have to be transformed into a CAS object
@@ -43,11 +115,26 @@ end
 --  - inputStream: Stream that is received from to the annotator, can be e.g. a string, JSON payload, ...
 function deserialize(inputCas, inputStream)
     -- Get string from stream, assume UTF-8 encoding
-    local inputString = luajava.newInstance("java.lang.String", inputStream:readAllBytes(), StandardCharsets.UTF_8)
+    local inputString = luajava.newInstance("java.lang.String", read_response(inputStream), StandardCharsets.UTF_8)
 
     -- Parse JSON data from string into object
     local results = json.decode(inputString)
 
+    if results["documents"] ~= null then
+        for i, document in ipairs(results["documents"]) do
+            table.insert(pending_documents, document)
+        end
+        results = table.remove(pending_documents, 1)
+        if results == nil then
+            results = {accepted = false}
+        end
+    end
+
+    deserialize_document(inputCas, results)
+end
+
+-- Fill the CAS with one document (a single /v1/process response or one document of a batch response)
+function deserialize_document(inputCas, results)
     inputCas:setDocumentText(results["sofa_str"])
 
     if util:select(inputCas, DocumentMetaData):isEmpty() then
@@ -83,8 +170,8 @@ function deserialize(inputCas, inputStream)
     -- Token
     local token_list = {}
     local token_counter = 1
-    if results["token"] ~= null then
-        for i, tok in ipairs(results["token"]) do
+    if annotation_layer(results, "token") ~= null then
+        for i, tok in annotations(results, "token") do
             local token_obj = luajava.newInstance("de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Token", inputCas)
             token_obj:setBegin(tok["begin"])
             token_obj:setEnd(tok["end"])
@@ -98,8 +185,8 @@ function deserialize(inputCas, inputStream)
     -- POS
     local pos_list = {}
     local pos_counter = 1
-    if results["pos"] ~= null then
-        for i, pos in ipairs(results["pos"]) do
+    if annotation_layer(results, "pos") ~= null then
+        for i, pos in annotations(results, "pos") do
             local pos_obj = luajava.newInstance("de.tudarmstadt.ukp.dkpro.core.api.lexmorph.type.pos.POS", inputCas)
             pos_obj:setBegin(pos["begin"])
             pos_obj:setEnd(pos["end"])
@@ -114,8 +201,8 @@ function deserialize(inputCas, inputStream)
     -- Lang
     local lang_list = {}
     local lang_counter = 1
-    if results["lang"] ~= null then
-        for i, lang in ipairs(results["lang"]) do
+    if annotation_layer(results, "lang") ~= null then
+        for i, lang in annotations(results, "lang") do
             local lang_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Language", inputCas)
             lang_obj:setBegin(lang["begin"])
             lang_obj:setEnd(lang["end"])
@@ -129,8 +216,8 @@ function deserialize(inputCas, inputStream)
     -- Lemma
     local lemma_list = {}
     local lemma_counter = 1
-    if results["lemma"] ~= null then
-        for i, lemma in ipairs(results["lemma"]) do
+    if annotation_layer(results, "lemma") ~= null then
+        for i, lemma in annotations(results, "lemma") do
             local lemma_obj = luajava.newInstance("de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Lemma", inputCas)
             lemma_obj:setBegin(lemma["begin"])
             lemma_obj:setEnd(lemma["end"])
@@ -144,8 +231,8 @@ function deserialize(inputCas, inputStream)
     --[[Document
     local document_list = {}
     local document_counter = 1
-    if results["document"] ~= null then
-        for i, document in ipairs(results["document"]) do
+    if annotation_layer(results, "document") ~= null then
+        for i, document in annotations(results, "document") do
             local document_obj = luajava.newInstance(Document, inputCas)
             document_obj:setBegin(document["begin"])
             document_obj:setEnd(document["end"])
@@ -160,8 +247,8 @@ function deserialize(inputCas, inputStream)
     -- Verse
     local verse_list = {}
     local verse_counter = 1
-    if results["verse"] ~= null then
-        for i, verse in ipairs(results["verse"]) do
+    if annotation_layer(results, "verse") ~= null then
+        for i, verse in annotations(results, "verse") do
             local verse_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Verse", inputCas)
             verse_obj:setBegin(verse["begin"])
             verse_obj:setEnd(verse["end"])
@@ -175,8 +262,8 @@ function deserialize(inputCas, inputStream)
     -- Line
     local line_list = {}
     local line_counter = 1
-    if results["line"] ~= null then
-        for i, line in ipairs(results["line"]) do
+    if annotation_layer(results, "line") ~= null then
+        for i, line in annotations(results, "line") do
             local line_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Line", inputCas)
             line_obj:setBegin(line["begin"])
             line_obj:setEnd(line["end"])
@@ -190,8 +277,8 @@ function deserialize(inputCas, inputStream)
     -- Writer
     local writer_list = {}
     local writer_counter = 1
-    if results["writer"] ~= null then
-        for i, writer in ipairs(results["writer"]) do
+    if annotation_layer(results, "writer") ~= null then
+        for i, writer in annotations(results, "writer") do
             local writer_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Writer", inputCas)
             writer_obj:setBegin(writer["begin"])
             writer_obj:setEnd(writer["end"])
@@ -205,8 +292,8 @@ function deserialize(inputCas, inputStream)
     -- Clause
     local clause_list = {}
     local clause_counter = 1
-    if results["clause"] ~= null then
-        for i, clause in ipairs(results["clause"]) do
+    if annotation_layer(results, "clause") ~= null then
+        for i, clause in annotations(results, "clause") do
             local clause_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Clause", inputCas)
             clause_obj:setBegin(clause["begin"])
             clause_obj:setEnd(clause["end"])
@@ -220,8 +307,8 @@ function deserialize(inputCas, inputStream)
     -- InflectionClassLemma
     local inflectionClassLemma_list = {}
     local inflectionClassLemma_counter = 1
-    if results["inflectionClassLemma"] ~= null then
-        for i, icl in ipairs(results["inflectionClassLemma"]) do
+    if annotation_layer(results, "inflectionClassLemma") ~= null then
+        for i, icl in annotations(results, "inflectionClassLemma") do
             local icl_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.InflectionClassLemma", inputCas)
             icl_obj:setBegin(icl["begin"])
             icl_obj:setEnd(icl["end"])
@@ -235,8 +322,8 @@ function deserialize(inputCas, inputStream)
     -- Subchapter
     local subchapter_list = {}
     local subchapter_counter = 1
-    if results["subchapter"] ~= null then
-        for i, subchapter in ipairs(results["subchapter"]) do
+    if annotation_layer(results, "subchapter") ~= null then
+        for i, subchapter in annotations(results, "subchapter") do
             local subchapter_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.SubChapter", inputCas)
             subchapter_obj:setBegin(subchapter["begin"])
             subchapter_obj:setEnd(subchapter["end"])
@@ -250,8 +337,8 @@ function deserialize(inputCas, inputStream)
     -- PosLemma
     local posLemma_list = {}
     local posLemma_counter = 1
-    if results["posLemma"] ~= null then
-        for i, posLemma in ipairs(results["posLemma"]) do
+    if annotation_layer(results, "posLemma") ~= null then
+        for i, posLemma in annotations(results, "posLemma") do
             local posLemma_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.PosLemma", inputCas)
             posLemma_obj:setBegin(posLemma["begin"])
             posLemma_obj:setEnd(posLemma["end"])
@@ -265,8 +352,8 @@ function deserialize(inputCas, inputStream)
     -- Inflection
     local inflection_list = {}
     local inflection_counter = 1
-    if results["inflection"] ~= null then
-        for i, inflection in ipairs(results["inflection"]) do
+    if annotation_layer(results, "inflection") ~= null then
+        for i, inflection in annotations(results, "inflection") do
             local inflection_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Inflection", inputCas)
             inflection_obj:setBegin(inflection["begin"])
             inflection_obj:setEnd(inflection["end"])
@@ -280,8 +367,8 @@ function deserialize(inputCas, inputStream)
     --[[Line_m
     local line_m_list = {}
     local line_m_counter = 1
-    if results["line_m"] ~= null then
-        for i, line_m in ipairs(results["line_m"]) do
+    if annotation_layer(results, "line_m") ~= null then
+        for i, line_m in annotations(results, "line_m") do
             local line_m_obj = luajava.newInstance(Line_m, inputCas)
             line_m_obj:setBegin(line_m["begin"])
             line_m_obj:setEnd(line_m["end"])
@@ -296,8 +383,8 @@ function deserialize(inputCas, inputStream)
     -- Page
     local page_list = {}
     local page_counter = 1
-    if results["page"] ~= null then
-        for i, page in ipairs(results["page"]) do
+    if annotation_layer(results, "page") ~= null then
+        for i, page in annotations(results, "page") do
             local page_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Page", inputCas)
             page_obj:setBegin(page["begin"])
             page_obj:setEnd(page["end"])
@@ -311,8 +398,8 @@ function deserialize(inputCas, inputStream)
     -- Rhyme
     local rhyme_list = {}
     local rhyme_counter = 1
-    if results["rhyme"] ~= null then
-        for i, rhyme in ipairs(results["rhyme"]) do
+    if annotation_layer(results, "rhyme") ~= null then
+        for i, rhyme in annotations(results, "rhyme") do
             local rhyme_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Rhyme", inputCas)
             rhyme_obj:setBegin(rhyme["begin"])
             rhyme_obj:setEnd(rhyme["end"])
@@ -326,8 +413,8 @@ function deserialize(inputCas, inputStream)
     -- Translation
     local translation_list = {}
     local translation_counter = 1
-    if results["translation"] ~= null then
-        for i, translation in ipairs(results["translation"]) do
+    if annotation_layer(results, "translation") ~= null then
+        for i, translation in annotations(results, "translation") do
             local translation_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Translation", inputCas)
             translation_obj:setBegin(translation["begin"])
             translation_obj:setEnd(translation["end"])
@@ -341,8 +428,8 @@ function deserialize(inputCas, inputStream)
     -- Chapter
     local chapter_list = {}
     local chapter_counter = 1
-    if results["chapter"] ~= null then
-        for i, chapter in ipairs(results["chapter"]) do
+    if annotation_layer(results, "chapter") ~= null then
+        for i, chapter in annotations(results, "chapter") do
             local chapter_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Chapter", inputCas)
             chapter_obj:setBegin(chapter["begin"])
             chapter_obj:setEnd(chapter["end"])
@@ -356,8 +443,8 @@ function deserialize(inputCas, inputStream)
     -- InflectionClass
     local inflectionClass_list = {}
     local inflectionClass_counter = 1
-    if results["inflectionClass"] ~= null then
-        for i, ic in ipairs(results["inflectionClass"]) do
+    if annotation_layer(results, "inflectionClass") ~= null then
+        for i, ic in annotations(results, "inflectionClass") do
             local ic_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.InflectionClass", inputCas)
             ic_obj:setBegin(ic["begin"])
             ic_obj:setEnd(ic["end"])
@@ -371,8 +458,8 @@ function deserialize(inputCas, inputStream)
     -- Edition
     local edition_list = {}
     local edition_counter = 1
-    if results["edition"] ~= null then
-        for i, edition in ipairs(results["edition"]) do
+    if annotation_layer(results, "edition") ~= null then
+        for i, edition in annotations(results, "edition") do
             local edition_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Variation", inputCas)
             edition_obj:setBegin(edition["begin"])
             edition_obj:setEnd(edition["end"])
@@ -387,8 +474,8 @@ function deserialize(inputCas, inputStream)
     -- PlainText
     local text_list = {}
     local text_counter = 1
-    if results["text"] ~= null then
-        for i, text in ipairs(results["text"]) do
+    if annotation_layer(results, "text") ~= null then
+        for i, text in annotations(results, "text") do
             local text_obj = luajava.newInstance("org.texttechnologylab.annotation.annis.Variation", inputCas)
             text_obj:setBegin(text["begin"])
             text_obj:setEnd(text["end"])
@@ -1,5 +1,7 @@
-from io import BytesIO
-from typing import List, Optional, Any
+import os
+import tempfile
+from collections import deque
+from typing import List, Optional, Any, Union, BinaryIO
 import uvicorn
 from cassis import *
 from fastapi import FastAPI, Response, UploadFile, File, HTTPException
@@ -8,14 +10,12 @@ from fastapi.responses import PlainTextResponse
 from pydantic_settings import BaseSettings
 from pydantic import BaseModel
 from starlette.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from functools import lru_cache
 from annis_utils import *
 from api_utils import *
 
 
-QUEUE = DocumentQueue()
-
-
 class InitRequest(BaseModel):
     zip_file: bytes
 
@@ -23,12 +23,21 @@ class InitRequest(BaseModel):
 class InitResponse(BaseModel):
     accepted: bool
     n_docs: Optional[int] = None
+    # Ingestion job of the upload, see /v1/init/{job_id}
+    job_id: Optional[str] = None
 
 
 # Request sent by DUUI
 # Note, this is transformed by the Lua script
 class DUUIRequest(BaseModel):
     msg: Optional[str] = None
+    # Batch mode (opt-in): answer with up to max_docs documents / max_bytes of document JSON
+    max_docs: Optional[int] = None
+    max_bytes: Optional[int] = None
+    # Compressions the client can decompress (e.g. "gzip"), large responses are compressed, see compress_response
+    compression: Optional[str] = None
+    # Columnar annotations (per field begin/end/value_idx lists and a string table), see serialize_document_columnar
+    columnar: bool = False
 
 # Response of this annotator
 # Note, this is transformed by the Lua script
@@ -74,10 +83,58 @@ class TextImagerDocumentation(BaseModel):
 
 class Settings(BaseSettings):
     annis_version: float = 3.3
-
+    # Persistent cache of extracted corpora (keyed by content hash), disabled if not set
+    annis_cache_dir: Optional[str] = None
+    annis_cache_max_bytes: int = 10 * 1024 ** 3
+    # Extract the corpora of one upload in parallel worker processes (1 = serial)
+    annis_extraction_workers: int = 1
+    # Tokenize the documents of a corpus in parallel worker processes (1 = serial), can be overwritten per /v1/init
+    annis_tokenization_workers: int = 1
+    # Only stage the corpora at /v1/init (sqlite files in annis_staging_dir, system temp dir by default),
+    # documents are extracted when /v1/process takes them from the queue. Cache and worker settings are not used.
+    annis_lazy_documents: bool = False
+    annis_staging_dir: Optional[str] = None
+    # Documents of an upload beyond this many bytes are spilled to a file in queue_spill_dir (system temp dir by default)
+    queue_memory_budget: int = 1024 ** 3
+    queue_spill_dir: Optional[str] = None
+    # Read uploads in a worker thread and answer /v1/init right away (overridden by /v1/init?background=...)
+    ingestion_background: bool = False
+    # Uploads beyond this many bytes are copied to a temporary file in upload_spool_dir (system temp dir by default)
+    upload_memory_threshold: int = 64 * 1024 ** 2
+    upload_spool_dir: Optional[str] = None
+    # Responses of at least this many bytes are gzip compressed, if the request accepts it
+    compression_threshold: int = 64 * 1024
+    compression_level: int = 1
+    # Write the /v1/process body directly with orjson instead of validating a DUUIResponse (same bytes)
+    annis_fast_response: bool = True
+
+
+# The fast response path writes the fields in the order of the DUUIResponse
+assert [field for field, _ in RESPONSE_FIELDS] == list(DUUIResponse.model_fields)[:len(RESPONSE_FIELDS)]
+NOT_ACCEPTED_RESPONSE = serialize_not_accepted()
 
 # settings + cache
 settings = Settings()
+QUEUE = DocumentQueue(settings.queue_memory_budget, settings.queue_spill_dir)
+INGESTION = IngestionJobs()
+CACHE = ANNISCorpusCache(settings.annis_cache_dir, settings.annis_cache_max_bytes) if settings.annis_cache_dir else None
+if settings.annis_staging_dir:
+    os.makedirs(settings.annis_staging_dir, exist_ok=True)
+
+
+def stage_corpus_on_disk(corpus_files) -> ANNISExtractor:
+    """
+    Import a corpus into a temporary sqlite file, which is deleted once all of its documents are processed
+    :param corpus_files:
+    :return:
+    """
+    fd, database = tempfile.mkstemp(suffix=".sqlite", dir=settings.annis_staging_dir or None)
+    os.close(fd)
+    try:
+        return stage_corpus(corpus_files, database)
+    except Exception:
+        os.remove(database)
+        raise
 
 
 # Start fastapi
@@ -176,102 +233,158 @@ def get_documentation() -> TextImagerDocumentation:
     )
     return documentation
 
-@app.post("/v1/init")
-async def init_annis_reader(file: UploadFile = File(...)) -> InitResponse:
-    if not QUEUE.has_next():
+# Put the documents of an upload into the queue (in /v1/init or in the background, see IngestionJob).
+# The corpora are queued one after another, in the order of the upload, as soon as they are extracted.
+def ingest_upload(buffer: BinaryIO, tokenization_workers: int, job: IngestionJob):
+    # The spooled upload (possibly a temporary file) is closed once the archive is read
+    with buffer:
+        # Only the corpus that is read (or extracted) at the moment is held, see iter_annis_corpora
+        corpora = iter_annis_corpora(buffer, settings.upload_memory_threshold, settings.upload_spool_dir)
+        if settings.annis_lazy_documents:
+            for corpus_id, corpus_files in corpora:
+                job.documents_ready(QUEUE.fill_lazy(stage_corpus_on_disk(corpus_files)))
+            return
+
+        # Cache keys of the corpora to extract (None for cached corpora), in the order of the upload
+        cache_keys = deque()
+
+        def cached_or_files():
+            for corpus_id, corpus_files in corpora:
+                # print(corpus_id)
+                key = corpus_hash(corpus_files) if CACHE is not None else None
+                cached = CACHE.get(key) if key is not None else None
+                cache_keys.append(key if cached is None else None)
+                yield corpus_files if cached is None else cached
+
+        # Results are yielded in the order of the upload
+        extracted = extract_corpora(cached_or_files(),
+                                    workers=settings.annis_extraction_workers,
+                                    tokenization_workers=tokenization_workers,
+                                    spool_dir=settings.upload_spool_dir)
         try:
-            # Accumulate the file content in memory
-            buffer = BytesIO()
-            while chunk := await file.read(1024 * 1024 * 10):  # 10 MB chunks
-                buffer.write(chunk)
+            for result in extracted:
+                key = cache_keys.popleft()
+                if key is not None:
+                    CACHE.put(key, *result)
+                apd, tpd, mpd = result
+                print(mpd)
+                job.documents_ready(QUEUE.fill(annotations_per_doc=apd,
+                                               text_per_document=tpd,
+                                               meta_data_per_document=mpd)) # TODO add metadata
+        finally:
+            # Shut down the worker processes
+            extracted.close()
+
 
-            # Reset pointer to the beginning before opening with ZipFile
-            buffer.seek(0)
+@app.post("/v1/init")
+async def init_annis_reader(file: UploadFile = File(...), tokenization_workers: Optional[int] = None,
+                            background: Optional[bool] = None) -> InitResponse:
+    if tokenization_workers is None:
+        tokenization_workers = settings.annis_tokenization_workers
+    if background is None:
+        background = settings.ingestion_background
+    if not QUEUE.has_next() and not INGESTION.running():
+        try:
+            # Copy the upload into memory, or into a temporary file beyond upload_memory_threshold bytes
+            buffer = await spool_upload(file, settings.upload_memory_threshold, settings.upload_spool_dir)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Something went wrong: {str(e)}")
         finally:
             await file.close()
 
-        documents = dict()
-        files_from_zip_in_bytes(buffer.read(), documents)
-        # print(documents)
-
-        for document_id in documents:
-            # print(document_id)
-            # print(documents[document_id])
-            node_annis = documents[document_id]['node.annis']
-            node_annotation_annis = documents[document_id]['node_annotation.annis']
-            corpus_annis = documents[document_id]['corpus.annis']
-            corpus_annotation_annis = documents[document_id]['corpus_annotation.annis']
-            text_annis = documents[document_id]['text.annis']
-            annis_corpus = ANNISExtractor.from_file_like(node_file=node_annis,
-                                                         node_annotation_file=node_annotation_annis,
-                                                         corpus_file=corpus_annis,
-                                                         corpus_annotation_file=corpus_annotation_annis,
-                                                         text_file=text_annis)
-            apd, tpd = annis_corpus.extract_annotations(*annis_corpus.extract_text())
-
-            try:
-                mpd = annis_corpus.extract_doc_metadata(annis_corpus.extract_corpus_metadata(), annis_corpus.extract_corpus_doc_mapping())
-            except Exception as e:
-                print(e)
-                mpd = None
-            print(mpd)
-            QUEUE.fill(annotations_per_doc=apd,
-                       text_per_document=tpd,
-                       meta_data_per_document=mpd) # TODO add metadata
-
+        job = INGESTION.add(IngestionJob(lambda job: ingest_upload(buffer, tokenization_workers, job)))
+        if background:
+            # Answer right away, /v1/process serves the documents as soon as they are in the queue
+            job.start()
+        else:
+            await run_in_threadpool(job.run)
         return InitResponse(accepted=True,
-                            n_docs=QUEUE.get_count())
+                            n_docs=QUEUE.get_count(),
+                            job_id=job.job_id)
 
     else:
         return InitResponse(accepted=False,
                             n_docs=QUEUE.get_count())
 
 
-# Process request from DUUI
-@app.post("/v1/process")
-def process(request: DUUIRequest) -> DUUIResponse:
-    if QUEUE.has_next():
-        current_doc = QUEUE.next()
-        sorted_annotations = {value: [] for key, value in mapping.items()}
-        for annotation in current_doc.annotations:
-            current_anno = construct_annotation(annotation)
+# Progress of an upload (job_id of the InitResponse)
+@app.get("/v1/init/{job_id}")
+def get_init_status(job_id: str) -> IngestionStatus:
+    job = INGESTION.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job: {job_id}")
+    return job.status(n_queued=QUEUE.get_count())
+
+
+def build_duui_response(current_doc: AnnisDocument) -> DUUIResponse:
+    """
+    Validated response model of a document (slow path, see serialize_document)
+    :param current_doc:
+    :return:
+    """
+    sorted_annotations = {value: [] for key, value in mapping.items()}
+    # Columnar annotations become dicts only here, pydantic validates them into the typed lists
+    for name, annotations in current_doc.annotations.group_by_type().items():
+        sorted_annotations[mapping[name]].extend(annotations)
+    if current_doc.meta_data is not None:
+        for meta_data_anno in current_doc.meta_data:
+            current_anno = construct_annotation(meta_data_anno)
             sorted_annotations[type(current_anno)].append(current_anno)
-        if current_doc.meta_data is not None:
-            for meta_data_anno in current_doc.meta_data:
-                current_anno = construct_annotation(meta_data_anno)
-                sorted_annotations[type(current_anno)].append(current_anno)
-
-        return DUUIResponse(plain_text=sorted_annotations[PlainText],
-                            lang=sorted_annotations[Lang],
-                            lemma=sorted_annotations[Lemma],
-                            document=sorted_annotations[Document],
-                            verse=sorted_annotations[Verse],
-                            line=sorted_annotations[Line],
-                            writer=sorted_annotations[Writer],
-                            pos=sorted_annotations[Pos],
-                            clause=sorted_annotations[Clause],
-                            inflection_class_lemma=sorted_annotations[InflectionClassLemma],
-                            subchapter=sorted_annotations[Subchapter],
-                            posLemma=sorted_annotations[PosLemma],
-                            inflection=sorted_annotations[Inflection],
-                            line_m=sorted_annotations[Line_m],
-                            page=sorted_annotations[Page],
-                            rhyme=sorted_annotations[Rhyme],
-                            translation=sorted_annotations[Translation],
-                            chapter=sorted_annotations[Chapter],
-                            inflectionClass=sorted_annotations[InflectionClass],
-                            edition=sorted_annotations[Edition],
-                            token=sorted_annotations[Token],
-                            sofa_str=current_doc.text,
-                            meta_data=sorted_annotations[DocumentMetaData],
-                            accepted=True
-                            )
-    else:
-        return DUUIResponse(accepted=False)
 
+    return DUUIResponse(plain_text=sorted_annotations[PlainText],
+                        lang=sorted_annotations[Lang],
+                        lemma=sorted_annotations[Lemma],
+                        document=sorted_annotations[Document],
+                        verse=sorted_annotations[Verse],
+                        line=sorted_annotations[Line],
+                        writer=sorted_annotations[Writer],
+                        pos=sorted_annotations[Pos],
+                        clause=sorted_annotations[Clause],
+                        inflection_class_lemma=sorted_annotations[InflectionClassLemma],
+                        subchapter=sorted_annotations[Subchapter],
+                        posLemma=sorted_annotations[PosLemma],
+                        inflection=sorted_annotations[Inflection],
+                        line_m=sorted_annotations[Line_m],
+                        page=sorted_annotations[Page],
+                        rhyme=sorted_annotations[Rhyme],
+                        translation=sorted_annotations[Translation],
+                        chapter=sorted_annotations[Chapter],
+                        inflectionClass=sorted_annotations[InflectionClass],
+                        edition=sorted_annotations[Edition],
+                        token=sorted_annotations[Token],
+                        sofa_str=current_doc.text,
+                        meta_data=sorted_annotations[DocumentMetaData],
+                        accepted=True
+                        )
+
+
+# Response of the next document in the queue (JSON body on the fast path), None if it is empty
+def next_document(columnar: bool = False) -> Optional[Union[DUUIResponse, bytes]]:
+    if not QUEUE.has_next():
+        return None
+    current_doc = QUEUE.next()
+    if columnar:
+        return serialize_document_columnar(current_doc)
+    if settings.annis_fast_response:
+        return serialize_document(current_doc)
+    return build_duui_response(current_doc)
+
+
+# Process request from DUUI
+@app.post("/v1/process", response_model=DUUIResponse)
+def process(request: DUUIRequest) -> Response:
+    # Documents of a background ingestion may still be on the way
+    INGESTION.wait(QUEUE.has_next)
+    if request.max_docs is not None or request.max_bytes is not None:
+        response = batch_response(lambda: next_document(request.columnar), request.max_docs, request.max_bytes)
+    else:
+        response = next_document(request.columnar)
+        if response is None:
+            response = Response(content=NOT_ACCEPTED_RESPONSE, media_type="application/json")
+        elif isinstance(response, bytes):
+            response = Response(content=response, media_type="application/json")
+    return compress_response(response, request.compression, settings.compression_threshold, settings.compression_level)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,8 @@ import time
 import os
 import subprocess
 
-from annis_utils import files_from_zip_in_bytes, ANNISExtractor
+from annis_utils import iter_annis_corpora, ANNISExtractor
+from annis_utils.annis_extract import WHITESPACE_SPLITTER
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
@@ -82,6 +83,178 @@ def meassure_speed_annis_new(fp: str):
     return e - s
 
 
+def meassure_speed_sqlite_staging(fp: str, bulk_load: bool):
+    """
+    Time the staging database (import + extract_text + extract_annotations) with and without
+    the bulk load mode (pragmas during import, secondary indexes + ANALYZE afterwards).
+    """
+    s = time.time()
+    annis_corpus = ANNISExtractor.from_str_path(fp, bulk_load=bulk_load)
+    i = time.time()
+    tpd, opd = annis_corpus.extract_text()
+    t = time.time()
+    apd, text = annis_corpus.extract_annotations(tpd, opd)
+    e = time.time()
+    return {"import": i - s, "extract_text": t - i, "extract_annotations": e - t, "total": e - s}
+
+
+def compare_sqlite_staging(base_dir: str):
+    """
+    Benchmark the indexed, pragma-tuned staging database against the plain schema
+    for every unzipped relannis corpus in base_dir.
+    """
+    for dr in sorted(os.listdir(base_dir)):
+        dru = os.path.join(base_dir, dr)
+        plain = meassure_speed_sqlite_staging(dru, bulk_load=False)
+        tuned = meassure_speed_sqlite_staging(dru, bulk_load=True)
+        print(f"NAME: {dr} :: PLAIN: {plain} :: BULK-LOAD: {tuned} :: SPEEDUP: {plain['total'] / tuned['total']:.2f}")
+
+
+def find_overlap_quadratic(s1: str, s2: str) -> str:
+    """
+    Previous implementation of ANNISExtractor.find_overlap (compares all suffix/prefix pairs), kept as reference.
+    """
+    if s2 in s1:
+        return s2
+    if s1 in s2:
+        return s1
+    overlap = ""
+    for i in range(1, min(len(s1), len(s2)) + 1):
+        if s1[-i:] == s2[:i]:
+            overlap = s1[-i:]
+    return overlap
+
+
+def meassure_find_overlap(lengths=(100, 1000, 10000, 50000), repeat: int = 3):
+    """
+    Micro-benchmark of find_overlap on long diplomatic/edition segment pairs, which only overlap partially
+    (the worst case, as neither containment shortcut applies).
+    """
+    dipl_words = ["uu", "ir", "thu", "ſo", "ende", "thia", "uuerold", "ſculun", "godes", "riki"]
+    edit_words = ["wi", "ir", "thū", "so", "ende", "thia", "werold", "sculun", "godes", "rīki"]
+    for length in lengths:
+        text = " ".join(dipl_words[i % len(dipl_words)] for i in range(length // 4))[:length]
+        edition = " ".join(edit_words[i % len(edit_words)] for i in range(length // 4))[:length]
+        # Suffix of the diplomatic segment is the prefix of the edited one
+        s1, s2 = text + edition[:length // 2], edition
+        assert ANNISExtractor.find_overlap(s1, s2) == find_overlap_quadratic(s1, s2)
+        results = {}
+        for name, func in [("quadratic", find_overlap_quadratic), ("linear", ANNISExtractor.find_overlap)]:
+            s = time.time()
+            for _ in range(repeat):
+                func(s1, s2)
+            results[name] = (time.time() - s) / repeat
+        print(f"LENGTH: {length} :: QUADRATIC: {results['quadratic']:.5f}s :: LINEAR: {results['linear']:.5f}s")
+
+
+def add_whitespace_split_replace(text: str):
+    """
+    Previous implementation of ANNISExtractor.add_whitespace_split (one str.replace per character), kept as reference.
+    """
+    for char in WHITESPACE_SPLITTER:
+        text = text.replace(char, f" {char} ")
+    return [t for t in text.split(" ") if t != ""]
+
+
+def meassure_whitespace_split(fp: str = None, n_segments: int = 200000, repeat: int = 3):
+    """
+    Benchmark add_whitespace_split against the replace loop, on all text/edition spans of an unzipped
+    relannis corpus (fp) or on generated punctuation heavy segments.
+    """
+    if fp is not None:
+        annis_corpus = ANNISExtractor.from_str_path(fp)
+        cursor = annis_corpus.db.cursor()
+        cursor.execute(""" SELECT span FROM nodes WHERE seg_name IN (?, ?) """,
+                       (annis_corpus.text_keyword, annis_corpus.edition_keyword))
+        segments = [row[0] for row in cursor.fetchall()]
+    else:
+        words = ["uuir", "ſculun,", "(godes)", "riki.", "thu-", "„uuerold“", "§3", "20%", "ſo;", "ende"]
+        segments = [" ".join(words[(i + j) % len(words)] for j in range(i % 7 + 1)) for i in range(n_segments)]
+    for segment in segments:
+        assert ANNISExtractor.add_whitespace_split(segment) == add_whitespace_split_replace(segment)
+    results = {}
+    for name, func in [("replace", add_whitespace_split_replace), ("translate", ANNISExtractor.add_whitespace_split)]:
+        s = time.time()
+        for _ in range(repeat):
+            for segment in segments:
+                func(segment)
+        results[name] = (time.time() - s) / repeat
+    print(f"SEGMENTS: {len(segments)} :: REPLACE: {results['replace']:.3f}s :: TRANSLATE: {results['translate']:.3f}s")
+
+
+def meassure_process_requests(fp: str):
+    """
+    Requests per second of /v1/process for the zipped corpus fp, answered with the validated DUUIResponse
+    and with the bytes written by serialize_document (ANNIS_FAST_RESPONSE). Both have to be identical.
+    """
+    from fastapi.testclient import TestClient
+    import duui_annis_reader
+
+    client = TestClient(duui_annis_reader.app)
+    bodies = {}
+    for name, fast_response in [("pydantic", False), ("orjson", True)]:
+        duui_annis_reader.settings.annis_fast_response = fast_response
+        with open(fp, "rb") as f:
+            n_docs = client.post("/v1/init", files={"file": f}).json()["n_docs"]
+        s = time.time()
+        bodies[name] = [client.post("/v1/process", json={}).content for _ in range(n_docs)]
+        print(f"{name.upper()}: {n_docs / (time.time() - s):.1f} req/s")
+    assert bodies["pydantic"] == bodies["orjson"]
+
+
+def meassure_columnar_response(fp: str):
+    """
+    Payload size, /v1/process requests per second and JSON decoding time of the row and the columnar
+    annotation format for the zipped corpus fp.
+    """
+    import json
+    from fastapi.testclient import TestClient
+    import duui_annis_reader
+
+    client = TestClient(duui_annis_reader.app)
+    for name, columnar in [("rows", False), ("columnar", True)]:
+        with open(fp, "rb") as f:
+            n_docs = client.post("/v1/init", files={"file": f}).json()["n_docs"]
+        s = time.time()
+        bodies = [client.post("/v1/process", json={"columnar": columnar}).content for _ in range(n_docs)]
+        process_time = time.time() - s
+        s = time.time()
+        for body in bodies:
+            json.loads(body)
+        decode_time = time.time() - s
+        print(f"{name.upper()}: {sum(map(len, bodies)) / (1024 * 1024):.2f} MB :: {n_docs / process_time:.1f} req/s :: "
+              f"DECODE: {decode_time:.3f}s")
+
+
+def meassure_compression(fp: str, url: str = "http://0.0.0.0:9714", bandwidth: float = 1e9 / 8):
+    """
+    End-to-end /v1/process throughput of a running reader for the zipped corpus fp, with and without gzip
+    compression. The time includes decompressing and decoding the JSON on the client, transfer_time
+    is the time the bodies need on a link with bandwidth bytes per second (1 Gbit/s by default).
+    """
+    import gzip
+    import json
+    import requests
+
+    for compression in [None, "gzip"]:
+        with open(fp, "rb") as f:
+            n_docs = requests.post(url=f"{url}/v1/init", files={"file": f}).json()["n_docs"]
+        n_bytes = 0
+        s = time.time()
+        for _ in range(n_docs):
+            # stream=True keeps requests from touching the body, it is read as sent
+            response = requests.post(url=f"{url}/v1/process", json={"compression": compression}, stream=True)
+            body = response.raw.read()
+            n_bytes += len(body)
+            if body[:2] == b"\x1f\x8b":
+                body = gzip.decompress(body)
+            json.loads(body)
+        duration = time.time() - s
+        transfer_time = n_bytes / bandwidth
+        print(f"{str(compression).upper()}: {n_bytes / (1024 * 1024):.2f} MB :: {n_docs / duration:.1f} docs/s :: "
+              f"WITH TRANSFER: {n_docs / (duration + transfer_time):.1f} docs/s")
+
+
 def get_file_size(file_path):
     # Get size in bytes
     size_bytes = os.path.getsize(file_path)
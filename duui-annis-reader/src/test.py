@@ -1,16 +1,40 @@
 import io
 import json
 import os
+import pickle
 import sys
 from typing import List
+import pytest
 import requests
 import pandas as pd
 from tqdm import tqdm
 
 from duui_annis_reader import DUUIRequest
+from annis_utils import ANNISExtractor
+from api_utils import SpillQueue
+from api_utils.document_queue import AnnisDocument
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../.."))
 
+SAMPLE_CORPORA = [
+    # Small synthetic corpus (3 documents with gaps and overlaps in the text/edition segments), always present
+    f'{BP}/data/test_data/tiny-relannis',
+    f'{BP}/data/relannis-v1.2/relannis/DDD-AD_1.2-relannis_1-2/corpora/DDD-AD-Kleinere_Altsächsische_Denkmäler',
+    f'{BP}/data/relannis-v1.0_(2)/relannis/rem-relannis-20161223_1-0/rem-relannis-20161223/11-12_1-rhfrhess-PV-X',
+    f'{BP}/data/relannis-v1.0/relannis/ReF_v1.0_relannis_1-0/ReF_v1.0_relannis/ref-mlu/14_2-ofr'
+]
+
+
+def sample_corpora() -> List[str]:
+    """
+    Paths of the sample corpora that are present, the test is skipped if there are none
+    :return:
+    """
+    corpora = [corpus_path for corpus_path in SAMPLE_CORPORA if os.path.isdir(corpus_path)]
+    if not corpora:
+        pytest.skip("No sample corpus present")
+    return corpora
+
 
 def test_single_corpus():
     init_url = "http://0.0.0.0:9714/v1/init"
@@ -69,6 +93,79 @@ def test_upload():
     resp = requests.post(url=up_url, files=file)
     print(resp.json())
 
+def test_token_segment_index():
+    """
+    The interval index in extract_text has to find the same text/edition segment for every virtual token
+    as the linear scan over all segments of a document.
+    """
+    for corpus_path in sample_corpora():
+        annis_corpus = ANNISExtractor.from_str_path(corpus_path)
+        cursor = annis_corpus.db.cursor()
+        cursor.execute(""" SELECT DISTINCT corpus_ref FROM nodes """)
+        for (doc_id,) in cursor.fetchall():
+            cursor.execute(
+                """ SELECT * FROM nodes WHERE corpus_ref = ? AND layer = "default_layer" AND seg_name = "NULL" AND root = "FALSE" """,
+                (doc_id,)
+            )
+            token_indices = [row[-7] for row in cursor.fetchall()]
+            for seg_name in [annis_corpus.text_keyword, annis_corpus.edition_keyword]:
+                cursor.execute(""" SELECT * FROM nodes WHERE corpus_ref = ? AND seg_name = ? ORDER BY id """, (doc_id, seg_name))
+                segment_rows = cursor.fetchall()
+                indexed = ANNISExtractor.match_tokens_to_segments(segment_rows, token_indices)
+                linear = [ANNISExtractor.find_covering_segment(segment_rows, token_index) for token_index in token_indices]
+                assert indexed == linear, (corpus_path, doc_id, seg_name)
+
+        tokens_per_doc, offsets_per_doc = annis_corpus.extract_text()
+        for doc_id in tokens_per_doc:
+            assert list(zip(*offsets_per_doc[doc_id])) == ANNISExtractor.calc_offsets(tokens_per_doc[doc_id])
+        print(f"{corpus_path}: OK")
+
+
+def test_parallel_tokenization(workers: int = 4):
+    """
+    extract_text_parallel has to return exactly the tokens and offsets of extract_text.
+    """
+    for corpus_path in sample_corpora():
+        annis_corpus = ANNISExtractor.from_str_path(corpus_path)
+        tpd1, opd1 = annis_corpus.extract_text()
+        tpd2, opd2 = annis_corpus.extract_text_parallel(workers)
+        assert list(tpd1) == list(tpd2)
+        for did in tpd1:
+            assert tpd1[did] == tpd2[did]
+            assert opd1[did] == opd2[did]
+        print(f"{corpus_path}: OK")
+
+
+def test_lazy_documents():
+    """
+    Documents extracted one by one (lazy DocumentQueue) have to be the same as the ones of the whole corpus.
+    """
+    for corpus_path in sample_corpora():
+        annis_corpus = ANNISExtractor.from_str_path(corpus_path)
+        apd, tpd = annis_corpus.extract_annotations(*annis_corpus.extract_text())
+        assert annis_corpus.document_ids() == list(tpd)
+        for doc_id in tpd:
+            annotations, text = annis_corpus.extract_document(doc_id)
+            assert text == tpd[doc_id]
+            assert list(annotations) == list(apd[doc_id])
+        print(f"{corpus_path}: OK")
+
+
+def test_spill_columnar_document():
+    """
+    A columnar document has to count with the size of its annotation arrays in the memory budget of the queue,
+    a budget of half its pickle has to spill it.
+    """
+    annis_corpus = ANNISExtractor.from_str_path(sample_corpora()[0])
+    annotations, text = annis_corpus.extract_document(annis_corpus.document_ids()[0])
+    document = AnnisDocument(text=text, annotations=annotations, meta_data=None)
+    queue = SpillQueue(memory_budget=len(pickle.dumps(document, protocol=pickle.HIGHEST_PROTOCOL)) // 2)
+    queue.put(document)
+    assert queue.spill_count == 1 and not queue.memory
+    spilled = queue.get()
+    assert spilled.text == text and list(spilled.annotations) == list(annotations)
+
+
 def max_worker_recommendation():
     def get_available_memory():
         """Estimate available memory in bytes."""
@@ -1,2 +1,8 @@
-from .annotations import Sentence, Token, Negation
-from .bs_reader import read_bs_file, parse_bs_file
\ No newline at end of file
+from .annotations import Sentence, Token, Negation, IndexedNegation, index_negations
+from .bs_reader import read_bs_file, parse_bs_file, parse_bs_rows, DEFAULT_CHUNK_ROWS
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
+from .corpus_io import CorpusContainer, CorpusFile, iter_corpus_files, read_texts
+from .tokenization import SpanTokenizer, TokenizedDocument, TOKENIZER
@@ -1,78 +1,110 @@
+import ast
 import csv
 import os
-import shutil
-import tempfile
-import zipfile
-from io import BytesIO, StringIO
-from pathlib import Path
-from typing import Union
-from nltk.tokenize import TreebankWordTokenizer
+from concurrent.futures import Executor
+from io import StringIO
+from typing import BinaryIO, List, Optional, Tuple, Union, Iterator
 
 from .annotations import Negation, Token, Sentence
-from .file_io import find_bs_files
+from .corpus_io import iter_corpus_files, read_texts
+from .tokenization import TOKENIZER
 
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
+# Rows of a BioScope CSV per chunk of parse_bs_file
+DEFAULT_CHUNK_ROWS = 1000
 
 
 def tokenize_with_offsets_advanced(text):
-    tokenizer = TreebankWordTokenizer()
     # Get spans (start, end) along with tokens
-    spans = list(tokenizer.span_tokenize(text))
-    return spans
+    return TOKENIZER.span_tokenize(text)
 
 
-def parse_bs_file(content: str):
-    total_tokens = []
-    total_sentences = []
-    total_negs = []
-    offset = 0
-    sofa = []
-
-    csv_file = StringIO(content)
+def parse_bs_rows(rows: List[Tuple[str, str, str]], offset: int):
+    """
+    Parse a chunk of rows of a BioScope CSV, in a worker process of parse_bs_file. Offsets are returned as plain
+    tuples, they are cheaper to send back than the annotation models.
+    :param rows: (sentence, cue_span, scope_span)
+    :param offset: offset of the first sentence in the document text
+    :return: token spans (in document order, with duplicates), sentence spans, negations as (cue span, scope spans)
+    """
+    tokens = []
+    sentences = []
+    negs = []
+    # All sentences of the chunk are tokenized at once, the document text is " ".join(sofa)
+    tokenized = TOKENIZER.tokenize_sentences([row[0] for row in rows], offset)
+    for idx, (sentence, cue_span, scope_span) in enumerate(rows):
+        tokens.extend(tokenized.sentence_spans(idx))
+        sentences.append((offset, offset + len(sentence)))
 
-    # Parse the CSV
-    reader = csv.DictReader(csv_file)  # Use DictReader to get rows as dictionaries
-    for row in reader:
-        # row keys = sentence, sentence_id, cue_span, scope_span
-        sofa.append(row["sentence"])
-        for token in tokenize_with_offsets_advanced(row["sentence"]):
-            total_tokens.append(Token(begin=offset + token[0], end=offset + token[1]))
-        total_sentences.append(Sentence(begin=offset, end=offset + len(row["sentence"])))
-
-        if row["cue_span"] != "NaN":
+        if cue_span != "NaN":
             try:
-                cues = eval(row["cue_span"])
-                # print(cues)
-                cue = Token(begin=offset + cues[0][0], end=offset + cues[0][1])
+                # The span columns hold Python literals, e.g. [[0, 3]] and [0, 42]
+                cues = ast.literal_eval(cue_span)
+                cue = (offset + cues[0][0], offset + cues[0][1])
                 scope = []
-                if row["scope_span"] != "NaN":
+                if scope_span != "NaN":
                     try:
-                        scopes = eval(row["scope_span"])
-                        scope.append(Token(begin=offset + scopes[0], end=offset + scopes[1]))
-                    except:
+                        scopes = ast.literal_eval(scope_span)
+                        scope.append((offset + scopes[0], offset + scopes[1]))
+                    except Exception:
                         print("scope issue")
-                neg = Negation(cue=cue)
-                if scope:
-                    neg.scope = scope
-                total_negs.append(neg)
-                total_tokens.append(cue)
-                for sc in scope:
-                    total_tokens.append(sc)
-            except:
+                negs.append((cue, scope))
+                tokens.append(cue)
+                tokens.extend(scope)
+            except Exception:
                 print("cue issue")
-        offset += len(row["sentence"]) + 1
+        offset += len(sentence) + 1
+    return tokens, sentences, negs
+
+
+def parse_bs_file(content: str, executor: Optional[Executor] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """
+    Parse a BioScope CSV (columns sentence, sentence_id, cue_span, scope_span) into one document, the rows are
+    parsed in chunks of chunk_rows rows by the executor (a ProcessPoolExecutor) or one after another if not set
+    :param content:
+    :param executor:
+    :param chunk_rows:
+    :return: sentences, tokens (without duplicates, in the order of their first occurrence), negations, text
+    """
+    csv_file = StringIO(content)
+
+    # Parse the CSV
+    reader = csv.DictReader(csv_file)  # Use DictReader to get rows as dictionaries
+    rows = [(row["sentence"], row["cue_span"], row["scope_span"]) for row in reader]
+
+    # Chunks of rows together with the offset of their first sentence
+    chunks = []
+    offsets = []
+    offset = 0
+    chunk_rows = max(1, chunk_rows)
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        chunks.append(chunk)
+        offsets.append(offset)
+        offset += sum(len(row[0]) + 1 for row in chunk)
+    results = map(parse_bs_rows, chunks, offsets) if executor is None else executor.map(parse_bs_rows, chunks, offsets)
+
+    total_tokens = []
+    total_sentences = []
+    total_negs = []
+    token_offsets = set()
+    for tokens, sentences, negs in results:
+        for begin, end in tokens:
+            if (begin, end) not in token_offsets:
+                token_offsets.add((begin, end))
+                total_tokens.append(Token(begin=begin, end=end))
+        total_sentences.extend(Sentence(begin=begin, end=end) for begin, end in sentences)
+        for cue, scope in negs:
+            neg = Negation(cue=Token(begin=cue[0], end=cue[1]))
+            if scope:
+                neg.scope = [Token(begin=begin, end=end) for begin, end in scope]
+            total_negs.append(neg)
 
-    return total_sentences, list(set(total_tokens)), total_negs, " ".join(sofa)
+    return total_sentences, total_tokens, total_negs, " ".join(row[0] for row in rows)
 
 
-def read_bs_file(zip_bytes: Union[bytes, BytesIO]):
-    temp_dir = Path(tempfile.mkdtemp())
-    if isinstance(zip_bytes, bytes):
-        zip_bytes = BytesIO(zip_bytes)
-    with zipfile.ZipFile(zip_bytes, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
-    result = dict()
-    find_bs_files(Path(temp_dir), result, dict(), temp_dir)
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    return result
+def read_bs_file(zip_bytes: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, str]]:
+    # (document name, content) of every file, one after another while the archive is read
+    for file, content in read_texts(iter_corpus_files(zip_bytes, [".csv"])):
+        yield file.name.rstrip(".csv"), content
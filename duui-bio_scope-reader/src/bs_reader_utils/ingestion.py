@@ -0,0 +1,128 @@
+import threading
+import traceback
+import uuid
+from typing import Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+
+# Status of an ingestion job (/v1/init/{job_id})
+class IngestionStatus(BaseModel):
+    job_id: str
+    # running, done or failed
+    state: str
+    # documents put into the queue so far
+    n_ready: int
+    # documents of the upload, None as long as the reader does not know it yet
+    n_total: Optional[int] = None
+    # documents that are still waiting in the queue
+    n_queued: Optional[int] = None
+    error: Optional[str] = None
+
+
+class IngestionJob:
+    """
+    Reads an upload into the document queue. ingest(job) puts the documents into the queue and reports them with
+    job.documents_ready, so /v1/process can serve them before the whole upload is read if the job runs in the
+    background (start). run executes it in the calling thread instead.
+    """
+
+    def __init__(self, ingest: Callable[["IngestionJob"], None]):
+        """
+        :param ingest: puts the documents of the upload into the queue
+        """
+        self.job_id = uuid.uuid4().hex
+        self.ingest = ingest
+        self.state = "running"
+        self.n_ready = 0
+        self.n_total = None
+        self.error = None
+        self.condition = threading.Condition()
+
+    def documents_ready(self, n: int = 1):
+        """
+        Report documents that were put into the queue
+        :param n:
+        :return:
+        """
+        with self.condition:
+            self.n_ready += n
+            self.condition.notify_all()
+
+    def run(self):
+        """
+        Ingest the upload in the calling thread, errors are raised
+        :return:
+        """
+        try:
+            self.ingest(self)
+        except Exception as e:
+            self.finish("failed", str(e))
+            raise
+        self.finish("done")
+
+    def start(self) -> "IngestionJob":
+        """
+        Ingest the upload in a worker thread, errors are kept in the status
+        :return:
+        """
+        threading.Thread(target=self.run_in_background, name=f"ingestion-{self.job_id}", daemon=True).start()
+        return self
+
+    def run_in_background(self):
+        try:
+            self.run()
+        except Exception:
+            traceback.print_exc()
+
+    def finish(self, state: str, error: Optional[str] = None):
+        with self.condition:
+            self.state = state
+            self.error = error
+            if state == "done" and self.n_total is None:
+                self.n_total = self.n_ready
+            self.condition.notify_all()
+
+    def running(self) -> bool:
+        return self.state == "running"
+
+    def status(self, n_queued: Optional[int] = None) -> IngestionStatus:
+        with self.condition:
+            return IngestionStatus(job_id=self.job_id, state=self.state, n_ready=self.n_ready, n_total=self.n_total,
+                                   n_queued=n_queued, error=self.error)
+
+
+class IngestionJobs:
+    """
+    Ingestion jobs of a reader by job id, a new upload is only accepted if no job is running
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, IngestionJob] = {}
+        self.current: Optional[IngestionJob] = None
+
+    def running(self) -> bool:
+        return self.current is not None and self.current.running()
+
+    def add(self, job: IngestionJob) -> IngestionJob:
+        self.jobs[job.job_id] = job
+        self.current = job
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def wait(self, ready: Callable[[], bool]) -> bool:
+        """
+        Wait until ready() (e.g. the queue has a document) or the running job has finished.
+        DUUI reads with a single consumer, so a document that was ready is still there afterwards.
+        :param ready:
+        :return: ready()
+        """
+        job = self.current
+        if job is None:
+            return ready()
+        with job.condition:
+            while not ready() and job.running():
+                job.condition.wait()
+        return ready()
@@ -0,0 +1,71 @@
+from array import array
+from typing import Iterator, List, Sequence, Tuple
+
+from nltk.tokenize import TreebankWordTokenizer
+
+
+class TokenizedDocument:
+    """
+    Token offsets of the sentences of a document as offset arrays. Token i spans begins[i]:ends[i] of the document
+    text, the tokens of sentence j are sentence_starts[j]:sentence_starts[j + 1].
+    """
+
+    def __init__(self, begins: array, ends: array, sentence_starts: array):
+        self.begins = begins
+        self.ends = ends
+        self.sentence_starts = sentence_starts
+
+    def __len__(self) -> int:
+        return len(self.begins)
+
+    def sentence_spans(self, idx: int) -> Iterator[Tuple[int, int]]:
+        """
+        (begin, end) of the tokens of a sentence, in document offsets
+        :param idx: index of the sentence
+        :return:
+        """
+        first, last = self.sentence_starts[idx], self.sentence_starts[idx + 1]
+        return zip(self.begins[first:last], self.ends[first:last])
+
+
+class SpanTokenizer:
+    """
+    Tokenization service of the reader: one TreebankWordTokenizer for all documents (see TOKENIZER), that
+    tokenizes all sentences of a document in one call.
+    """
+
+    def __init__(self):
+        self.tokenizer = TreebankWordTokenizer()
+
+    def span_tokenize(self, text: str) -> List[Tuple[int, int]]:
+        """
+        (begin, end) of the tokens of a single text
+        :param text:
+        :return:
+        """
+        return list(self.tokenizer.span_tokenize(text))
+
+    def tokenize_sentences(self, sentences: Sequence[str], offset: int = 0,
+                           separator_length: int = 1) -> TokenizedDocument:
+        """
+        Tokenize the sentences of a document, each sentence on its own (like span_tokenize). The document text is
+        the sentences joined by a separator, e.g. " ".join(sentences).
+        :param sentences:
+        :param offset: offset of the first sentence in the document
+        :param separator_length: length of the separator between two sentences
+        :return:
+        """
+        begins = array("q")
+        ends = array("q")
+        sentence_starts = array("q", [0])
+        span_tokenize = self.tokenizer.span_tokenize
+        for sentence in sentences:
+            for begin, end in span_tokenize(sentence):
+                begins.append(offset + begin)
+                ends.append(offset + end)
+            sentence_starts.append(len(begins))
+            offset += len(sentence) + separator_length
+        return TokenizedDocument(begins, ends, sentence_starts)
+
+
+TOKENIZER = SpanTokenizer()
@@ -1,7 +1,14 @@
+import csv
+import io
+import multiprocessing
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import requests
+from nltk import TreebankWordTokenizer
 
-from bs_reader_utils import read_bs_file, parse_bs_file
+from bs_reader_utils import read_bs_file, parse_bs_file, TOKENIZER
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../.."))
 
@@ -30,14 +37,62 @@ def test_reading():
     tp = f"{BP}/data/bioscope-corpus-negation-annotated.zip"
     with open(tp, 'rb') as f:
         content = f.read()
-    files = read_bs_file(content)
+    files = dict(read_bs_file(content))
     print(files.keys())
     # print(files['bioscope_full'])
-    res = parse_bs_file(read_bs_file(content)['bioscope_full'])
+    res = parse_bs_file(files['bioscope_full'])
     for neg in res[2]:
         print(neg)
 
 
+def test_tokenization_benchmark(repeat: int = 3):
+    tp = f"{BP}/data/bioscope-corpus-negation-annotated.zip"
+    with open(tp, 'rb') as f:
+        content = f.read()
+    rows = list(csv.DictReader(io.StringIO(dict(read_bs_file(content))['bioscope_full'])))
+    sentences = [row["sentence"] for row in rows]
+
+    # One new tokenizer per sentence, as the reader did before
+    start = time.perf_counter()
+    for _ in range(repeat):
+        old_spans = []
+        offset = 0
+        for sentence in sentences:
+            old_spans.extend((offset + begin, offset + end)
+                             for begin, end in TreebankWordTokenizer().span_tokenize(sentence))
+            offset += len(sentence) + 1
+    old_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        tokenized = TOKENIZER.tokenize_sentences(sentences)
+    new_time = (time.perf_counter() - start) / repeat
+
+    assert old_spans == list(zip(tokenized.begins, tokenized.ends))
+    print(f"{len(sentences)} sentences, {len(tokenized)} tokens")
+    print(f"tokenizer per sentence: {old_time:.3f}s, tokenize_sentences: {new_time:.3f}s")
+
+
+def test_parallel_parsing(workers: int = 4, chunk_rows: int = 500):
+    tp = f"{BP}/data/bioscope-corpus-negation-annotated.zip"
+    with open(tp, 'rb') as f:
+        content = f.read()
+    files = dict(read_bs_file(content))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for key in files:
+            start = time.perf_counter()
+            serial = parse_bs_file(files[key])
+            serial_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            parallel = parse_bs_file(files[key], executor, chunk_rows)
+            parallel_time = time.perf_counter() - start
+
+            # Same documents in the same order, whatever the chunks
+            assert serial == parallel
+            print(f"{key}: {len(serial[1])} tokens, serial: {serial_time:.3f}s, {workers} processes: {parallel_time:.3f}s")
+
+
 # Example usage
 if __name__ == "__main__":
     test_api()
@@ -1,2 +1,8 @@
-from .annotations import Lemma, Token, Sentence, Negation, Pos
-from .cd_reader import parse_cd_file, read_cd_file
\ No newline at end of file
+from .annotations import Lemma, Token, Sentence, Negation, Pos, IndexedNegation, index_negations
+from .cd_reader import parse_cd_file, read_cd_file
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
+from .corpus_io import CorpusContainer, CorpusFile, iter_corpus_files, read_texts
+from .parse_pipeline import ParsePipeline
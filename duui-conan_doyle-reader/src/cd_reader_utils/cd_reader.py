@@ -1,13 +1,8 @@
 import os
-import shutil
-import tempfile
-import zipfile
-from io import BytesIO
-from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Union, Iterator, Tuple
 
 from .annotations import Negation, Token, Lemma, Pos, Sentence
-from .file_io import find_cd_files
+from .corpus_io import iter_corpus_files, read_texts
 
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
@@ -82,13 +77,7 @@ def parse_cd_file(content: str):
     return total_sentences, total_tokens, total_lemmas, total_pos, total_negs, " ".join(sofa)
 
 
-def read_cd_file(zip_bytes: Union[bytes, BytesIO]):
-    temp_dir = Path(tempfile.mkdtemp())
-    if isinstance(zip_bytes, bytes):
-        zip_bytes = BytesIO(zip_bytes)
-    with zipfile.ZipFile(zip_bytes, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
-    result = dict()
-    find_cd_files(Path(temp_dir), result, dict(), temp_dir)
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    return result
+def read_cd_file(zip_bytes: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, str]]:
+    # (document name, content) of every file, one after another while the archive is read
+    for file, content in read_texts(iter_corpus_files(zip_bytes, [".txt"])):
+        yield file.name.rstrip(".txt"), content
@@ -24,6 +24,30 @@ def test_api():
         print(response["negations"])
 
 
+def test_api_background():
+    """
+    /v1/init with the ingestion in the background: /v1/process waits for the documents that are not read yet,
+    the status of the upload is at /v1/init/{job_id}
+    """
+    init_url = "http://0.0.0.0:9714/v1/init"
+    next_url = "http://0.0.0.0:9714/v1/process"
+
+    test_file = f"{BP}/data/SEM-2012-SharedTask-CD-SCO-.zip"
+
+    file = {'file': open(test_file, 'rb')}
+    response = requests.post(url=init_url, files=file, params={"background": "true"}).json()
+    print(response)
+    status_url = f"{init_url}/{response['job_id']}"
+    print(requests.get(status_url).json())
+
+    n_docs = 0
+    while requests.post(url=next_url, json={}).json()["accepted"]:
+        n_docs += 1
+    status = requests.get(status_url).json()
+    print(status)
+    assert status["state"] == "done" and status["n_total"] == n_docs
+
+
 # Example usage
 if __name__ == "__main__":
     test_api()
@@ -1,2 +1,8 @@
 from .dtneg_reader import read_dtneg_file, parse_dtneg_file, adjust_offsets, tokenize_with_offsets_advanced
-from .annotations import Sentence, Token, Negation
\ No newline at end of file
+from .annotations import Sentence, Token, Negation, IndexedNegation, index_negations
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
+from .corpus_io import CorpusContainer, CorpusFile, iter_corpus_files, read_texts
+from .tokenization import SpanTokenizer, TokenizedDocument, TOKENIZER
@@ -1,145 +1,201 @@
 import bisect
 import os
-import shutil
-import tempfile
-import zipfile
-from io import BytesIO
-from pathlib import Path
-from typing import Union, Tuple, List, Any
-
-from nltk import TreebankWordTokenizer
+import re
+from itertools import accumulate
+from typing import BinaryIO, Union, Tuple, List, Any, Iterator
 
 from .annotations import Negation, Token, Sentence
-from .file_io import find_dtneg_files
+from .corpus_io import iter_corpus_files, read_texts
+from .tokenization import TOKENIZER
 
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
 
-def get_delimiter_offsets(s):
-    # Define delimiter pairs: (opening, closing, type)
-    delimiter_pairs = [('<<', '>>', '<<>>'), ('{', '}', '{}'), ('[', ']', '[]')]
+# Delimiter pairs of the annotated answers: (opening, closing, type)
+DELIMITER_PAIRS = [('<<', '>>', '<<>>'), ('{', '}', '{}'), ('[', ']', '[]')]
+DELIMITER_PATTERN = re.compile("|".join(re.escape(delimiter) for pair in DELIMITER_PAIRS for delimiter in pair[:2]))
+OPENING_TO_TYPE = {open: type for open, close, type in DELIMITER_PAIRS}
+CLOSING_TO_TYPE = {close: type for open, close, type in DELIMITER_PAIRS}
+# Rewrites of the answers, each starts and ends with a space that it keeps
+ABBREVIATIONS = [(" n't ", " not "), (" ca ", " can "), (" wo ", " will "), (" sha  ", " shall ")]
 
-    # Maps for quick lookup
-    opening_to_type = {open: type for open, close, type in delimiter_pairs}
-    closing_to_type = {close: type for open, close, type in delimiter_pairs}
 
-    # Stack to track nested delimiters
+def get_delimiter_offsets(s):
+    """
+    Remove the delimiters of an annotated answer, in one pass over the string
+    :param s: answer, e.g. "I <<do n't>> [know]"
+    :return: final string without delimiters and a list of (delimiter_type, content, (start, end)), the maximal
+    ranges of the final string within a delimiter type, grouped by type in the order of DELIMITER_PAIRS
+    """
+    # Stack to track nested delimiters, nesting depth per type
     stack = []
+    depth = {type: 0 for type in OPENING_TO_TYPE.values()}
+    # Start of the open range per type, finished ranges per type
+    range_start = {type: None for type in depth}
+    offsets = {type: [] for type in depth}
     # Final string without delimiters
-    final_string = ""
-    # List to store delimiter sets for each character in final_string
-    char_delimiters = []
+    parts = []
+    length = 0
+
+    def add_text(text: str):
+        nonlocal length
+        if not text:
+            return
+        # The delimiters of a range of text do not change, a range of a type starts or ends at its beginning
+        for type in depth:
+            if depth[type] and range_start[type] is None:
+                range_start[type] = length
+            elif not depth[type] and range_start[type] is not None:
+                offsets[type].append((range_start[type], length))
+                range_start[type] = None
+        parts.append(text)
+        length += len(text)
 
-    # Parse the string
     i = 0
-    while i < len(s):
-        found = False
-        # Check each delimiter pair
-        for open, close, type in delimiter_pairs:
-            # Opening delimiter
-            if s[i:i + len(open)] == open:
-                stack.append(type)
-                i += len(open)
-                found = True
-                break
-            # Closing delimiter
-            elif s[i:i + len(close)] == close:
-                if not stack or stack[-1] != type:
-                    raise ValueError("Mismatched delimiters", s)
-                stack.pop()
-                i += len(close)
-                found = True
-                break
-        # Character is not part of a delimiter
-        if not found:
-            final_string += s[i]
-            # Record current delimiters for this character
-            char_delimiters.append(set(stack))
-            i += 1
-
-    # Find offsets for each delimiter type
-    from collections import defaultdict
-    offsets = defaultdict(list)
-    delimiter_types = [pair[2] for pair in delimiter_pairs]
-
-    for type in delimiter_types:
-        in_range = False
-        start = 0
-        for j in range(len(final_string)):
-            if type in char_delimiters[j]:
-                if not in_range:
-                    in_range = True
-                    start = j
-            elif in_range:
-                offsets[type].append((start, j))
-                in_range = False
-        if in_range:
-            offsets[type].append((start, len(final_string)))
+    for match in DELIMITER_PATTERN.finditer(s):
+        add_text(s[i:match.start()])
+        delimiter = match.group()
+        if delimiter in OPENING_TO_TYPE:
+            stack.append(OPENING_TO_TYPE[delimiter])
+            depth[stack[-1]] += 1
+        else:
+            type = CLOSING_TO_TYPE[delimiter]
+            if not stack or stack[-1] != type:
+                raise ValueError("Mismatched delimiters", s)
+            depth[stack.pop()] -= 1
+        i = match.end()
+    add_text(s[i:])
+    for type in depth:
+        if range_start[type] is not None:
+            offsets[type].append((range_start[type], length))
 
+    final_string = "".join(parts)
     # Format result as list of (delimiter_type, content, (start, end))
-    result = []
-    for type in offsets:
-        for start, end in offsets[type]:
-            content = final_string[start:end]
-            result.append((type, content, (start, end)))
+    result = [(type, final_string[start:end], (start, end)) for type in offsets for start, end in offsets[type]]
 
     # Return final string and offsets
     return final_string, result
 
 
 def tokenize_with_offsets_advanced(text):
-    tokenizer = TreebankWordTokenizer()
     # Get spans (start, end) along with tokens
-    spans = list(tokenizer.span_tokenize(text))
-    return spans
+    return TOKENIZER.span_tokenize(text)
+
+
+class OffsetShifts:
+    """
+    Offset shift table of the rewrites of a string (see rewrite), maps offsets of the original string to the
+    rewritten one. A span after a rewrite moves by its length difference, a span that overlaps it only changes its
+    end, a span before it keeps its offsets.
+    """
+
+    def __init__(self, edits: List[Tuple[int, int, int]]):
+        """
+        :param edits: (start, end, delta) of the rewritten ranges in the original string, in the order of rewriting
+        """
+        self.edits = edits
+        by_start = sorted((start, delta) for start, end, delta in edits)
+        by_end = sorted((end, delta) for start, end, delta in edits)
+        self.starts = [start for start, _ in by_start]
+        self.ends = [end for end, _ in by_end]
+        # Sum of the deltas of the first i rewrites
+        self.start_shifts = list(accumulate((delta for _, delta in by_start), initial=0))
+        self.end_shifts = list(accumulate((delta for _, delta in by_end), initial=0))
+
+    def shift(self, span: Tuple[int, int]) -> Tuple[int, int]:
+        begin, end = span
+        if begin == end:
+            return self.shift_empty(begin)
+        # Rewrites that end before the span move its begin, rewrites that start before its end move its end
+        return (begin + self.end_shifts[bisect.bisect_right(self.ends, begin)],
+                end + self.start_shifts[bisect.bisect_left(self.starts, end)])
+
+    def shift_empty(self, offset: int) -> Tuple[int, int]:
+        """
+        An empty span that touches a rewrite gets a length once that rewrite is applied, so the rewrites that touch
+        it (at most two, they share at most a space) are applied one after another
+        :param offset: begin and end of the span
+        :return:
+        """
+        begin = end = offset
+        applied = []
+        for start, stop, delta in self.edits:
+            if start <= offset <= stop:
+                # Position of the rewrite after the touching rewrites before it
+                moved = sum(applied_delta for applied_start, applied_delta in applied if applied_start < start)
+                if begin >= stop + moved and end > stop + moved:
+                    begin += delta
+                    end += delta
+                elif begin >= start + moved or end > start + moved:
+                    end += delta
+                applied.append((start, delta))
+        # Rewrites that end before the span move it as a whole
+        moved = self.end_shifts[bisect.bisect_left(self.ends, offset)]
+        return begin + moved, end + moved
+
+
+def rewrite(text: str, replacements: List[Tuple[str, str]]) -> Tuple[str, OffsetShifts]:
+    """
+    Apply the replacements one after another, like repeated str.replace(old, new, 1). Every replacement starts and
+    ends with a space that it keeps (see ABBREVIATIONS), so two rewritten ranges share at most that space and both
+    can be located in the original string.
+    :param text:
+    :param replacements: (old, new)
+    :return: rewritten text, offset shift table
+    """
+    # Replaced inner parts (without the spaces) by position, and the rewritten ranges with the spaces
+    inner = []
+    edits = []
+    for old, new in replacements:
+        pos = text.find(old)
+        while pos != -1:
+            inner.append((pos + 1, pos + len(old) - 1, new[1:-1]))
+            edits.append((pos, pos + len(old), len(new) - len(old)))
+            pos = text.find(old, pos + len(old) - 1)
+    inner.sort()
+    parts = []
+    last = 0
+    for start, end, new in inner:
+        parts.append(text[last:start])
+        parts.append(new)
+        last = end
+    parts.append(text[last:])
+    return "".join(parts), OffsetShifts(edits)
 
 
 def adjust_offsets(original_string: str,
                    token_offsets: List[Tuple[int, int]],
                    replacements: List[Tuple[str, str]]) -> Tuple[str, List[Tuple[int, int]]]:
 
-    # Apply replacements and track changes
-    for old, new in replacements:
-        while old in original_string:
-            pos_start = original_string.index(old)
-            pos_end = pos_start + len(old)
-            original_string = original_string.replace(old, new, 1)
-            delta = len(new) - len(old)
-            for idx, token in enumerate(token_offsets):
-                if token[0] < pos_start and token[1] <= pos_start:
-                    pass
-                elif token[0] >= pos_end and token[1] > pos_end:
-                    token_offsets[idx] = (token[0] + delta, token[1] + delta)
-                else:
-                    token_offsets[idx] = (token[0], token[1] + delta)
-
-    return original_string, token_offsets
+    # Apply replacements and shift the offsets by the precomputed table
+    new_string, shifts = rewrite(original_string, replacements)
+    return new_string, [shifts.shift(token) for token in token_offsets]
 
 
 def fix_abbr(answer: str, annos: List[Tuple[str, str, Tuple[int, int]]]) -> Tuple[str, List[Tuple[str, str, Tuple[int, int]]]]:
-    repl = [(" n't ", " not "), (" ca ", " can "), (" wo ", " will "), (" sha  ", " shall ")]
     offsets = [anno[2] for anno in annos]
-    answer, offsets = adjust_offsets(answer, offsets, replacements=repl)
+    answer, offsets = adjust_offsets(answer, offsets, replacements=ABBREVIATIONS)
     for idx in range(len(annos)):
         annos[idx] = (annos[idx][0], annos[idx][1], offsets[idx])
     return answer, annos
 
 def parse_dtneg_file(content: str):
     total_tokens = []
+    # Offsets of total_tokens, to skip duplicate answer tokens without searching the list
+    token_offsets = set()
     total_sentences = []
     total_negs = []
     offset = 0
     sofa = []
     sent_set = list(set(list(content.split("-----------------"))))
 
+    # Questions (annotations None) and answers with their annotations, in the order of the document text
+    segments = []
     for sent in sent_set:
         try:
             question = None
             answer = None
-            cue = None
-            scope = []
-            focus = []
             if sent.strip() == "":
                 continue
             for sent_part in sent.split("\n"):
@@ -148,16 +204,29 @@ def parse_dtneg_file(content: str):
                 if "ANNOTATEDANSWER:" in sent_part:
                     answer = sent_part.split("ANNOTATEDANSWER:")[-1].strip()
             question = question.replace("[", "").replace("{", "").replace("}", "").replace("<", "").replace(">", "").replace("]", "")
-            for token in tokenize_with_offsets_advanced(question):
-                total_tokens.append(Token(begin=offset + token[0], end=offset + token[1]))
-            total_sentences.append(Sentence(begin=offset, end=offset + len(question)))
-            offset += len(question) + 1
-            sofa.append(question)
+            segments.append((question, None))
 
             answer, annos = fix_abbr(*get_delimiter_offsets(answer))
+            answer = answer.replace("n't", "not").replace(" ca ", " can ").replace(" wo ", "will").replace(" sha  ", "shall")
+            segments.append((answer, annos))
+        except Exception as e:
+            print(e)
+
+    # All segments are tokenized at once, the document text is " ".join(sofa)
+    tokenized = TOKENIZER.tokenize_sentences([segment[0] for segment in segments])
+    for idx, (text, annos) in enumerate(segments):
+        if annos is None:
+            for begin, end in tokenized.sentence_spans(idx):
+                total_tokens.append(Token(begin=begin, end=end))
+                token_offsets.add((begin, end))
+        else:
+            cue = None
+            scope = []
+            focus = []
             for anno in annos:
                 anno_tok = Token(begin=offset + anno[2][0], end=offset + anno[2][1])
                 total_tokens.append(anno_tok)
+                token_offsets.add((anno_tok.begin, anno_tok.end))
                 if anno[0] == "<<>>":
                     cue = anno_tok
                 elif anno[0] == "{}":
@@ -172,27 +241,19 @@ def parse_dtneg_file(content: str):
                     neg.focus = focus
                 total_negs.append(neg)
 
-            answer = answer.replace("n't", "not").replace(" ca ", " can ").replace(" wo ", "will").replace(" sha  ", "shall")
-            for token in tokenize_with_offsets_advanced(answer):
-                answer_tok = Token(begin=offset + token[0], end=offset + token[1])
-                if answer_tok not in total_tokens:
-                    total_tokens.append(answer_tok)
-            total_sentences.append(Sentence(begin=offset, end=offset + len(answer)))
-            offset += len(answer) + 1
-            sofa.append(answer)
-        except Exception as e:
-            print(e)
+            for begin, end in tokenized.sentence_spans(idx):
+                if (begin, end) not in token_offsets:
+                    total_tokens.append(Token(begin=begin, end=end))
+                    token_offsets.add((begin, end))
+        total_sentences.append(Sentence(begin=offset, end=offset + len(text)))
+        offset += len(text) + 1
+        sofa.append(text)
 
     return total_sentences, total_tokens, total_negs, " ".join(sofa)
 
 
-def read_dtneg_file(zip_bytes: Union[bytes, BytesIO]):
-    temp_dir = Path(tempfile.mkdtemp())
-    if isinstance(zip_bytes, bytes):
-        zip_bytes = BytesIO(zip_bytes)
-    with zipfile.ZipFile(zip_bytes, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
-    result = dict()
-    find_dtneg_files(Path(temp_dir), result, dict(), temp_dir)
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    return result
+def read_dtneg_file(zip_bytes: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, str]]:
+    # (document name, content) of every file, one after another while the archive is read
+    files = iter_corpus_files(zip_bytes, [".txt"], lambda path: "README" not in path.split("/")[-1])
+    for file, content in read_texts(files):
+        yield file.name.rstrip(".txt"), content
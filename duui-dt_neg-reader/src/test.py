@@ -1,7 +1,11 @@
 import os
+import time
+
 import requests
+from nltk import TreebankWordTokenizer
 
-from dtneg_reader_utils import read_dtneg_file, parse_dtneg_file, tokenize_with_offsets_advanced, adjust_offsets
+from dtneg_reader_utils import read_dtneg_file, parse_dtneg_file, tokenize_with_offsets_advanced, adjust_offsets, \
+    TOKENIZER
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../.."))
 
@@ -30,10 +34,10 @@ def test_reading():
     tp = f"{BP}/data/DT-Neg corpus.zip"
     with open(tp, 'rb') as f:
         content = f.read()
-    files = read_dtneg_file(content)
+    files = dict(read_dtneg_file(content))
     print(files.keys())
     # print(files['bioscope_full'])
-    res = parse_dtneg_file(read_dtneg_file(content)['DT-Neg corpus'])
+    res = parse_dtneg_file(files['DT-Neg corpus'])
     print(res[3])
     print(10*"-")
     for sent in res[0]:
@@ -61,6 +65,36 @@ def test_adjust():
     print([new[tok[0]:tok[1]] for tok in new_tok])
 
 
+def test_tokenization_benchmark(repeat: int = 3):
+    tp = f"{BP}/data/DT-Neg corpus.zip"
+    with open(tp, 'rb') as f:
+        content = f.read()
+    # The questions and answers of the corpus without annotation delimiters
+    sentences = [line.split(":", 1)[-1].strip().translate(str.maketrans("", "", "[]{}<>"))
+                 for line in dict(read_dtneg_file(content))['DT-Neg corpus'].split("\n")
+                 if "QUESTION:" in line or "ANNOTATEDANSWER:" in line]
+
+    # One new tokenizer per sentence, as the reader did before
+    start = time.perf_counter()
+    for _ in range(repeat):
+        old_spans = []
+        offset = 0
+        for sentence in sentences:
+            old_spans.extend((offset + begin, offset + end)
+                             for begin, end in TreebankWordTokenizer().span_tokenize(sentence))
+            offset += len(sentence) + 1
+    old_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        tokenized = TOKENIZER.tokenize_sentences(sentences)
+    new_time = (time.perf_counter() - start) / repeat
+
+    assert old_spans == list(zip(tokenized.begins, tokenized.ends))
+    print(f"{len(sentences)} sentences, {len(tokenized)} tokens")
+    print(f"tokenizer per sentence: {old_time:.3f}s, tokenize_sentences: {new_time:.3f}s")
+
+
 # Example usage
 if __name__ == "__main__":
     # test_api()
@@ -1,2 +1,9 @@
 from .annotations import Token, Sentence, Negation, DLink, ADLink, DALink, UCEMetaData
-from .ar_reader import read_ar_file, parse_ar_file, parse_ar_file_for_UCE
\ No newline at end of file
+from .ar_reader import read_ar_file, parse_ar_file, parse_ar_file_for_UCE
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
+from .corpus_io import CorpusContainer, CorpusFile, iter_corpus_files, read_texts
+from .parse_pipeline import ParsePipeline
+from .tokenization import SpanTokenizer, TokenizedDocument, TOKENIZER
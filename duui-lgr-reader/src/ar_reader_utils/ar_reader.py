@@ -2,27 +2,20 @@ import bisect
 import copy
 import os
 import re
-import shutil
-import tempfile
-import zipfile
-from io import BytesIO
-from pathlib import Path
-from typing import Union, Tuple, List, Any
+from typing import BinaryIO, Union, Tuple, List, Any, Iterator
 from TexSoup import TexSoup
-from nltk import TreebankWordTokenizer
 
 from .annotations import Token, Sentence, Negation, UCEMetaData, DLink, ADLink, DALink
-from .file_io import find_ar_files
+from .corpus_io import iter_corpus_files, read_texts
+from .tokenization import TOKENIZER
 
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
 
 def tokenize_with_offsets_advanced(text):
-    tokenizer = TreebankWordTokenizer()
     # Get spans (start, end) along with tokens
-    spans = list(tokenizer.span_tokenize(text))
-    return spans
+    return TOKENIZER.span_tokenize(text)
 
 def to_small_caps(text):
     # Replace A-Z with small caps if available
@@ -359,13 +352,8 @@ def parse_ar_file_for_UCE(content: str, id_key: str):
     return docs
 
 
-def read_ar_file(zip_bytes: Union[bytes, BytesIO]):
-    temp_dir = Path(tempfile.mkdtemp())
-    if isinstance(zip_bytes, bytes):
-        zip_bytes = BytesIO(zip_bytes)
-    with zipfile.ZipFile(zip_bytes, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
-    result = dict()
-    find_ar_files(Path(temp_dir), result, dict(), temp_dir)
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    return result
+def read_ar_file(zip_bytes: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, str]]:
+    # (document name, content) of every file, one after another while the archive is read
+    files = iter_corpus_files(zip_bytes, [".tex"], lambda path: "README" not in path.split("/")[-1])
+    for file, content in read_texts(files):
+        yield file.name.rstrip(".tex"), content
@@ -32,10 +32,10 @@ def test_reading():
     tp = f"{BP}/data/african_tex.zip"
     with open(tp, 'rb') as f:
         content = f.read()
-    files = read_ar_file(content)
+    files = dict(read_ar_file(content))
     print(files.keys())
-    # res = parse_ar_file(read_ar_file(content)['Akan'])
-    res = parse_ar_file_for_UCE(read_ar_file(content)['Akan'])
+    # res = parse_ar_file(files['Akan'])
+    res = parse_ar_file_for_UCE(files['Akan'])
     print(len(res), 174*4)
 
     print(res[4])
@@ -1,2 +1,5 @@
 from .file_io_utils import FileIOUtils
-from .openConvert_wrapper import run_open_convert
\ No newline at end of file
+from .openConvert_wrapper import run_open_convert
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
@@ -5,7 +5,9 @@ import zipfile
 from abc import ABC
 from http.client import HTTPException
 from io import BytesIO
-from typing import Union, List, Dict
+from typing import BinaryIO, Union, List, Dict
+
+from .upload import spool_file
 
 
 class FileIOUtils(ABC):
@@ -59,7 +61,7 @@ class FileIOUtils(ABC):
                 pass
 
     @staticmethod
-    def files_from_zip_in_bytes(zip_bytes: Union[bytes, BytesIO], temp_path: str):
+    def files_from_zip_in_bytes(zip_bytes: Union[bytes, BinaryIO], temp_path: str):
 
         # Use BytesIO to treat the byte data as a file-like object
         # with BytesIO(zip_bytes) as byte_io:
@@ -75,9 +77,11 @@ class FileIOUtils(ABC):
             FileIOUtils.find_all_files_in_zip(zip_ref.namelist(), temp_path, zip_ref)
             for file in zip_ref.namelist():
                 if ".zip" in file:
+                    # Nested zips are spooled to a temporary file if they are large
                     with zip_ref.open(file) as zf:
-                        file_contents = zf.read()
-                    FileIOUtils.files_from_zip_in_bytes(file_contents, temp_path)
+                        nested = spool_file(zf)
+                    with nested:
+                        FileIOUtils.files_from_zip_in_bytes(nested, temp_path)
 
     @staticmethod
     def change_extensions(directory, new_ext):
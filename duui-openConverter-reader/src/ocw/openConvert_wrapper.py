@@ -2,8 +2,7 @@ import os
 import pathlib
 import shutil
 import subprocess
-from io import BytesIO
-from typing import List
+from typing import BinaryIO, List
 
 from .file_io_utils import FileIOUtils
 
@@ -11,7 +10,7 @@ from .file_io_utils import FileIOUtils
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
 
-def run_open_convert(zip_bytes: BytesIO) -> List[str]:
+def run_open_convert(zip_bytes: BinaryIO) -> List[str]:
     try:
         os.rmdir(f"{BP}/temp")
     except:
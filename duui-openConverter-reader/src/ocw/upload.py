@@ -0,0 +1,72 @@
+import tempfile
+from io import BytesIO
+from typing import BinaryIO, Optional
+
+from starlette.datastructures import UploadFile
+
+
+# Uploads (and nested archives) up to this many bytes are kept in memory, larger ones are moved to a temporary file
+DEFAULT_UPLOAD_MEMORY_THRESHOLD = 64 * 1024 ** 2
+COPY_CHUNK_SIZE = 1024 * 1024 * 10  # 10 MB chunks
+
+
+def roll_over(spooled: BinaryIO, size: int, memory_threshold: int, spool_dir: Optional[str]) -> BinaryIO:
+    """
+    Move the content of an in memory buffer to a temporary file once size bytes would exceed memory_threshold.
+    A plain temporary file instead of tempfile.SpooledTemporaryFile, zipfile needs seekable() (Python < 3.11).
+    :param spooled: current buffer (BytesIO or temporary file)
+    :param size: size of the buffer after the next write
+    :param memory_threshold:
+    :param spool_dir: directory of the temporary file (system temp dir if not set or empty)
+    :return: buffer for the next write
+    """
+    if not isinstance(spooled, BytesIO) or size <= memory_threshold:
+        return spooled
+    on_disk = tempfile.TemporaryFile(dir=spool_dir or None, suffix=".upload")
+    on_disk.write(spooled.getbuffer())
+    spooled.close()
+    return on_disk
+
+
+async def spool_upload(file: UploadFile, memory_threshold: int = DEFAULT_UPLOAD_MEMORY_THRESHOLD,
+                       spool_dir: Optional[str] = None) -> BinaryIO:
+    """
+    Copy an upload in chunks into a buffer that is moved to a temporary file beyond memory_threshold bytes, so
+    large archives never have to fit into memory. zipfile reads the archive directly from the returned file
+    (positioned at its beginning), the caller closes it.
+    :param file:
+    :param memory_threshold:
+    :param spool_dir:
+    :return:
+    """
+    spooled = BytesIO()
+    try:
+        while chunk := await file.read(COPY_CHUNK_SIZE):
+            spooled = roll_over(spooled, spooled.tell() + len(chunk), memory_threshold, spool_dir)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+
+def spool_file(file: BinaryIO, memory_threshold: int = DEFAULT_UPLOAD_MEMORY_THRESHOLD,
+               spool_dir: Optional[str] = None) -> BinaryIO:
+    """
+    Synchronous spool_upload for readable files, e.g. a zip archive nested in the upload
+    :param file:
+    :param memory_threshold:
+    :param spool_dir:
+    :return:
+    """
+    spooled = BytesIO()
+    try:
+        while chunk := file.read(COPY_CHUNK_SIZE):
+            spooled = roll_over(spooled, spooled.tell() + len(chunk), memory_threshold, spool_dir)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
@@ -9,14 +9,32 @@ Sentence = luajava.bindClass("de.tudarmstadt.ukp.dkpro.core.api.segmentation.typ
 Negation = luajava.bindClass("org.texttechnologylab.annotation.negation.CompleteNegation")
 FSArray = luajava.bindClass("org.apache.uima.jcas.cas.FSArray")
 
+-- Batch mode: documents of a batch response that are not deserialized yet. The first document of a batch
+-- goes into the current CAS, the others into the next CASes (in order). They belong to this Lua state,
+-- so the batch mode needs a single instance of the reader component.
+pending_documents = {}
+
 -- This "serialize" function is called to transform the CAS object into an stream that is sent to the annotator
 -- Inputs:
 --  - inputCas: The actual CAS object to serialize
 --  - outputStream: Stream that is sent to the annotator, can be e.g. a string, JSON payload, ...
+--  - params: Parameters of the component, max_docs and/or max_bytes switch on the batch mode
 function serialize(inputCas, outputStream, params)
-    outputStream:write(json.encode({
+    local request = {
         msg = "test"
-    }))
+    }
+    if #pending_documents > 0 then
+        -- The next document is already buffered, ask for an empty batch
+        request["max_docs"] = 0
+    elseif params ~= null then
+        if params["max_docs"] ~= null then
+            request["max_docs"] = tonumber(params["max_docs"])
+        end
+        if params["max_bytes"] ~= null then
+            request["max_bytes"] = tonumber(params["max_bytes"])
+        end
+    end
+    outputStream:write(json.encode(request))
 end
 
 -- This "deserialize" function is called on receiving the results from the annotator that have to be transformed into a CAS object
@@ -30,6 +48,21 @@ function deserialize(inputCas, inputStream)
     --
     local results = json.decode(inputString)
 
+    if results["documents"] ~= null then
+        for i, document in ipairs(results["documents"]) do
+            table.insert(pending_documents, document)
+        end
+        results = table.remove(pending_documents, 1)
+        if results == nil then
+            results = {accepted = false}
+        end
+    end
+
+    deserialize_document(inputCas, results)
+end
+
+-- Fill the CAS with one document (a single /v1/process response or one document of a batch response)
+function deserialize_document(inputCas, results)
     if results["sofa_str"] ~= null then
         content = results["sofa_str"]
     else
@@ -54,6 +87,8 @@ function deserialize(inputCas, inputStream)
     -- Token
     local token_list = {}
     local token_counter = 1
+    -- Token per "begin:end", to find the tokens of the negations without searching token_list
+    local token_index = {}
     if results["token"] ~= null then
         for i, tok in ipairs(results["token"]) do
             local token_obj = luajava.newInstance("de.tudarmstadt.ukp.dkpro.core.api.segmentation.type.Token", inputCas)
@@ -63,6 +98,11 @@ function deserialize(inputCas, inputStream)
 
             token_list[token_counter] = token_obj
             token_counter = token_counter + 1
+            -- Keep the first token with these offsets (the one the linear search found)
+            local key = tok["begin"] .. ":" .. tok["end"]
+            if token_index[key] == nil then
+                token_index[key] = token_obj
+            end
         end
     end
 
@@ -84,12 +124,10 @@ function deserialize(inputCas, inputStream)
                 for j, tok in ipairs(neg["event"]) do
                     local begin_idx = tok["begin"]
                     local end_idx = tok["end"]
-                    for k, real_tok in ipairs(token_list) do
-                        if real_tok:getBegin() == begin_idx and real_tok:getEnd() == end_idx then
-                            event_lst[tok_idx] = real_tok
-                            tok_idx = tok_idx + 1
-                            break
-                        end
+                    local real_tok = token_index[begin_idx .. ":" .. end_idx]
+                    if real_tok ~= nil then
+                        event_lst[tok_idx] = real_tok
+                        tok_idx = tok_idx + 1
                     end
                 end
             end
@@ -99,12 +137,10 @@ function deserialize(inputCas, inputStream)
                 for j, tok in ipairs(neg["xscope"]) do
                     local begin_idx = tok["begin"]
                     local end_idx = tok["end"]
-                    for k, real_tok in ipairs(token_list) do
-                        if real_tok:getBegin() == begin_idx and real_tok:getEnd() == end_idx then
-                            xscope_lst[tok_idx] = real_tok
-                            tok_idx = tok_idx + 1
-                            break
-                        end
+                    local real_tok = token_index[begin_idx .. ":" .. end_idx]
+                    if real_tok ~= nil then
+                        xscope_lst[tok_idx] = real_tok
+                        tok_idx = tok_idx + 1
                     end
 
                 end
@@ -115,12 +151,10 @@ function deserialize(inputCas, inputStream)
                 for j, tok in ipairs(neg["scope"]) do
                     local begin_idx = tok["begin"]
                     local end_idx = tok["end"]
-                    for k, real_tok in ipairs(token_list) do
-                        if real_tok:getBegin() == begin_idx and real_tok:getEnd() == end_idx then
-                            scope_lst[tok_idx] = real_tok
-                            tok_idx = tok_idx + 1
-                            break
-                        end
+                    local real_tok = token_index[begin_idx .. ":" .. end_idx]
+                    if real_tok ~= nil then
+                        scope_lst[tok_idx] = real_tok
+                        tok_idx = tok_idx + 1
                     end
 
                 end
@@ -131,12 +165,10 @@ function deserialize(inputCas, inputStream)
                 for j, tok in ipairs(neg["focus"]) do
                     local begin_idx = tok["begin"]
                     local end_idx = tok["end"]
-                    for k, real_tok in ipairs(token_list) do
-                        if real_tok:getBegin() == begin_idx and real_tok:getEnd() == end_idx then
-                            focus_lst[tok_idx] = real_tok
-                            tok_idx = tok_idx + 1
-                            break
-                        end
+                    local real_tok = token_index[begin_idx .. ":" .. end_idx]
+                    if real_tok ~= nil then
+                        focus_lst[tok_idx] = real_tok
+                        tok_idx = tok_idx + 1
                     end
 
                 end
@@ -145,12 +177,7 @@ function deserialize(inputCas, inputStream)
             if neg["cue"] ~= null then
                 local begin_idx = neg["cue"]["begin"]
                 local end_idx = neg["cue"]["end"]
-                for k, real_tok in ipairs(token_list) do
-                    if real_tok:getBegin() == begin_idx and real_tok:getEnd() == end_idx then
-                        cue = real_tok
-                        break
-                    end
-                end
+                cue = token_index[begin_idx .. ":" .. end_idx]
             end
 
             if cue ~= null then
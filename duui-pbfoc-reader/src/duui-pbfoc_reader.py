@@ -1,6 +1,5 @@
 import os
-from io import BytesIO
-from typing import List, Optional, Any
+from typing import List, Optional, Any, BinaryIO
 import uvicorn
 from cassis import *
 from fastapi import FastAPI, Response, UploadFile, File, HTTPException
@@ -9,14 +8,14 @@ from fastapi.responses import PlainTextResponse
 from pydantic_settings import BaseSettings
 from pydantic import BaseModel
 from starlette.responses import JSONResponse
-import queue
+from starlette.concurrency import run_in_threadpool
 
 from pbfoc_reader_utils import read_pbfoc_file, parse_pbfoc_file
+from pbfoc_reader_utils import SpillQueue, batch_response, IngestionJob, IngestionJobs, IngestionStatus, spool_upload
 from pbfoc_reader_utils import Token, Negation, Sentence, Pos
 
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../.."))
-QUEUE = queue.Queue()
 
 
 class InitRequest(BaseModel):
@@ -26,12 +25,17 @@ class InitRequest(BaseModel):
 class InitResponse(BaseModel):
     accepted: bool
     n_docs: Optional[int] = None
+    # Ingestion job of the upload, see /v1/init/{job_id}
+    job_id: Optional[str] = None
 
 
 # Request sent by DUUI
 # Note, this is transformed by the Lua script
 class DUUIRequest(BaseModel):
     msg: Optional[str] = None
+    # Batch mode (opt-in): answer with up to max_docs documents / max_bytes of document JSON
+    max_docs: Optional[int] = None
+    max_bytes: Optional[int] = None
 
 # Response of this annotator
 # Note, this is transformed by the Lua script
@@ -60,10 +64,20 @@ class TextImagerDocumentation(BaseModel):
 
 class Settings(BaseSettings):
     pbfoc_version: float = 0.1
+    # Documents of an upload beyond this many bytes are spilled to a file in queue_spill_dir (system temp dir by default)
+    queue_memory_budget: int = 1024 ** 3
+    queue_spill_dir: Optional[str] = None
+    # Read uploads in a worker thread and answer /v1/init right away (overridden by /v1/init?background=...)
+    ingestion_background: bool = False
+    # Uploads beyond this many bytes are copied to a temporary file in upload_spool_dir (system temp dir by default)
+    upload_memory_threshold: int = 64 * 1024 ** 2
+    upload_spool_dir: Optional[str] = None
 
 
 # settings + cache
 settings = Settings()
+QUEUE = SpillQueue(settings.queue_memory_budget, settings.queue_spill_dir)
+INGESTION = IngestionJobs()
 
 
 # Start fastapi
@@ -146,53 +160,80 @@ def get_documentation() -> TextImagerDocumentation:
     )
     return documentation
 
+# Put the documents of an upload into the queue (in /v1/init or in the background, see IngestionJob)
+def ingest_upload(buffer: BinaryIO, job: IngestionJob):
+    # Every file is put into the queue as soon as it is read, the spooled upload (possibly a temporary file)
+    # is closed once the archive is read
+    with buffer:
+        for key, content in read_pbfoc_file(buffer):
+            QUEUE.put((key, content))
+            job.documents_ready()
+
+
 @app.post("/v1/init")
-async def init_se_reader(file: UploadFile = File(...)) -> InitResponse:
-    if QUEUE.empty():
+async def init_se_reader(file: UploadFile = File(...), background: Optional[bool] = None) -> InitResponse:
+    if background is None:
+        background = settings.ingestion_background
+    if QUEUE.empty() and not INGESTION.running():
         try:
-            # Accumulate the file content in memory
-            buffer = BytesIO()
-            while chunk := await file.read(1024 * 1024 * 10):  # 10 MB chunks
-                buffer.write(chunk)
-
-            # Reset pointer to the beginning before opening with ZipFile
-            buffer.seek(0)
+            # Copy the upload into memory, or into a temporary file beyond upload_memory_threshold bytes
+            buffer = await spool_upload(file, settings.upload_memory_threshold, settings.upload_spool_dir)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Something went wrong: {str(e)}")
         finally:
             await file.close()
 
-        docs = []
-        res = read_pbfoc_file(buffer)
-        for key in res:
-            docs.append((key, res[key]))
-
-        for doc in docs:
-            QUEUE.put(doc)
+        job = INGESTION.add(IngestionJob(lambda job: ingest_upload(buffer, job)))
+        if background:
+            # Answer right away, /v1/process serves the documents as soon as they are in the queue
+            job.start()
+        else:
+            await run_in_threadpool(job.run)
         return InitResponse(accepted=True,
-                            n_docs=QUEUE.qsize())
+                            n_docs=QUEUE.qsize(),
+                            job_id=job.job_id)
 
     else:
         return InitResponse(accepted=False,
                             n_docs=QUEUE.qsize())
 
+# Progress of an upload (job_id of the InitResponse)
+@app.get("/v1/init/{job_id}")
+def get_init_status(job_id: str) -> IngestionStatus:
+    job = INGESTION.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job: {job_id}")
+    return job.status(n_queued=QUEUE.qsize())
+
+
+# Response of the next document in the queue, None if it is empty
+def next_document() -> Optional[DUUIResponse]:
+    if QUEUE.empty():
+        return None
+    current_doc = QUEUE.get()
+    # print(*current_doc, sep="\n")
+    content = parse_pbfoc_file(current_doc[1])  # tuple[list[Sentence], list[Token], list[Pos], list[Negation], str]
+    return DUUIResponse(doc_name=current_doc[0],
+                        sofa_str=content[4],
+                        token=content[1],
+                        negations=content[3],
+                        poss=content[2],
+                        sentences=content[0],
+                        accepted=True)
+
+
 # Process request from DUUI
 @app.post("/v1/process")
 def process(request: DUUIRequest) -> DUUIResponse: # negations, paras, tokens, doc_name, " ".join(text)
-    if not QUEUE.empty():
-        current_doc = QUEUE.get()
-        # print(*current_doc, sep="\n")
-        content = parse_pbfoc_file(current_doc[1])  # tuple[list[Sentence], list[Token], list[Pos], list[Negation], str]
-        return DUUIResponse(doc_name=current_doc[0],
-                            sofa_str=content[4],
-                            token=content[1],
-                            negations=content[3],
-                            poss=content[2],
-                            sentences=content[0],
-                            accepted=True)
-    else:
+    # Documents of a background ingestion may still be on the way
+    INGESTION.wait(lambda: not QUEUE.empty())
+    if request.max_docs is not None or request.max_bytes is not None:
+        return batch_response(next_document, request.max_docs, request.max_bytes)
+    document = next_document()
+    if document is None:
         return DUUIResponse(accepted=False)
+    return document
 
 
 
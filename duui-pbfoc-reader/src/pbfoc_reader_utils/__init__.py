@@ -1,2 +1,7 @@
 from .annotations import Pos, Sentence, Token, Negation
-from .pbfoc_reader import read_pbfoc_file, parse_pbfoc_file
\ No newline at end of file
+from .pbfoc_reader import read_pbfoc_file, parse_pbfoc_file
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
+from .corpus_io import CorpusContainer, CorpusFile, iter_corpus_files, read_texts
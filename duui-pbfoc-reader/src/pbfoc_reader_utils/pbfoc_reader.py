@@ -1,13 +1,8 @@
 import os
-import shutil
-import tempfile
-import zipfile
-from io import BytesIO
-from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Union, Iterator, Tuple
 
 from .annotations import Negation, Token, Pos, Sentence
-from .file_io import find_pbfoc_files
+from .corpus_io import iter_corpus_files, read_texts
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
@@ -66,13 +61,7 @@ def parse_pbfoc_file(content: str):
     return total_sentences, total_tokens, total_pos, total_negs, " ".join(sofa)
 
 
-def read_pbfoc_file(zip_bytes: Union[bytes, BytesIO]):
-    temp_dir = Path(tempfile.mkdtemp())
-    if isinstance(zip_bytes, bytes):
-        zip_bytes = BytesIO(zip_bytes)
-    with zipfile.ZipFile(zip_bytes, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
-    result = dict()
-    find_pbfoc_files(Path(temp_dir), result, dict(), temp_dir)
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    return result
\ No newline at end of file
+def read_pbfoc_file(zip_bytes: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, str]]:
+    # (document name, content) of every file, one after another while the archive is read
+    for file, content in read_texts(iter_corpus_files(zip_bytes, [".merged"])):
+        yield file.name.replace(".merged", ""), content
\ No newline at end of file
@@ -31,9 +31,9 @@ def test_reading():
     tp = f"{BP}/data/SEM-2012-SharedTask-PB-FOC-t.zip"
     with open(tp, 'rb') as f:
         content = f.read()
-    files = read_pbfoc_file(content)
+    files = dict(read_pbfoc_file(content))
     print(files.keys())
-    res = parse_pbfoc_file(read_pbfoc_file(content)['SEM-2012-SharedTask-PB-FOC-tr_dev'])[3]
+    res = parse_pbfoc_file(files['SEM-2012-SharedTask-PB-FOC-tr_dev'])[3]
 
 
 # Example usage
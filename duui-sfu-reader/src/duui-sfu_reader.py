@@ -1,6 +1,6 @@
 import os
-from io import BytesIO
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Union, BinaryIO, Tuple
+from queue import Empty
 import uvicorn
 from cassis import *
 from fastapi import FastAPI, Response, UploadFile, File, HTTPException
@@ -9,14 +9,14 @@ from fastapi.responses import PlainTextResponse
 from pydantic_settings import BaseSettings
 from pydantic import BaseModel
 from starlette.responses import JSONResponse
-import queue
+from starlette.concurrency import run_in_threadpool
 
 from sfu_reader_utils import read_sfu_negation, parse_xml_file
-from sfu_reader_utils import Paragraph, Token, Negation, Sentence
+from sfu_reader_utils import SpillQueue, batch_response, compress_response, IngestionJob, IngestionJobs, IngestionStatus, spool_upload, ParsePipeline
+from sfu_reader_utils import Paragraph, Token, Negation, Sentence, IndexedNegation, index_negations
 
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../.."))
-QUEUE = queue.Queue()
 
 
 class InitRequest(BaseModel):
@@ -26,12 +26,21 @@ class InitRequest(BaseModel):
 class InitResponse(BaseModel):
     accepted: bool
     n_docs: Optional[int] = None
+    # Ingestion job of the upload, see /v1/init/{job_id}
+    job_id: Optional[str] = None
 
 
 # Request sent by DUUI
 # Note, this is transformed by the Lua script
 class DUUIRequest(BaseModel):
     msg: Optional[str] = None
+    # Batch mode (opt-in): answer with up to max_docs documents / max_bytes of document JSON
+    max_docs: Optional[int] = None
+    max_bytes: Optional[int] = None
+    # Negation components as positions in the token list instead of token objects, see index_negations
+    token_indices: bool = False
+    # Compressions the client can decompress (e.g. "gzip"), large responses are compressed, see compress_response
+    compression: Optional[str] = None
 
 # Response of this annotator
 # Note, this is transformed by the Lua script
@@ -43,7 +52,7 @@ class DUUIResponse(BaseModel):
     token: Optional[List[Token]] = None
     paragraphs: Optional[List[Paragraph]] = None
     sentences: Optional[List[Sentence]] = None
-    negations: Optional[List[Negation]] = None
+    negations: Optional[List[Union[Negation, IndexedNegation]]] = None
 
     accepted: bool
 
@@ -60,10 +69,33 @@ class TextImagerDocumentation(BaseModel):
 
 class Settings(BaseSettings):
     sfu_version: float = 0.1
+    # Documents of an upload beyond this many bytes are spilled to a file in queue_spill_dir (system temp dir by default)
+    queue_memory_budget: int = 1024 ** 3
+    queue_spill_dir: Optional[str] = None
+    # Read uploads in a worker thread and answer /v1/init right away (overridden by /v1/init?background=...)
+    ingestion_background: bool = False
+    # Uploads beyond this many bytes are copied to a temporary file in upload_spool_dir (system temp dir by default)
+    upload_memory_threshold: int = 64 * 1024 ** 2
+    upload_spool_dir: Optional[str] = None
+    # Parse uploaded documents in /v1/init (eager), in /v1/process (lazy) or parse_prefetch documents ahead of
+    # /v1/process in a worker thread (prefetch)
+    parse_policy: str = "lazy"
+    parse_prefetch: int = 8
+    # Responses of at least this many bytes are gzip compressed, if the request accepts it
+    compression_threshold: int = 64 * 1024
+    compression_level: int = 1
+
+
+# Parse a queued file into its document (see ParsePipeline)
+def parse_document(item: Tuple[str, str]) -> list:
+    return [(item[0], parse_xml_file(item[1]))]
 
 
 # settings + cache
 settings = Settings()
+QUEUE = SpillQueue(settings.queue_memory_budget, settings.queue_spill_dir)
+PIPELINE = ParsePipeline(QUEUE, parse_document, settings.parse_policy, settings.parse_prefetch)
+INGESTION = IngestionJobs()
 
 
 # Start fastapi
@@ -146,53 +178,81 @@ def get_documentation() -> TextImagerDocumentation:
     )
     return documentation
 
+# Put the documents of an upload into the queue (in /v1/init or in the background, see IngestionJob)
+def ingest_upload(buffer: BinaryIO, job: IngestionJob):
+    # Every file is put into the queue as soon as it is read, the spooled upload (possibly a temporary file)
+    # is closed once the archive is read
+    with buffer:
+        for key, content in read_sfu_negation(buffer):
+            job.documents_ready(PIPELINE.put((key, content)))
+
+
 @app.post("/v1/init")
-async def init_se_reader(file: UploadFile = File(...)) -> InitResponse:
-    if QUEUE.empty():
+async def init_se_reader(file: UploadFile = File(...), background: Optional[bool] = None) -> InitResponse:
+    if background is None:
+        background = settings.ingestion_background
+    if PIPELINE.empty() and not INGESTION.running():
         try:
-            # Accumulate the file content in memory
-            buffer = BytesIO()
-            while chunk := await file.read(1024 * 1024 * 10):  # 10 MB chunks
-                buffer.write(chunk)
-
-            # Reset pointer to the beginning before opening with ZipFile
-            buffer.seek(0)
+            # Copy the upload into memory, or into a temporary file beyond upload_memory_threshold bytes
+            buffer = await spool_upload(file, settings.upload_memory_threshold, settings.upload_spool_dir)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Something went wrong: {str(e)}")
         finally:
             await file.close()
 
-        docs = []
-        res = read_sfu_negation(buffer)
-        for key in res:
-            docs.append((key, res[key]))
-
-        for doc in docs:
-            QUEUE.put(doc)
+        job = INGESTION.add(IngestionJob(lambda job: ingest_upload(buffer, job)))
+        if background:
+            # Answer right away, /v1/process serves the documents as soon as they are in the queue
+            job.start()
+        else:
+            await run_in_threadpool(job.run)
         return InitResponse(accepted=True,
-                            n_docs=QUEUE.qsize())
+                            n_docs=PIPELINE.qsize(),
+                            job_id=job.job_id)
 
     else:
         return InitResponse(accepted=False,
-                            n_docs=QUEUE.qsize())
+                            n_docs=PIPELINE.qsize())
+
+# Progress of an upload (job_id of the InitResponse)
+@app.get("/v1/init/{job_id}")
+def get_init_status(job_id: str) -> IngestionStatus:
+    job = INGESTION.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job: {job_id}")
+    return job.status(n_queued=PIPELINE.qsize())
+
+
+# Response of the next document in the queue, None if it is empty
+def next_document(token_indices: bool = False) -> Optional[DUUIResponse]:
+    try:
+        current_doc = PIPELINE.get()
+    except Empty:
+        return None
+    # print(*current_doc, sep="\n")
+    content = current_doc[1]
+    return DUUIResponse(doc_name=current_doc[0],
+                        sofa_str=content[4],
+                        token=content[2],
+                        negations=index_negations(content[3], content[2]) if token_indices else content[3],
+                        paragraphs=content[0],
+                        sentences=content[1],
+                        accepted=True)
+
 
 # Process request from DUUI
 @app.post("/v1/process")
 def process(request: DUUIRequest) -> DUUIResponse: # negations, paras, tokens, doc_name, " ".join(text)
-    if not QUEUE.empty():
-        current_doc = QUEUE.get()
-        # print(*current_doc, sep="\n")
-        content = parse_xml_file(current_doc[1])
-        return DUUIResponse(doc_name=current_doc[0],
-                            sofa_str=content[4],
-                            token=content[2],
-                            negations=content[3],
-                            paragraphs=content[0],
-                            sentences=content[1],
-                            accepted=True)
+    # Documents of a background ingestion may still be on the way
+    INGESTION.wait(lambda: not PIPELINE.empty())
+    if request.max_docs is not None or request.max_bytes is not None:
+        response = batch_response(lambda: next_document(request.token_indices), request.max_docs, request.max_bytes)
     else:
-        return DUUIResponse(accepted=False)
+        response = next_document(request.token_indices)
+        if response is None:
+            response = DUUIResponse(accepted=False)
+    return compress_response(response, request.compression, settings.compression_threshold, settings.compression_level)
 
 
 
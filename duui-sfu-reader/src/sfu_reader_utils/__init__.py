@@ -1,2 +1,9 @@
-from .annotations import Paragraph, Sentence, Token, Negation
-from .sfu_parser import read_sfu_negation, parse_xml_file
\ No newline at end of file
+from .annotations import Paragraph, Sentence, Token, Negation, IndexedNegation, index_negations
+from .sfu_parser import read_sfu_negation, parse_xml_file
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .compression import compress_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
+from .corpus_io import CorpusContainer, CorpusFile, iter_corpus_files, read_texts
+from .parse_pipeline import ParsePipeline
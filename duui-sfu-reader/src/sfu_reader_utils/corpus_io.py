@@ -0,0 +1,292 @@
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+from contextlib import ExitStack
+from io import BytesIO
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Tuple, Union
+
+from .upload import DEFAULT_UPLOAD_MEMORY_THRESHOLD, spool_file
+
+
+# Nested containers are recognized by the suffix of their name, the upload itself by its first bytes
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar.gz", ".tgz", ".tar")
+GZIP_SUFFIXES = (".gz",)
+GZIP_MAGIC = b"\x1f\x8b"
+TAR_MAGIC = b"ustar"
+TAR_MAGIC_OFFSET = 257
+
+
+def container_type(name: str) -> Optional[str]:
+    """
+    Type of a nested container by the suffix of its name
+    :param name:
+    :return: "zip", "tar" (also compressed), "gz" (a single compressed file) or None for a plain file
+    """
+    name = name.lower()
+    if name.endswith(ZIP_SUFFIXES):
+        return "zip"
+    if name.endswith(TAR_SUFFIXES):
+        return "tar"
+    if name.endswith(GZIP_SUFFIXES):
+        return "gz"
+    return None
+
+
+def sniff_container_type(file: BinaryIO) -> str:
+    """
+    Type of a container by its first bytes, everything that is neither a tar archive nor gzip compressed is read
+    as zip archive (zipfile raises BadZipFile for anything else)
+    :param file: seekable file, positioned at the beginning again afterwards
+    :return: "zip", "tar" or "gz"
+    """
+    head = file.read(TAR_MAGIC_OFFSET + len(TAR_MAGIC))
+    file.seek(0)
+    if head.startswith(GZIP_MAGIC):
+        try:
+            with gzip.GzipFile(fileobj=file) as unzipped:
+                head = unzipped.read(TAR_MAGIC_OFFSET + len(TAR_MAGIC))
+        except (OSError, EOFError):
+            head = b""
+        file.seek(0)
+        return "tar" if head[TAR_MAGIC_OFFSET:] == TAR_MAGIC else "gz"
+    if head[TAR_MAGIC_OFFSET:] == TAR_MAGIC:
+        return "tar"
+    return "zip"
+
+
+def file_filter(extensions: Optional[Iterable[str]] = None,
+                predicate: Optional[Callable[[str], bool]] = None) -> Callable[[str], bool]:
+    """
+    Filter for the paths of the files in a container
+    :param extensions: accepted extensions (case insensitive, e.g. [".txt"]), all if not set
+    :param predicate: additional condition on the path
+    :return:
+    """
+    extensions = tuple(extension.lower() for extension in extensions) if extensions else None
+
+    def match(path: str) -> bool:
+        if extensions is not None and not path.lower().endswith(extensions):
+            return False
+        return predicate is None or predicate(path)
+
+    return match
+
+
+class StreamedFile(io.RawIOBase):
+    """
+    Read only view of a file of a tar archive in stream mode, its own file object fails on seekable()
+    """
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.file.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class CorpusFile:
+    """
+    Lazy handle of a file in a corpus container, nothing is read before open, read_bytes or read_text.
+    Files of zip archives can be read as long as their CorpusContainer is open. Files of tar archives and gz files
+    are streamed (streamed is True), they can be read once and only before the iteration moves on.
+    """
+
+    def __init__(self, path: str, opener: Callable[[], BinaryIO], size: Optional[int] = None,
+                 streamed: bool = False):
+        """
+        :param path: path in the container, nested containers are part of it ("corpus/part.zip/doc.txt")
+        :param opener: opens the content of the file
+        :param size: uncompressed size in bytes, None if not known
+        :param streamed:
+        """
+        self.path = path
+        self.opener = opener
+        self.size = size
+        self.streamed = streamed
+
+    @property
+    def name(self) -> str:
+        return self.path.split("/")[-1]
+
+    def open(self) -> BinaryIO:
+        return self.opener()
+
+    def read_bytes(self) -> bytes:
+        with self.open() as file:
+            return file.read()
+
+    def read_text(self, encoding: str = "utf-8") -> str:
+        """
+        Decode the content, newlines are translated like open(..., 'r') does
+        :param encoding:
+        :return:
+        """
+        with io.TextIOWrapper(self.open(), encoding=encoding) as file:
+            return file.read()
+
+    def __repr__(self):
+        return f"CorpusFile({self.path!r}, size={self.size}, streamed={self.streamed})"
+
+
+class CorpusContainer:
+    """
+    Corpus upload (zip, tar, tar.gz or gz) together with the containers nested in it, e.g. a zip of tar.gz files.
+    files() yields lazy handles of the matching files in the order of the containers, nested containers are
+    expanded in place and read without extracting anything to disk. Nested zips are spooled (in memory up to
+    memory_threshold bytes) and kept, like the archives, until the container is closed.
+    """
+
+    def __init__(self, source: Union[str, bytes, BinaryIO], name: str = "",
+                 memory_threshold: int = DEFAULT_UPLOAD_MEMORY_THRESHOLD, spool_dir: Optional[str] = None):
+        """
+        :param source: path, content or file of the upload
+        :param name: file name of the upload (the name of the file of a single gz upload), the file name of the
+        path by default
+        :param memory_threshold:
+        :param spool_dir: directory of spooled nested zips (system temp dir if not set or empty)
+        """
+        self.stack = ExitStack()
+        if isinstance(source, str):
+            name = name or os.path.basename(source)
+            source = self.stack.enter_context(open(source, "rb"))
+        elif isinstance(source, bytes):
+            source = BytesIO(source)
+        elif not source.seekable():
+            source = self.stack.enter_context(spool_file(source, memory_threshold, spool_dir))
+        self.source = source
+        self.name = name
+        self.memory_threshold = memory_threshold
+        self.spool_dir = spool_dir
+
+    def __enter__(self) -> "CorpusContainer":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.stack.close()
+
+    def files(self, extensions: Optional[Iterable[str]] = None, predicate: Optional[Callable[[str], bool]] = None,
+              nested: bool = True) -> Iterator[CorpusFile]:
+        """
+        Stream the matching files of the upload
+        :param extensions: see file_filter
+        :param predicate: see file_filter
+        :param nested: expand nested containers, otherwise they are files like any other
+        :return:
+        """
+        match = file_filter(extensions, predicate)
+        self.source.seek(0)
+        kind = sniff_container_type(self.source)
+        if kind == "zip":
+            yield from self.walk_zip(self.source, "", match, nested)
+        elif kind == "tar":
+            yield from self.walk_tar(self.source, "", match, nested)
+        else:
+            # A single compressed file, the upload is streamed like a file in a tar archive
+            source = self.source
+            yield from self.walk_member(lambda: gzip.GzipFile(fileobj=source),
+                                        self.name[:-len(".gz")] if self.name.lower().endswith(".gz") else self.name,
+                                        None, True, match, nested)
+
+    def walk_zip(self, source: BinaryIO, prefix: str, match: Callable[[str], bool],
+                 nested: bool) -> Iterator[CorpusFile]:
+        try:
+            zip_ref = self.stack.enter_context(zipfile.ZipFile(source, 'r'))
+        except zipfile.BadZipFile:
+            if not prefix:
+                raise
+            print(f"Skipping invalid nested zip: {prefix[:-1]}")
+            return
+        for info in zip_ref.infolist():
+            if not info.is_dir():
+                yield from self.walk_member(lambda info=info: zip_ref.open(info), prefix + info.filename,
+                                            info.file_size, False, match, nested)
+
+    def walk_tar(self, source: BinaryIO, prefix: str, match: Callable[[str], bool],
+                 nested: bool) -> Iterator[CorpusFile]:
+        try:
+            # Stream mode, the archive (and its compression) is read front to back once
+            tar = tarfile.open(fileobj=source, mode="r|*")
+        except tarfile.TarError:
+            if not prefix:
+                raise
+            print(f"Skipping invalid nested tar archive: {prefix[:-1]}")
+            return
+        with tar:
+            for member in tar:
+                if member.isfile():
+                    opener = lambda member=member: io.BufferedReader(StreamedFile(tar.extractfile(member)))
+                    yield from self.walk_member(opener, prefix + member.name, member.size, True, match, nested)
+
+    def walk_member(self, opener: Callable[[], BinaryIO], path: str, size: Optional[int], streamed: bool,
+                    match: Callable[[str], bool], nested: bool) -> Iterator[CorpusFile]:
+        """
+        A file of a container, expanded if it is a nested container
+        """
+        kind = container_type(path) if nested else None
+        if kind is None:
+            if match(path):
+                yield CorpusFile(path, opener, size, streamed)
+        elif kind == "zip":
+            # zipfile needs to seek, the nested zip is spooled
+            with opener() as member:
+                spooled = self.stack.enter_context(spool_file(member, self.memory_threshold, self.spool_dir))
+            yield from self.walk_zip(spooled, path + "/", match, nested)
+        elif kind == "tar":
+            with opener() as member:
+                yield from self.walk_tar(member, path + "/", match, nested)
+        else:
+            # The file in a gz file keeps its path without the suffix
+            with opener() as member:
+                unzipped = gzip.GzipFile(fileobj=member)
+                yield from self.walk_member(lambda: unzipped, path[:-len(".gz")], None, True, match, nested)
+
+
+def iter_corpus_files(source: Union[str, bytes, BinaryIO], extensions: Optional[Iterable[str]] = None,
+                      predicate: Optional[Callable[[str], bool]] = None, nested: bool = True, name: str = "",
+                      memory_threshold: int = DEFAULT_UPLOAD_MEMORY_THRESHOLD,
+                      spool_dir: Optional[str] = None) -> Iterator[CorpusFile]:
+    """
+    Stream the matching files of an upload, see CorpusContainer.files. The container is closed once the
+    iteration ends, so the files have to be read while iterating.
+    :param source:
+    :param extensions:
+    :param predicate:
+    :param nested:
+    :param name:
+    :param memory_threshold:
+    :param spool_dir:
+    :return:
+    """
+    with CorpusContainer(source, name, memory_threshold, spool_dir) as corpus:
+        yield from corpus.files(extensions, predicate, nested)
+
+
+def read_texts(files: Iterable[CorpusFile], encoding: str = "utf-8") -> Iterator[Tuple[CorpusFile, str]]:
+    """
+    Read the files one after another, files that can not be read are skipped
+    :param files:
+    :param encoding:
+    :return: (file, content)
+    """
+    for file in files:
+        try:
+            content = file.read_text(encoding)
+        except Exception as e:
+            print(e)
+            continue
+        yield file, content
@@ -1,14 +1,10 @@
 import os
-import shutil
-import tempfile
 import xml.etree.ElementTree as ET
-import zipfile
-from io import BytesIO, FileIO, StringIO
-from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Union, Iterator, Tuple
 
 from sfu_reader_utils.annotations import Token, Negation, Sentence, Paragraph
-from sfu_reader_utils.file_io import find_xml_files, replace_illegal_xml_chars
+from sfu_reader_utils.file_io import replace_illegal_xml_chars
+from sfu_reader_utils.corpus_io import iter_corpus_files, read_texts
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
 
@@ -44,16 +40,17 @@ def parse_xml_file(file_content: Union[str]):
                         if elem.get('type') == "negation":
                             cue_tok_begin = offset
                             cue_tok_end = offset
+                            cue_words = []
                             for w in elem.findall('W'):
-                                total_tok_annos.append(Token(begin=offset, end=offset + len(w.text)))
+                                cue_words.append(Token(begin=offset, end=offset + len(w.text)))
+                                total_tok_annos.append(cue_words[-1])
                                 text.append(w.text)
                                 offset += (len(w.text) + 1)
                                 cue_tok_end += (len(w.text) + 1)
                             cue_tok_end -= 1
                             cue_tok = Token(begin=cue_tok_begin, end=cue_tok_end)
-                            if cue_tok in total_tok_annos:
-                                pass
-                            else:
+                            # Offsets only grow, so only a word of the cue itself can have the offsets of the cue
+                            if cue_tok not in cue_words:
                                 total_tok_annos.append(cue_tok)
                             cue = cue_tok
                     elif elem.tag == 'xcope':
@@ -68,16 +65,17 @@ def parse_xml_file(file_content: Union[str]):
                                 if sub_elem.get('type') == "negation":
                                     cue_tok_begin = offset
                                     cue_tok_end = offset
+                                    cue_words = []
                                     for w in sub_elem.findall('W'):
-                                        total_tok_annos.append(Token(begin=offset, end=offset + len(w.text)))
+                                        cue_words.append(Token(begin=offset, end=offset + len(w.text)))
+                                        total_tok_annos.append(cue_words[-1])
                                         text.append(w.text)
                                         offset += (len(w.text) + 1)
                                         cue_tok_end += (len(w.text) + 1)
                                     cue_tok_end -= 1
                                     cue_tok = Token(begin=cue_tok_begin, end=cue_tok_end)
-                                    if cue_tok in total_tok_annos:
-                                        pass
-                                    else:
+                                    # Offsets only grow, so only a word of the cue itself can have the offsets of the cue
+                                    if cue_tok not in cue_words:
                                         total_tok_annos.append(cue_tok)
                                     cue = cue_tok
                     elif elem.tag == 'C':
@@ -90,16 +88,17 @@ def parse_xml_file(file_content: Union[str]):
                                 if sub_elem.get('type') == "negation":
                                     cue_tok_begin = offset
                                     cue_tok_end = offset
+                                    cue_words = []
                                     for w in sub_elem.findall('W'):
-                                        total_tok_annos.append(Token(begin=offset, end=offset + len(w.text)))
+                                        cue_words.append(Token(begin=offset, end=offset + len(w.text)))
+                                        total_tok_annos.append(cue_words[-1])
                                         text.append(w.text)
                                         offset += (len(w.text) + 1)
                                         cue_tok_end += (len(w.text) + 1)
                                     cue_tok_end -= 1
                                     cue_tok = Token(begin=cue_tok_begin, end=cue_tok_end)
-                                    if cue_tok in total_tok_annos:
-                                        pass
-                                    else:
+                                    # Offsets only grow, so only a word of the cue itself can have the offsets of the cue
+                                    if cue_tok not in cue_words:
                                         total_tok_annos.append(cue_tok)
                                     cue = cue_tok
                             elif sub_elem.tag == 'xcope':
@@ -129,16 +128,17 @@ def parse_xml_file(file_content: Union[str]):
     return total_para_annos, total_sent_annos, total_tok_annos, total_neg_annos, replace_illegal_xml_chars(" ".join(text))
 
 
-def read_sfu_negation(zip_bytes: Union[bytes, BytesIO]):
-    temp_dir = Path(tempfile.mkdtemp())
-    if isinstance(zip_bytes, bytes):
-        zip_bytes = BytesIO(zip_bytes)
-    with zipfile.ZipFile(zip_bytes, 'r') as zip_ref:
-        zip_ref.extractall(temp_dir)
-    result = dict()
-    find_xml_files(Path(temp_dir), result, dict(), temp_dir)
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    return result
+def read_sfu_negation(zip_bytes: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, str]]:
+    # (document name, content) of every file, one after another while the archive is read.
+    # Files of a folder are numbered in the order of the archive
+    dir_dict = dict()
+    for file, content in read_texts(iter_corpus_files(zip_bytes, [".xml"])):
+        dir_name = file.path.split("/")[-2].split(".")[0] if "/" in file.path else ""
+        if dir_dict.get(dir_name) is None:
+            dir_dict[dir_name] = 0
+        else:
+            dir_dict[dir_name] += 1
+        yield dir_name + "_" + str(dir_dict[dir_name]), content
 
 
 def main():
@@ -159,6 +159,6 @@ if __name__ == "__main__":
     # Example: Reading a zip file as bytes (replace with your actual bytes source)
     with open(zd, "rb") as f:  # Simulating bytes input
         zp = f.read()
-    res = read_sfu_negation(zd)
+    res = dict(read_sfu_negation(zd))
     print(res["MOVIES_0"])
     print(parse_xml_file(res["MOVIES_0"])[3])
\ No newline at end of file
@@ -1,4 +1,7 @@
+import gzip
+import json
 import os
+import time
 import requests
 
 
@@ -23,6 +26,33 @@ def test_api():
         # print(response["token"])
         print(response["doc_name"])
 
+def test_api_compression(bandwidth: float = 1e9 / 8):
+    """
+    End-to-end /v1/process throughput with and without gzip compression (including decompressing and decoding
+    on the client), transfer time estimated for a link with bandwidth bytes per second (1 Gbit/s by default).
+    """
+    init_url = "http://0.0.0.0:9714/v1/init"
+    next_url = "http://0.0.0.0:9714/v1/process"
+
+    test_file = f"{BP}/data/SFU_Review_Corpus_Negation_Speculation.zip"
+
+    for compression in [None, "gzip"]:
+        file = {'file': open(test_file, 'rb')}
+        n_docs = requests.post(url=init_url, files=file).json()["n_docs"]
+        n_bytes = 0
+        start = time.time()
+        for _ in range(n_docs):
+            response = requests.post(url=next_url, json={"compression": compression}, stream=True)
+            body = response.raw.read()
+            n_bytes += len(body)
+            if body[:2] == b"\x1f\x8b":
+                body = gzip.decompress(body)
+            json.loads(body)
+        duration = time.time() - start
+        print(f"{compression}: {n_bytes / (1024 * 1024):.2f} MB, {n_docs / duration:.1f} docs/s, "
+              f"with transfer: {n_docs / (duration + n_bytes / bandwidth):.1f} docs/s")
+
+
 # Example usage
 if __name__ == "__main__":
     test_api()
\ No newline at end of file
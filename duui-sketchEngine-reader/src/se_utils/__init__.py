@@ -1,2 +1,8 @@
 from .annotations import Lemma, Token, Pos
-from .se_import import import_se_docs
\ No newline at end of file
+from .se_import import import_se_docs, read_se_docs, parse_se_doc
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
+from .corpus_io import CorpusContainer, CorpusFile, iter_corpus_files, read_texts
+from .parse_pipeline import ParsePipeline
@@ -1,58 +1,33 @@
 import _csv
 import csv
-import zipfile
 from io import BytesIO, StringIO
-from typing import Union, List, Any
+from typing import BinaryIO, Union, List, Any, Tuple
 
 from se_utils.annotations import Sentence, Token, Lemma, Pos
+from se_utils.corpus_io import iter_corpus_files
 
 
-def read_file_as_byte(file_ref: str, zip_ref: zipfile.ZipFile) -> BytesIO:
+def files_from_zip_in_bytes(zip_bytes: Union[bytes, BinaryIO], csv_files: list):
     """
-    read zip file as bytes and return them in file like byte buffer.
-    :param file_ref:
-    :param zip_ref:
+    Collect the .csv files of the upload and of the containers nested in it, in the order of the archive
+    :param zip_bytes:
+    :param csv_files:
     :return:
     """
-    with zip_ref.open(file_ref) as file:
-        file_contents = file.read()  # Read file contents as bytes
-        return BytesIO(file_contents)
-
-
-def find_all_csv_files(zip_ref_lst: List[str]):
-
-    found_files = [ref for ref in zip_ref_lst if ".csv" in ref]
-    return found_files
-
-
-def files_from_zip_in_bytes(zip_bytes: Union[bytes, BytesIO], csv_files: list):
-
-    # Use BytesIO to treat the byte data as a file-like object
-    # with BytesIO(zip_bytes) as byte_io:
-    if isinstance(zip_bytes, bytes):
-        byte_io = BytesIO(zip_bytes)
-        del zip_bytes
-    else:
-        byte_io = zip_bytes
-
-    with zipfile.ZipFile(byte_io, 'r') as zip_ref:
-        # List all file names in the zip file
-        # print("Files in the ZIP archive:", zip_ref.namelist())
-        target_csv_files = find_all_csv_files(zip_ref.namelist())
-        csv_files.extend([read_file_as_byte(file, zip_ref) for file in target_csv_files])
-
-        for file in zip_ref.namelist():
-            if ".zip" in file:
-                with zip_ref.open(file) as zf:
-                    file_contents = zf.read()
-                files_from_zip_in_bytes(file_contents, csv_files)
+    for file in iter_corpus_files(zip_bytes, predicate=lambda path: ".csv" in path):
+        csv_files.append(BytesIO(file.read_bytes()))
 
 
 def convert_bytesIO_to_csv(bytes_io: BytesIO):
     return csv.reader(StringIO(bytes_io.getvalue().decode("utf-8")))
 
 
-def import_se_docs(zip_bytes: Union[bytes, BytesIO]) -> List[dict]:
+def read_se_docs(zip_bytes: Union[bytes, BinaryIO]) -> List[Tuple[str, str, List[str]]]:
+    """
+    Read the documents of an upload without parsing them (see parse_se_doc)
+    :param zip_bytes:
+    :return: (corpus id, document id, csv fields of the document)
+    """
     csv_bytes_lst = []
     files_from_zip_in_bytes(zip_bytes, csv_bytes_lst)
     csv_lst = []
@@ -70,12 +45,27 @@ def import_se_docs(zip_bytes: Union[bytes, BytesIO]) -> List[dict]:
     docs = []
     for corpus_key in corpora.keys():
         for doc_key in corpora[corpus_key].keys():
-            corpora[corpus_key][doc_key]["doc_id"] = doc_key
-            corpora[corpus_key][doc_key]["corp_id"] = corpus_key
-            docs.append(corpora[corpus_key][doc_key])
+            docs.append((corpus_key, doc_key, corpora[corpus_key][doc_key]))
     return docs
 
 
+def parse_se_doc(raw_doc: Tuple[str, str, List[str]]) -> dict:
+    """
+    Parse a document of read_se_docs
+    :param raw_doc:
+    :return:
+    """
+    corpus_key, doc_key, fields = raw_doc
+    doc = import_doc(fields)
+    doc["doc_id"] = doc_key
+    doc["corp_id"] = corpus_key
+    return doc
+
+
+def import_se_docs(zip_bytes: Union[bytes, BinaryIO]) -> List[dict]:
+    return [parse_se_doc(raw_doc) for raw_doc in read_se_docs(zip_bytes)]
+
+
 def import_csv(csv_file, cdx: int):
     corpus_name = "unk"
     docs = dict()
@@ -86,10 +76,10 @@ def import_csv(csv_file, cdx: int):
         elif idx > 4:
             if docs.get(row[0]) is not None:
                 id_dict[row[0]] += 1
-                docs[row[0] + f"_{id_dict[row[0]]}.{cdx}"] = import_doc(row[1:])
+                docs[row[0] + f"_{id_dict[row[0]]}.{cdx}"] = row[1:]
             else:
                 id_dict[row[0]] = 1
-                docs[row[0] + f"_{id_dict[row[0]]}.{cdx}"] = import_doc(row[1:])
+                docs[row[0] + f"_{id_dict[row[0]]}.{cdx}"] = row[1:]
 
             # print(row[1])
     return corpus_name, docs
@@ -1,2 +1,8 @@
 from .socc_reader import read_socc_negation, convert_tsv
-from .annotations import Paragraph, Token, Negation
\ No newline at end of file
+from .annotations import Paragraph, Token, Negation, IndexedNegation, index_negations
+from .spill_queue import SpillQueue
+from .batch import batch_response
+from .ingestion import IngestionJob, IngestionJobs, IngestionStatus
+from .upload import spool_upload
+from .corpus_io import CorpusContainer, CorpusFile, iter_corpus_files, read_texts
+from .parse_pipeline import ParsePipeline
@@ -18,4 +18,44 @@ class Negation(BaseModel):
     event: Optional[List[Token]] = None
     focus: Optional[List[Token]] = None
     scope: Optional[List[Token]] = None
-    xscope: Optional[List[Token]] = None
\ No newline at end of file
+    xscope: Optional[List[Token]] = None
+
+# Negation with its components as 0-based positions in the token list of the document
+class IndexedNegation(BaseModel):
+    negType: Optional[str] = None
+    cue: Optional[int] = None
+    event: Optional[List[int]] = None
+    focus: Optional[List[int]] = None
+    scope: Optional[List[int]] = None
+    xscope: Optional[List[int]] = None
+
+
+def index_negations(negations: List[Negation], tokens: List[Token]) -> List[IndexedNegation]:
+    """
+    Replace the tokens of the negations by their position in tokens (the first token with the same offsets),
+    like communication.lua matches them. Components without such a token are left out.
+    :param negations:
+    :param tokens: token list of the document
+    :return:
+    """
+    positions: Dict[Tuple[int, int], int] = {}
+    for idx, tok in enumerate(tokens):
+        positions.setdefault((tok.begin, tok.end), idx)
+
+    def position(tok) -> Optional[int]:
+        if not isinstance(tok, Token):
+            return None
+        return positions.get((tok.begin, tok.end))
+
+    def positions_of(toks: Optional[List[Token]]) -> Optional[List[int]]:
+        if toks is None:
+            return None
+        return [idx for idx in map(position, toks) if idx is not None]
+
+    return [IndexedNegation(negType=neg.negType,
+                            cue=position(neg.cue),
+                            event=positions_of(neg.event),
+                            focus=positions_of(neg.focus),
+                            scope=positions_of(neg.scope),
+                            xscope=positions_of(neg.xscope)) for neg in negations]
+
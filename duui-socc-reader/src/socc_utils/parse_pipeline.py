@@ -0,0 +1,120 @@
+import threading
+import traceback
+from collections import deque
+from queue import Empty
+from typing import Any, Callable, List
+
+
+PARSE_POLICIES = ("eager", "lazy", "prefetch")
+DEFAULT_PREFETCH = 8
+
+
+class FailedParse:
+    """
+    Placeholder for a document the prefetch worker could not parse, get raises its error in order
+    """
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class ParsePipeline:
+    """
+    Parse stage between the document queue of an upload and /v1/process. parse turns a raw item (e.g. the content
+    of a file) into its documents, when that happens depends on the policy:
+    - eager: in put, the queue holds parsed documents (memory for the whole corpus, no parsing in /v1/process)
+    - lazy: in get, the queue holds the raw items (parse latency in every /v1/process, one parse at a time)
+    - prefetch: a worker thread keeps up to prefetch parsed documents ready ahead of get, the rest stays raw
+    Documents are returned in the order of the items. put, empty and qsize can be used like those of the queue,
+    raw items that are not parsed yet count as one document.
+    """
+
+    def __init__(self, queue, parse: Callable[[Any], List[Any]], policy: str = "lazy",
+                 prefetch: int = DEFAULT_PREFETCH):
+        """
+        :param queue: queue of the items (SpillQueue)
+        :param parse: returns the documents of a raw item
+        :param policy: eager, lazy or prefetch
+        :param prefetch: parsed documents kept ready by the worker (prefetch policy)
+        """
+        if policy not in PARSE_POLICIES:
+            raise ValueError(f"Unknown parse policy: {policy}, expected one of {', '.join(PARSE_POLICIES)}")
+        self.queue = queue
+        self.parse = parse
+        self.policy = policy
+        self.prefetch = max(1, prefetch)
+        # Parsed documents of items that were taken from the queue already
+        self.ready = deque()
+        # Items the worker is parsing right now
+        self.parsing = 0
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def put(self, item: Any) -> int:
+        """
+        Add a raw item at the end of the queue (its documents with the eager policy)
+        :param item:
+        :return: number of documents added to the queue (the item itself counts as one unless parsed)
+        """
+        if self.policy == "eager":
+            documents = self.parse(item)
+            for document in documents:
+                self.queue.put(document)
+            return len(documents)
+        with self.condition:
+            self.queue.put(item)
+            if self.policy == "prefetch" and self.worker is None:
+                self.worker = threading.Thread(target=self.run_worker, name="parse-prefetch", daemon=True)
+                self.worker.start()
+            self.condition.notify_all()
+        return 1
+
+    def get(self) -> Any:
+        """
+        Remove and return the next parsed document, raises queue.Empty if there is none
+        :return:
+        """
+        if self.policy == "eager":
+            return self.queue.get()
+        if self.policy == "lazy":
+            # Parsed under the condition, a concurrent get (or qsize) waits for the documents of the item instead
+            # of finding the queue empty while they are not ready yet
+            with self.condition:
+                while not self.ready:
+                    self.ready.extend(self.parse(self.queue.get()))
+                return self.ready.popleft()
+        with self.condition:
+            while not self.ready and (self.parsing or not self.queue.empty()):
+                self.condition.wait()
+            if not self.ready:
+                raise Empty
+            document = self.ready.popleft()
+            # The worker can parse the next item
+            self.condition.notify_all()
+        if isinstance(document, FailedParse):
+            raise document.error
+        return document
+
+    def qsize(self) -> int:
+        with self.condition:
+            return self.queue.qsize() + len(self.ready) + self.parsing
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def run_worker(self):
+        while True:
+            with self.condition:
+                while len(self.ready) >= self.prefetch or self.queue.empty():
+                    self.condition.wait()
+                item = self.queue.get()
+                self.parsing += 1
+            try:
+                documents = self.parse(item)
+            except Exception as e:
+                traceback.print_exc()
+                documents = [FailedParse(e)]
+            with self.condition:
+                self.ready.extend(documents)
+                self.parsing -= 1
+                self.condition.notify_all()
@@ -1,15 +1,11 @@
 import csv
 import os
-import shutil
-import tempfile
-import zipfile
-from io import BytesIO, StringIO
-from pathlib import Path
-from typing import Union, Dict, Tuple, List
+from io import StringIO
+from typing import BinaryIO, Union, Dict, Tuple, List, Iterator
 from pydantic import BaseModel
 
 from .annotations import Paragraph, Token, Negation
-from .file_io import find_folder_pathlib, find_tsv_files
+from .corpus_io import iter_corpus_files, read_texts
 
 
 BP = os.path.realpath(os.path.join(os.path.realpath(__file__), "../../.."))
@@ -155,21 +151,21 @@ def convert_tsv(doc_name: str, tsv: str) -> Tuple[List[Negation], List[Paragraph
     return negations, paras, tokens, doc_name, sofa_str
 
 
-def read_socc_negation(zip_bytes: Union[bytes, BytesIO], target_folder_name: str):
-    # Find the target folder in the zip data
-    temp_dir = Path(tempfile.mkdtemp())
-    found_folder = find_folder_pathlib(zip_bytes, target_folder_name, temp_dir)
-    result = dict()
-    if found_folder:
-        if os.path.isdir(os.path.join(found_folder, "curation")):
-            # print(f"Found target folder at: {found_folder}")
-            # print(os.listdir(found_folder))
-            # Find all .tsv files and their contents
-            find_tsv_files(os.path.join(found_folder, "curation"), result)
-
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    return result
-
-
+def read_socc_negation(zip_bytes: Union[bytes, BinaryIO], target_folder_name: str) -> Iterator[Tuple[str, str]]:
+    # (document name, content) of every file, one after another while the archive is read.
+    # .tsv files below "<target_folder_name>/curation/", of the first such folder in the archive. The paths are
+    # checked in the order of the archive, only the files of that folder are read.
+    curation = None
 
+    def in_curation(path: str) -> bool:
+        nonlocal curation
+        if curation is None:
+            parts = path.split("/")
+            for idx in range(len(parts) - 2):
+                if parts[idx] == target_folder_name and parts[idx + 1] == "curation":
+                    curation = "/".join(parts[:idx + 2]) + "/"
+                    break
+        return curation is not None and path.startswith(curation)
 
+    for file, content in read_texts(iter_corpus_files(zip_bytes, [".tsv"], in_curation)):
+        yield file.path.split("/")[-2].split(".")[0], content
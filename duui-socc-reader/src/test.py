@@ -15,11 +15,8 @@ def test_method():
     with open(zd, "rb") as f:  # Simulating bytes input
         zp = f.read()
 
-    res = read_socc_negation(zp, folder_to_find)
-    # print(len(res))
-    # print(res.keys())
-    for key in res:
-        print(*convert_tsv(key, res[key]), sep="\n")
+    for key, content in read_socc_negation(zp, folder_to_find):
+        print(*convert_tsv(key, content), sep="\n")
         break
 
 def test_single_file():